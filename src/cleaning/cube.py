@@ -0,0 +1,301 @@
+"""
+Cubo de precios DE vs ES precalculado.
+
+Sustituye al groupby(["model","year_bin","km_bin","country"])["price"].median()
+del notebook: cada celda (brand, model, year_bin, km_bin, country) guarda
+conteo, suma, suma de cuadrados y un sketch KLL del precio. Se actualiza
+solo con las filas nuevas de cada Parquet (offset por fuente) y la tabla
+comparativa / describe() salen de mergear sketches, sin releer anuncios.
+
+Junto al offset se guarda una huella de las filas ya agregadas (DICT_VERSION
+del normalizador + hash de sus columnas). pipeline.run reescribe el Parquet
+entero y reprocess/normalizer pueden cambiar filas viejas: si la huella no
+coincide, el cubo se reconstruye en vez de quedarse con celdas obsoletas.
+
+    python -m src.cleaning.cube update --source data/processed/mobile_de_clean.parquet \
+        --source data/processed/coches_net_clean.parquet
+    python -m src.cleaning.cube table
+    python -m src.cleaning.cube describe Golf
+"""
+
+import argparse
+import hashlib
+import json
+import math
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.utils.normalize import DICT_VERSION
+from src.utils.sketches import KLLSketch
+
+CUBE_JSON = Path("data/processed/price_cube.json")
+
+# mismos cortes que el notebook (pd.cut, intervalos cerrados por la derecha)
+YEAR_BINS = [2012, 2015, 2018, 2021, 2025]
+KM_BINS = [0, 60000, 120000, 180000]
+
+KEY_COLUMNS = ["brand", "model", "year_bin", "km_bin", "country"]
+# columnas del Parquet limpio que usa el cubo (y que entran en la huella)
+SOURCE_COLUMNS = ["brand", "model", "year", "km", "country", "price"]
+SKETCH_K = 200
+# filas fuera de los cortes: cuentan en describe() pero no en la tabla por bins
+OUT_OF_BIN = "-"
+
+
+def _labels(bins) -> list[str]:
+    return [f"({lo}, {hi}]" for lo, hi in zip(bins[:-1], bins[1:])]
+
+
+# para ordenar los bins numéricamente y no como texto
+BIN_ORDER = {"year_bin": _labels(YEAR_BINS), "km_bin": _labels(KM_BINS)}
+
+
+def _sort_key(idx: pd.Index) -> pd.Index:
+    order = BIN_ORDER.get(idx.name)
+    return idx.map(order.index) if order else idx
+
+
+def _bin_labels(values: pd.Series, bins) -> pd.Series:
+    labels = _labels(bins)
+    return pd.cut(values.astype("float64"), bins=bins, labels=labels).astype("string").fillna(OUT_OF_BIN)
+
+
+class StaleSource(ValueError):
+    """Las filas ya agregadas de una fuente cambiaron: hay que reconstruir el cubo."""
+
+
+def _hasher():
+    return hashlib.sha1(f"dict={DICT_VERSION}|{','.join(SOURCE_COLUMNS)}".encode())
+
+
+def _feed(h, df: pd.DataFrame) -> None:
+    if len(df):
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+
+
+class Cell:
+    __slots__ = ("n", "total", "total_sq", "price")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.price = KLLSketch(k=SKETCH_K)
+
+    def add(self, prices) -> None:
+        vals = [float(p) for p in prices]
+        self.n += len(vals)
+        self.total += sum(vals)
+        self.total_sq += sum(v * v for v in vals)
+        self.price.update_many(vals)
+
+    def merge(self, other: "Cell") -> "Cell":
+        self.n += other.n
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.price.merge(other.price)
+        return self
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "sum": self.total, "sumsq": self.total_sq, "price": self.price.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Cell":
+        c = cls()
+        c.n, c.total, c.total_sq = d["n"], d["sum"], d["sumsq"]
+        c.price = KLLSketch.from_dict(d["price"])
+        return c
+
+
+class PriceCube:
+    def __init__(self):
+        self.cells: dict[tuple, Cell] = {}
+        # fuente -> {"rows": filas ya agregadas, "fingerprint": huella de esas filas}
+        self.offsets: dict[str, dict] = {}
+
+    # ---------------- carga ----------------
+    def add_frame(self, df: pd.DataFrame) -> int:
+        """Agrega un DataFrame limpio (columnas de src/cleaning/pipeline.py)."""
+        if df.empty:
+            return 0
+        keys = pd.DataFrame({
+            "brand": df["brand"].astype("string"),
+            "model": df["model"].astype("string"),
+            "year_bin": _bin_labels(pd.to_numeric(df["year"], errors="coerce"), YEAR_BINS),
+            "km_bin": _bin_labels(pd.to_numeric(df["km"], errors="coerce"), KM_BINS),
+            "country": df["country"].astype("string"),
+            "price": pd.to_numeric(df["price"], errors="coerce"),
+        }).dropna(subset=["brand", "model", "country", "price"])
+        for key, prices in keys.groupby(KEY_COLUMNS, sort=False)["price"]:
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = Cell()
+            cell.add(prices.to_numpy())
+        return len(keys)
+
+    def update_from_parquet(self, path: Path) -> int:
+        """
+        Agrega solo las filas posteriores al último offset de esta fuente.
+        StaleSource (sin tocar el cubo) si las filas ya agregadas no son las mismas.
+        """
+        src = str(path)
+        pf = pq.ParquetFile(path)
+        total = pf.metadata.num_rows
+        prev = self.offsets.get(src)
+        done = prev["rows"] if isinstance(prev, dict) else 0
+        if prev is not None and not isinstance(prev, dict):
+            raise StaleSource(f"{path}: offset sin huella (cubo de una versión anterior)")
+        if total < done:
+            raise StaleSource(f"{path} tiene menos filas ({total}) que las ya agregadas ({done})")
+
+        # las filas viejas solo se leen (columnas del cubo) para comprobar la huella
+        h = _hasher()
+        added = 0
+        seen = 0
+        for i in range(pf.num_row_groups):
+            df = pf.read_row_group(i, columns=SOURCE_COLUMNS).to_pandas()
+            old, new = df.iloc[:max(done - seen, 0)], df.iloc[max(done - seen, 0):]
+            _feed(h, old)
+            seen += len(df)
+            if len(new) and seen - len(new) == done:
+                self._check(path, prev, h)
+            _feed(h, new)
+            added += self.add_frame(new)
+        if total == done:
+            self._check(path, prev, h)
+        self.offsets[src] = {"rows": total, "fingerprint": h.hexdigest()}
+        return added
+
+    @staticmethod
+    def _check(path: Path, prev: dict | None, h) -> None:
+        if prev is not None and h.hexdigest() != prev["fingerprint"]:
+            raise StaleSource(f"{path}: las {prev['rows']} filas ya agregadas han cambiado")
+
+    def merge(self, other: "PriceCube") -> "PriceCube":
+        for key, cell in other.cells.items():
+            if key in self.cells:
+                self.cells[key].merge(cell)
+            else:
+                self.cells[key] = cell
+        for src, off in other.offsets.items():
+            mine = self.offsets.get(src)
+            if mine is None or off["rows"] > mine["rows"]:
+                self.offsets[src] = off
+        return self
+
+    # ---------------- consultas ----------------
+    def _rollup(self, by, where=None) -> dict[tuple, Cell]:
+        idx = [KEY_COLUMNS.index(c) for c in by]
+        out: dict[tuple, Cell] = {}
+        for key, cell in self.cells.items():
+            if where and any(key[KEY_COLUMNS.index(c)] != v for c, v in where.items()):
+                continue
+            k = tuple(key[i] for i in idx)
+            if k not in out:
+                out[k] = Cell()
+            out[k].merge(cell)
+        return out
+
+    def comparison_table(self, by=("model", "year_bin", "km_bin"), q: float = 0.5, dropna: bool = True) -> pd.DataFrame:
+        """Cuantil q del precio por segmento, con una columna por país (como el .unstack() del notebook)."""
+        cols = list(by) + ["country"]
+        rolled = {k: c for k, c in self._rollup(cols).items() if OUT_OF_BIN not in k}
+        if not rolled:
+            return pd.DataFrame()
+        rows = [(*k, cell.price.quantile(q)) for k, cell in rolled.items()]
+        df = pd.DataFrame(rows, columns=cols + ["price"])
+        table = df.set_index(cols)["price"].unstack("country").sort_index(key=_sort_key)
+        return table.dropna() if dropna else table
+
+    def describe(self, model: str, brand: str | None = None) -> pd.DataFrame:
+        """Equivalente a df[df.model == model].groupby("country")["price"].describe()."""
+        where = {"model": model}
+        if brand:
+            where["brand"] = brand
+        rows = {}
+        for (country,), cell in sorted(self._rollup(["country"], where).items()):
+            n = cell.n
+            mean = cell.total / n
+            var = (cell.total_sq - n * mean * mean) / (n - 1) if n > 1 else float("nan")
+            q25, q50, q75 = cell.price.quantiles([0.25, 0.5, 0.75])
+            rows[country] = {
+                "count": float(n), "mean": mean, "std": math.sqrt(max(var, 0.0)) if n > 1 else var,
+                "min": cell.price.min, "25%": q25, "50%": q50, "75%": q75, "max": cell.price.max,
+            }
+        return pd.DataFrame.from_dict(rows, orient="index").rename_axis("country")
+
+    # ---------------- persistencia ----------------
+    def save(self, path: Path = CUBE_JSON) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "year_bins": YEAR_BINS,
+            "km_bins": KM_BINS,
+            "offsets": self.offsets,
+            "cells": [[list(k), c.to_dict()] for k, c in self.cells.items()],
+        }
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = CUBE_JSON) -> "PriceCube":
+        cube = cls()
+        if not path.exists():
+            return cube
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("year_bins") != YEAR_BINS or data.get("km_bins") != KM_BINS:
+            print("⚠️ Cortes de year/km distintos a los guardados: se reconstruye el cubo.")
+            return cube
+        cube.offsets = data.get("offsets", {})
+        cube.cells = {tuple(k): Cell.from_dict(c) for k, c in data["cells"]}
+        return cube
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cubo de precios DE vs ES (incremental)")
+    ap.add_argument("--cube", type=Path, default=CUBE_JSON)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    up = sub.add_parser("update", help="agrega las filas nuevas de los Parquet limpios")
+    up.add_argument("--source", type=Path, action="append", required=True)
+    up.add_argument("--rebuild", action="store_true", help="ignora el cubo guardado")
+
+    tb = sub.add_parser("table", help="tabla comparativa por segmento")
+    tb.add_argument("--by", default="model,year_bin,km_bin")
+    tb.add_argument("--q", type=float, default=0.5)
+
+    ds = sub.add_parser("describe", help="describe() del precio por país para un modelo")
+    ds.add_argument("model")
+    ds.add_argument("--brand")
+
+    args = ap.parse_args()
+
+    if args.cmd == "update":
+        cube = PriceCube() if args.rebuild else PriceCube.load(args.cube)
+        sources = args.source
+        try:
+            added = [cube.update_from_parquet(src) for src in sources]
+        except StaleSource as e:
+            print(f"⚠️ {e}: se reconstruye el cubo.")
+            # también las fuentes que ya estaban en el cubo y no se han pasado ahora
+            sources = list(dict.fromkeys([*args.source, *(Path(s) for s in cube.offsets if Path(s).exists())]))
+            cube = PriceCube()
+            added = [cube.update_from_parquet(src) for src in sources]
+        for src, n in zip(sources, added):
+            print(f"{src}: +{n} filas")
+        cube.save(args.cube)
+        print(f"Celdas: {len(cube.cells)} | cubo: {args.cube}")
+        return
+
+    cube = PriceCube.load(args.cube)
+    with pd.option_context("display.max_rows", 200, "display.width", 160):
+        if args.cmd == "table":
+            print(cube.comparison_table(by=tuple(args.by.split(",")), q=args.q))
+        else:
+            print(cube.describe(args.model, brand=args.brand))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Limpieza por chunks (sustituye a clean_4000.ipynb).
+
+Lee el CSV crudo en trozos, aplica las mismas reglas que el notebook con
+operaciones vectorizadas y escribe un Parquet incremental, así la memoria
+no depende del tamaño del dataset.
+
+    python -m src.cleaning.pipeline --input data/raw/mobile_de_results_all.csv \
+        --output data/processed/mobile_de_clean.parquet --country DE
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.normalize import BRANDS, Normalizer
+from src.utils.tags import tag_series
+
+CHUNKSIZE = 100_000
+
+MAX_KM = 155_000
+MIN_PRICE = 1_000
+MAX_PRICE = 150_000
+MIN_YEAR = 1990
+MAX_YEAR = 2026
+
+# En el notebook: value_counts().loc[:"Jaguar"] -> las marcas con volumen.
+# Aquí fija para no tener que leer el dataset dos veces (nombres canónicos
+# de src/utils/normalize.py).
+BRAND_ALLOWLIST = [
+    "Volkswagen", "Audi", "BMW", "Mercedes-Benz", "Opel", "Ford", "Skoda", "SEAT", "Cupra",
+    "Renault", "Peugeot", "Citroen", "Toyota", "Hyundai", "Kia", "Mazda", "Nissan", "Volvo",
+    "Fiat", "MINI", "Dacia", "Porsche", "Land Rover", "Jaguar", "Jeep", "Suzuki", "Mitsubishi",
+    "Honda", "Alfa Romeo", "Lexus", "DS", "Tesla", "Smart", "Subaru",
+]
+
+OUT_COLUMNS = ["brand", "model", "trim", "tags", "price", "km", "year", "kw", "location", "title", "url", "country"]
+SCHEMA = pa.schema([
+    ("brand", pa.string()),
+    ("model", pa.string()),
+    ("trim", pa.string()),
+    ("tags", pa.string()),
+    ("price", pa.int64()),
+    ("km", pa.int64()),
+    ("year", pa.int64()),
+    ("kw", pa.int64()),
+    ("location", pa.string()),
+    ("title", pa.string()),
+    ("url", pa.string()),
+    ("country", pa.string()),
+])
+
+PRICE_RX = r"(\d{1,3}(?:\.\d{3})*)\s*€"
+NOISE_RX = r"^(?:Patrocinado|NUEVO)\s*"
+
+
+def clean_chunk(df: pd.DataFrame, country: str, normalizer: Normalizer | None = None) -> pd.DataFrame:
+    # precio desde el title (como el notebook); si no hay, el price_eur scrapeado
+    price = df["title"].str.extract(PRICE_RX, expand=False).str.replace(".", "", regex=False)
+    price = pd.to_numeric(price, errors="coerce")
+    if "price_eur" in df:
+        price = price.fillna(pd.to_numeric(df["price_eur"], errors="coerce"))
+
+    brand = (
+        df["brand"].astype("string")
+        .str.replace(NOISE_RX, "", regex=True)
+        .str.replace("CitroÃ«n", "Citroen", regex=False)
+        .str.replace("Citroën", "Citroen", regex=False)
+        .str.strip()
+    )
+    model = df["model"].astype("string")
+    trim = pd.Series(pd.NA, index=df.index, dtype="string")
+    if normalizer is not None:
+        # marca/modelo canónicos desde el título; lo scrapeado queda de respaldo
+        norm = normalizer.normalize_series(df["title"].astype("string"))
+        resolved = norm["brand"].isin(BRANDS)
+        brand = norm["brand"].where(resolved).astype("string").fillna(brand)
+        model = norm["model"].where(resolved).astype("string").fillna(model)
+        trim = norm["trim"].where(resolved).astype("string")
+    allow = {b.lower(): b for b in BRAND_ALLOWLIST}
+    brand_key = brand.str.lower()
+
+    km = pd.to_numeric(df["km"], errors="coerce")
+    year = pd.to_numeric(df["year"], errors="coerce")
+
+    keep = (
+        price.between(MIN_PRICE, MAX_PRICE)
+        & brand_key.isin(allow.keys())
+        & (km >= 0) & (km < MAX_KM)
+        & (year.isna() | year.between(MIN_YEAR, MAX_YEAR))
+    )
+    if "blocked" in df:
+        keep &= df["blocked"].astype("string").str.lower().ne("true")
+
+    return pd.DataFrame({
+        "brand": brand_key[keep].map(allow),
+        "model": model[keep],
+        "trim": trim[keep],
+        "tags": tag_series(df.loc[keep, "title"])["tags"],
+        "price": price[keep].astype("int64"),
+        "km": km[keep].astype("int64"),
+        "year": year[keep].astype("Int64"),
+        # kw / location solo los trae el listado de mobile.de
+        "kw": pd.to_numeric(df["kw"], errors="coerce")[keep].astype("Int64") if "kw" in df else pd.NA,
+        "location": df.loc[keep, "location"].astype("string") if "location" in df else pd.NA,
+        "title": df.loc[keep, "title"].astype("string"),
+        "url": df.loc[keep, "url"].astype("string"),
+        "country": country,
+    })
+
+
+def run(input_path: Path, output_path: Path, country: str, chunksize: int = CHUNKSIZE) -> tuple[int, int]:
+    header = pd.read_csv(input_path, nrows=0).columns
+    usecols = [c for c in ("url", "title", "brand", "model", "price_eur", "km", "year", "kw", "location", "blocked") if c in header]
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    rows_in = rows_out = 0
+    writer = None
+    normalizer = Normalizer()
+    try:
+        for chunk in pd.read_csv(input_path, usecols=usecols, chunksize=chunksize, dtype="string"):
+            rows_in += len(chunk)
+            cleaned = clean_chunk(chunk, country, normalizer)
+            if cleaned.empty:
+                continue
+            table = pa.Table.from_pandas(cleaned[OUT_COLUMNS], schema=SCHEMA, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, SCHEMA, compression="zstd")
+            writer.write_table(table)
+            rows_out += len(cleaned)
+    finally:
+        if writer is not None:
+            writer.close()
+        normalizer.close()
+    if writer is None:
+        # sin filas: Parquet vacío con el esquema, no el de una corrida anterior
+        pq.write_table(SCHEMA.empty_table(), output_path, compression="zstd")
+    return rows_in, rows_out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Limpieza por chunks de anuncios crudos -> Parquet")
+    ap.add_argument("--input", type=Path, required=True)
+    ap.add_argument("--output", type=Path, required=True)
+    ap.add_argument("--country", default="DE")
+    ap.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = ap.parse_args()
+
+    rows_in, rows_out = run(args.input, args.output, args.country, args.chunksize)
+    print(f"Filas leídas: {rows_in} | limpias: {rows_out}")
+    print("Parquet:", args.output)
+
+
+if __name__ == "__main__":
+    main()
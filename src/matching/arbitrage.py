@@ -0,0 +1,152 @@
+"""
+Calculadora de importación DE -> ES para todo el dataset.
+
+Para cada anuncio alemán: precio + transporte (distancia desde su PLZ con
+src/utils/geo.py) + impuesto de matriculación español (tramo de CO2, o
+estimado por potencia) + ITV / homologación / tasas, frente a la mediana de
+sus comparables españoles (src/matching/matcher.py). Todo con arrays de
+NumPy, sin bucles por fila.
+
+    python -m src.matching.arbitrage --de data/processed/mobile_de_clean.parquet \
+        --es data/processed/coches_net_clean.parquet --out data/processed/arbitrage.parquet
+"""
+
+import argparse
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.matching.matcher import K, match
+from src.utils.geo import HUBS, default_table, route_km
+
+# ===================== CONFIG =====================
+# camión portacoches: fijo + €/km por carretera (línea recta × ROAD_FACTOR)
+# desde el PLZ del anuncio, pasando por La Jonquera o Irun, hasta el hub
+DESTINATION_HUB = "Madrid"
+TRANSPORT_BASE_EUR = 250
+TRANSPORT_EUR_PER_KM = 0.35
+ROAD_FACTOR = 1.25
+TRANSPORT_EUR_DEFAULT = 1000      # anuncios sin PLZ
+
+# Impuesto especial de matriculación (península): tramos de CO2 g/km
+CO2_BANDS = [120, 160, 200]                 # <=120 | 120-160 | 160-200 | >200
+REGISTRATION_TAX_RATES = [0.0, 0.0475, 0.0975, 0.1475]
+# sin dato de CO2: tramo estimado por potencia (kW)
+KW_BANDS_FOR_CO2 = [85, 130, 185]
+
+# valor fiscal: % del precio según antigüedad (tablas de Hacienda, simplificado)
+FISCAL_VALUE_BY_AGE = [1.00, 0.84, 0.67, 0.56, 0.47, 0.41, 0.36, 0.32, 0.28, 0.24, 0.19, 0.17, 0.10]
+
+ITV_EUR = 180                 # ITV de importación
+HOMOLOGATION_EUR = 250        # ficha técnica reducida / certificado de conformidad
+DGT_FEE_EUR = 99.77           # tasa de matriculación
+GESTORIA_EUR = 300
+FIXED_FEES_EUR = ITV_EUR + HOMOLOGATION_EUR + DGT_FEE_EUR + GESTORIA_EUR
+
+MIN_COMPARABLES = 3
+# ===================== /CONFIG =====================
+
+
+def transport_route(location: pd.Series, hub: str = DESTINATION_HUB) -> tuple[np.ndarray, np.ndarray]:
+    """km de ruta y coste de transporte por anuncio ('DE-80331 München')."""
+    lat, lon, _ = default_table().locate(location)
+    km = route_km(lat, lon, hub) * ROAD_FACTOR
+    cost = TRANSPORT_BASE_EUR + TRANSPORT_EUR_PER_KM * km
+    return km, np.where(np.isnan(cost), TRANSPORT_EUR_DEFAULT, cost)
+
+
+def registration_tax(price: np.ndarray, year: np.ndarray, co2: np.ndarray | None = None,
+                     kw: np.ndarray | None = None, ref_year: int | None = None) -> np.ndarray:
+    n = len(price)
+    band = np.full(n, 1, dtype=np.int64)                # sin datos: tramo 4.75%
+    if kw is not None:
+        has_kw = ~np.isnan(kw)
+        band[has_kw] = np.searchsorted(KW_BANDS_FOR_CO2, kw[has_kw], side="left")
+    if co2 is not None:
+        has_co2 = ~np.isnan(co2)
+        band[has_co2] = np.searchsorted(CO2_BANDS, co2[has_co2], side="left")
+    rate = np.asarray(REGISTRATION_TAX_RATES)[band]
+
+    ref_year = ref_year or date.today().year
+    age = np.clip(np.nan_to_num(ref_year - year, nan=0), 0, len(FISCAL_VALUE_BY_AGE) - 1).astype(np.int64)
+    fiscal_value = price * np.asarray(FISCAL_VALUE_BY_AGE)[age]
+    return fiscal_value * rate
+
+
+def _col(df: pd.DataFrame, name: str) -> np.ndarray | None:
+    if name not in df:
+        return None
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def es_reference(matches: pd.DataFrame, es: pd.DataFrame, n_de: pd.Index) -> pd.DataFrame:
+    """Mediana y nº de comparables españoles por anuncio alemán."""
+    es_price = pd.to_numeric(es["price"], errors="coerce")
+    m = matches.assign(es_price=es_price.reindex(matches["es_index"]).to_numpy())
+    g = m.groupby("de_index")["es_price"]
+    ref = pd.DataFrame({"es_median": g.median(), "es_comparables": g.count()})
+    return ref.reindex(n_de)
+
+
+def arbitrage(de: pd.DataFrame, es: pd.DataFrame, matches: pd.DataFrame | None = None,
+              k: int = K, hub: str = DESTINATION_HUB) -> pd.DataFrame:
+    """Coste de importar cada anuncio alemán y margen neto contra sus comparables."""
+    if matches is None:
+        matches = match(de, es, k=k)
+
+    price = _col(de, "price")
+    costs = pd.DataFrame(index=de.index)
+    location = de["location"] if "location" in de else pd.Series(pd.NA, index=de.index, dtype="string")
+    costs["route_km"], costs["transport"] = transport_route(location, hub)
+    costs["registration_tax"] = registration_tax(price, _col(de, "year"), co2=_col(de, "co2"), kw=_col(de, "kw"))
+    costs["fees"] = FIXED_FEES_EUR
+    costs["landed_cost"] = price + costs[["transport", "registration_tax", "fees"]].sum(axis=1).to_numpy()
+
+    ref = es_reference(matches, es, de.index)
+    costs["es_median"] = ref["es_median"]
+    costs["es_comparables"] = ref["es_comparables"].fillna(0).astype("int64")
+    costs["net_margin"] = costs["es_median"] - costs["landed_cost"]
+    costs["margin_pct"] = costs["net_margin"] / costs["landed_cost"]
+    # con menos de MIN_COMPARABLES la mediana no es fiable
+    costs.loc[costs["es_comparables"] < MIN_COMPARABLES, ["net_margin", "margin_pct"]] = np.nan
+    return costs.round({"route_km": 0, "transport": 0, "registration_tax": 0, "landed_cost": 0,
+                        "net_margin": 0, "margin_pct": 4})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Margen neto de importar cada coche alemán a España")
+    ap.add_argument("--de", type=Path, required=True)
+    ap.add_argument("--es", type=Path, required=True)
+    ap.add_argument("--matches", type=Path, help="salida de src.matching.matcher (si no, se calcula)")
+    ap.add_argument("--out", type=Path, required=True)
+    ap.add_argument("--k", type=int, default=K)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--hub", choices=sorted(HUBS), default=DESTINATION_HUB)
+    ap.add_argument("--max-route-km", type=float, help="descarta anuncios más lejos que esto")
+    args = ap.parse_args()
+
+    de = pd.read_parquet(args.de)
+    es = pd.read_parquet(args.es)
+    matches = pd.read_parquet(args.matches) if args.matches else None
+
+    t0 = time.perf_counter()
+    res = de.join(arbitrage(de, es, matches, k=args.k, hub=args.hub))
+    dt = time.perf_counter() - t0
+    if args.max_route_km:
+        res = res[res["route_km"].isna() | (res["route_km"] <= args.max_route_km)]
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    res.to_parquet(args.out, index=False)
+    ok = res["net_margin"].notna()
+    print(f"Anuncios DE: {len(de)} | con comparables: {int(ok.sum())} | rentables: {int((res['net_margin'] > 0).sum())} | {dt:.2f}s")
+    cols = ["brand", "model", "year", "km", "price", "landed_cost", "es_median", "net_margin", "margin_pct", "url"]
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(res[ok].nlargest(args.top, "net_margin")[[c for c in cols if c in res]])
+    print("Parquet:", args.out)
+
+
+if __name__ == "__main__":
+    main()
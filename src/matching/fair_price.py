@@ -0,0 +1,254 @@
+"""
+Precio justo por segmento y detección de chollos.
+
+Por cada (marca, modelo) se ajusta una regresión ridge sobre log(precio) con
+edad, edad², km, kW y etiquetas de acabado/motor (src/utils/tags.py). Los
+coeficientes se guardan en JSON; puntuar es un producto matricial para todo
+el dataset, o unas pocas operaciones por fila para los anuncios que van
+llegando (FairPriceModel.score_row). Segmentos con pocos datos caen a la
+marca y luego al modelo global.
+
+    python -m src.matching.fair_price fit --input data/processed/mobile_de_clean.parquet
+    python -m src.matching.fair_price score --input data/processed/mobile_de_clean.parquet \
+        --out data/processed/mobile_de_scored.parquet
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utils.tags import tag_title
+
+MODEL_JSON = Path("data/processed/fair_price.json")
+
+RIDGE_ALPHA = 1.0
+MIN_SEGMENT_ROWS = 30
+DEAL_DISCOUNT = 0.15      # precio >= 15% por debajo del justo
+DEAL_Z = -1.0             # y al menos 1 desviación típica del segmento
+
+NUMERIC_FEATURES = ["age", "age2", "km", "kw"]
+TAG_FEATURES = [
+    "GTI", "GTD", "R", "R-Line", "S line", "RS", "M Sport", "AMG", "AMG Line", "FR", "ST-Line",
+    "quattro", "xDrive", "4Motion", "4MATIC", "4x4",
+    "DSG", "S tronic", "Automático", "TDI", "Hybrid", "PHEV", "Electric",
+]
+FEATURES = NUMERIC_FEATURES + [f"tag:{t}" for t in TAG_FEATURES]
+GLOBAL = "*"
+
+
+def _segment_keys(brand, model) -> tuple[str, str]:
+    # pd.isna cubre None, NaN y pd.NA (filas del Parquet con dtypes nullable)
+    b = "" if pd.isna(brand) else str(brand).strip().lower()
+    m = "" if pd.isna(model) else str(model).strip().lower()
+    return f"{b}|{m}", b
+
+
+def _segment_columns(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+    """Lo mismo que _segment_keys pero vectorizado sobre el DataFrame."""
+    b = df["brand"].astype("string").str.strip().str.lower().fillna("")
+    m = df["model"].astype("string").str.strip().str.lower().fillna("")
+    return (b + "|" + m).astype(object), b.astype(object)
+
+
+def _tag_set(row_tags, title) -> set[str]:
+    if isinstance(row_tags, str):
+        return set(row_tags.split(","))
+    if isinstance(title, str):
+        found = tag_title(title)
+        return set().union(*found.values())
+    return set()
+
+
+def design_matrix(df: pd.DataFrame, ref_year: int) -> np.ndarray:
+    """Matriz (n, len(FEATURES)) sin estandarizar; NaN donde falta el dato."""
+    n = len(df)
+    X = np.full((n, len(FEATURES)), np.nan)
+    year = pd.to_numeric(df["year"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    age = ref_year - year
+    X[:, 0] = age
+    X[:, 1] = age * age
+    X[:, 2] = pd.to_numeric(df["km"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan) / 10_000
+    if "kw" in df:
+        X[:, 3] = pd.to_numeric(df["kw"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan) / 10
+
+    if "tags" in df:
+        tags = df["tags"].astype("string").fillna("")
+    else:
+        tags = pd.Series([",".join(sorted(_tag_set(None, t))) for t in df["title"]], index=df.index)
+    padded = "," + tags.astype(str) + ","
+    for j, t in enumerate(TAG_FEATURES, start=len(NUMERIC_FEATURES)):
+        X[:, j] = padded.str.contains(f",{t},", regex=False).to_numpy(dtype="float64")
+    return X
+
+
+def _fit_ridge(X: np.ndarray, y: np.ndarray, alpha: float) -> dict:
+    present = ~np.isnan(X)
+    cnt = np.maximum(present.sum(axis=0), 1)
+    mean = np.where(present, X, 0.0).sum(axis=0) / cnt
+    var = np.where(present, (X - mean) ** 2, 0.0).sum(axis=0) / cnt
+    scale = np.where(var > 0, np.sqrt(var), 1.0)
+    Z = (X - mean) / scale
+    Z[np.isnan(Z)] = 0.0           # falta el dato -> media del segmento
+    y_mean = y.mean()
+    A = Z.T @ Z + alpha * np.eye(Z.shape[1])
+    coef = np.linalg.solve(A, Z.T @ (y - y_mean))
+    resid = y - y_mean - Z @ coef
+    dof = max(len(y) - 1, 1)
+    return {
+        "n": int(len(y)), "intercept": float(y_mean), "coef": coef.tolist(),
+        "mean": mean.tolist(), "scale": scale.tolist(),
+        "sigma": float(max(math.sqrt(float(resid @ resid) / dof), 1e-6)),
+    }
+
+
+class FairPriceModel:
+    def __init__(self, segments: dict[str, dict], ref_year: int, alpha: float = RIDGE_ALPHA):
+        self.segments = segments
+        self.ref_year = ref_year
+        self.alpha = alpha
+        self._pack()
+
+    def _pack(self) -> None:
+        # matrices por segmento para puntuar en bloque
+        self.keys = list(self.segments)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        seg = [self.segments[k] for k in self.keys]
+        self.M = np.array([s["mean"] for s in seg])
+        self.S = np.array([s["scale"] for s in seg])
+        self.C = np.array([s["coef"] for s in seg])
+        self.B = np.array([s["intercept"] for s in seg])
+        self.sigma = np.array([s["sigma"] for s in seg])
+
+    # ---------------- ajuste ----------------
+    @classmethod
+    def fit(cls, df: pd.DataFrame, alpha: float = RIDGE_ALPHA, min_rows: int = MIN_SEGMENT_ROWS,
+            ref_year: int | None = None) -> "FairPriceModel":
+        ref_year = ref_year or date.today().year
+        price = pd.to_numeric(df["price"], errors="coerce")
+        df = df[price > 0]
+        y = np.log(pd.to_numeric(df["price"]).to_numpy(dtype="float64"))
+        X = design_matrix(df, ref_year)
+        seg, brand = _segment_columns(df)
+
+        segments = {GLOBAL: _fit_ridge(X, y, alpha)}
+        for groups in (brand.groupby(brand).indices, seg.groupby(seg).indices):
+            for key, pos in groups.items():
+                if len(pos) >= min_rows and key:
+                    segments[key] = _fit_ridge(X[pos], y[pos], alpha)
+        return cls(segments, ref_year, alpha)
+
+    # ---------------- puntuación ----------------
+    def _resolve(self, seg_key: str, brand_key: str) -> int:
+        i = self.index.get(seg_key)
+        if i is None:
+            i = self.index.get(brand_key, self.index[GLOBAL])
+        return i
+
+    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """fair_price, discount (precio/justo - 1), z y deal para todas las filas de una vez."""
+        X = design_matrix(df, self.ref_year)
+        seg, brand = _segment_columns(df)
+        idx = seg.map(self.index).fillna(brand.map(self.index)).fillna(self.index[GLOBAL]).to_numpy(dtype=np.int64)
+        Z = (X - self.M[idx]) / self.S[idx]
+        Z[np.isnan(Z)] = 0.0
+        pred = self.B[idx] + np.einsum("ij,ij->i", Z, self.C[idx])
+        price = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (np.log(price) - pred) / self.sigma[idx]
+        fair = np.exp(pred)
+        discount = price / fair - 1
+        return pd.DataFrame({
+            "segment": np.array(self.keys, dtype=object)[idx],
+            "fair_price": fair.round(0),
+            "discount": discount,
+            "z": z,
+            "deal": (discount <= -DEAL_DISCOUNT) & (z <= DEAL_Z),
+        }, index=df.index)
+
+    def score_row(self, row: dict) -> dict:
+        """Versión por fila para anuncios recién scrapeados (sin pandas)."""
+        seg = self.segments[self.keys[self._resolve(*_segment_keys(row.get("brand"), row.get("model")))]]
+        x = [math.nan] * len(FEATURES)
+        if row.get("year") is not None:
+            age = self.ref_year - float(row["year"])
+            x[0], x[1] = age, age * age
+        if row.get("km") is not None:
+            x[2] = float(row["km"]) / 10_000
+        if row.get("kw") is not None:
+            x[3] = float(row["kw"]) / 10
+        tags = _tag_set(row.get("tags"), row.get("title"))
+        for j, t in enumerate(TAG_FEATURES, start=len(NUMERIC_FEATURES)):
+            x[j] = 1.0 if t in tags else 0.0
+
+        pred = seg["intercept"]
+        for v, m, s, c in zip(x, seg["mean"], seg["scale"], seg["coef"]):
+            if v == v:
+                pred += (v - m) / s * c
+        fair = math.exp(pred)
+        price = row.get("price", row.get("price_eur"))
+        if not price:
+            return {"fair_price": round(fair), "discount": None, "z": None, "deal": False}
+        z = (math.log(float(price)) - pred) / seg["sigma"]
+        discount = float(price) / fair - 1
+        return {"fair_price": round(fair), "discount": discount, "z": z,
+                "deal": discount <= -DEAL_DISCOUNT and z <= DEAL_Z}
+
+    # ---------------- persistencia ----------------
+    def save(self, path: Path = MODEL_JSON) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"features": FEATURES, "ref_year": self.ref_year, "alpha": self.alpha, "segments": self.segments}
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = MODEL_JSON) -> "FairPriceModel":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data["features"] != FEATURES:
+            raise ValueError(f"{path} se ajustó con otras features; vuelve a ejecutar 'fit'")
+        return cls(data["segments"], data["ref_year"], data.get("alpha", RIDGE_ALPHA))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Precio justo por segmento (ridge) y chollos")
+    ap.add_argument("--model", type=Path, default=MODEL_JSON)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    f = sub.add_parser("fit")
+    f.add_argument("--input", type=Path, required=True)
+    f.add_argument("--alpha", type=float, default=RIDGE_ALPHA)
+    f.add_argument("--min-rows", type=int, default=MIN_SEGMENT_ROWS)
+
+    s = sub.add_parser("score")
+    s.add_argument("--input", type=Path, required=True)
+    s.add_argument("--out", type=Path, required=True)
+
+    args = ap.parse_args()
+    df = pd.read_parquet(args.input)
+
+    if args.cmd == "fit":
+        t0 = time.perf_counter()
+        model = FairPriceModel.fit(df, alpha=args.alpha, min_rows=args.min_rows)
+        model.save(args.model)
+        print(f"Filas: {len(df)} | segmentos: {len(model.segments)} | {time.perf_counter() - t0:.2f}s")
+        print("Modelo:", args.model)
+        return
+
+    model = FairPriceModel.load(args.model)
+    t0 = time.perf_counter()
+    scored = df.join(model.score(df))
+    dt = time.perf_counter() - t0
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    scored.to_parquet(args.out, index=False)
+    print(f"Filas: {len(df)} en {dt:.2f}s | chollos: {int(scored['deal'].sum())}")
+    print("Parquet:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Comparables entre países: para cada anuncio alemán, los k españoles más parecidos.
+
+Bloqueo por (marca, modelo) normalizados y, dentro de cada bloque, un
+cKDTree sobre (year, km, kw) escalados. Cada bloque se consulta en lote, así
+el coste es ~n·log n en vez de comparar todos contra todos.
+
+    python -m src.matching.matcher match --de data/processed/mobile_de_clean.parquet \
+        --es data/processed/coches_net_clean.parquet --out data/processed/matches.parquet
+    python -m src.matching.matcher bench --n 100000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.utils.normalize import MODELS
+
+K = 5
+# unidades equivalentes: 1 año ~ 10.000 km ~ 10 kW de diferencia
+FEATURE_SCALE = {"year": 1.0, "km": 10_000.0, "kw": 10.0}
+BLOCK_COLUMNS = ["brand", "model"]
+# (marca, modelo) canónicos de src/utils/normalize.py, en minúsculas
+CANONICAL_MODELS = [(b.lower(), m.lower()) for b, models in MODELS.items() for m in models]
+
+
+def block_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    (brand, model) en minúsculas. Los modelos canónicos del normalizador van
+    enteros ("serie 3", "a3 sportback"); solo los que no resolvió se quedan
+    con el primer token (como el notebook).
+    """
+    brand = df["brand"].astype("string").str.strip().str.lower()
+    model = df["model"].astype("string").str.strip().str.lower()
+    canonical = pd.MultiIndex.from_arrays([brand, model]).isin(CANONICAL_MODELS)
+    return pd.DataFrame({
+        "brand": brand,
+        "model": model.where(canonical, model.str.split().str[0]),
+    }, index=df.index)
+
+
+def _features(de: pd.DataFrame, es: pd.DataFrame) -> list[str]:
+    # solo las columnas que tienen datos en los dos lados
+    return [c for c in FEATURE_SCALE if c in de and c in es and de[c].notna().any() and es[c].notna().any()]
+
+
+def _scaled(df: pd.DataFrame, cols: list[str]) -> np.ndarray:
+    X = np.empty((len(df), len(cols)), dtype="float64")
+    for j, c in enumerate(cols):
+        X[:, j] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan) / FEATURE_SCALE[c]
+    return X
+
+
+def _fill_nan(X: np.ndarray, fill: np.ndarray) -> np.ndarray:
+    mask = np.isnan(X)
+    if mask.any():
+        X = X.copy()
+        X[mask] = np.take(fill, np.nonzero(mask)[1])
+    return X
+
+
+def match(de: pd.DataFrame, es: pd.DataFrame, k: int = K, max_distance: float | None = None,
+          workers: int = -1) -> pd.DataFrame:
+    """
+    Devuelve una fila por (anuncio DE, comparable ES): de_index, es_index, rank, distance.
+    Los índices son los del DataFrame de entrada.
+    """
+    cols = _features(de, es)
+    if not cols:
+        raise ValueError(f"Sin columnas comunes para comparar (se esperan {list(FEATURE_SCALE)})")
+
+    Xde = _scaled(de, cols)
+    Xes = _scaled(es, cols)
+    de_groups = block_keys(de).groupby(BLOCK_COLUMNS, sort=False).indices
+    es_groups = block_keys(es).groupby(BLOCK_COLUMNS, sort=False).indices
+
+    out_de, out_es, out_rank, out_dist = [], [], [], []
+    for key, de_pos in de_groups.items():
+        es_pos = es_groups.get(key)
+        if es_pos is None:
+            continue
+        A, B = Xde[de_pos], Xes[es_pos]
+        # huecos (p.ej. sin kW) -> mediana del bloque español
+        fill = np.nanmedian(B, axis=0) if np.isnan(B).any() or np.isnan(A).any() else None
+        if fill is not None:
+            fill = np.where(np.isnan(fill), np.nanmedian(A, axis=0), fill)
+            fill = np.nan_to_num(fill)
+            A, B = _fill_nan(A, fill), _fill_nan(B, fill)
+
+        kk = min(k, len(es_pos))
+        dist, idx = cKDTree(B).query(A, k=kk, workers=workers,
+                                      distance_upper_bound=np.inf if max_distance is None else max_distance)
+        dist = dist.reshape(len(de_pos), kk)
+        idx = idx.reshape(len(de_pos), kk)
+        ok = np.isfinite(dist)
+        rows, ranks = np.nonzero(ok)
+        out_de.append(de_pos[rows])
+        out_es.append(es_pos[idx[rows, ranks]])
+        out_rank.append(ranks + 1)
+        out_dist.append(dist[rows, ranks])
+
+    if not out_de:
+        return pd.DataFrame({"de_index": [], "es_index": [], "rank": [], "distance": []})
+    return pd.DataFrame({
+        "de_index": de.index.to_numpy()[np.concatenate(out_de)],
+        "es_index": es.index.to_numpy()[np.concatenate(out_es)],
+        "rank": np.concatenate(out_rank).astype("int16"),
+        "distance": np.concatenate(out_dist),
+    })
+
+
+# ---------------- benchmark ----------------
+def synthetic_listings(n: int, n_blocks: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    block = rng.zipf(1.3, n) % n_blocks   # bloques con tamaños desiguales, como en la realidad
+    return pd.DataFrame({
+        "brand": (block // 20).astype(str),
+        "model": (block % 20).astype(str),
+        "year": rng.integers(2008, 2025, n),
+        "km": rng.integers(0, 250_000, n),
+        "kw": rng.integers(50, 300, n),
+        "price": rng.integers(2_000, 80_000, n),
+    })
+
+
+def bench(n: int, k: int = K, check: int = 200) -> None:
+    de = synthetic_listings(n, seed=1)
+    es = synthetic_listings(n, seed=2)
+
+    t0 = time.perf_counter()
+    res = match(de, es, k=k)
+    dt = time.perf_counter() - t0
+    print(f"{n:,} × {n:,} | k={k} | {len(res):,} pares en {dt:.2f}s ({n / dt:,.0f} anuncios DE/s)")
+
+    # comprobación contra fuerza bruta en una muestra
+    rng = np.random.default_rng(3)
+    cols = list(FEATURE_SCALE)
+    Xde, Xes = _scaled(de, cols), _scaled(es, cols)
+    kde, kes = block_keys(de), block_keys(es)
+    first = res[res["rank"] == 1].set_index("de_index")["distance"]
+    bad = 0
+    for i in rng.choice(n, size=min(check, n), replace=False):
+        same = ((kes["brand"] == kde.at[i, "brand"]) & (kes["model"] == kde.at[i, "model"])).to_numpy()
+        if not same.any():
+            continue
+        d = np.sqrt(((Xes[same] - Xde[i]) ** 2).sum(axis=1)).min()
+        if not np.isclose(d, first.get(i, np.inf)):
+            bad += 1
+    print(f"Fuerza bruta en {check} anuncios: {'OK' if bad == 0 else f'{bad} diferencias'}")
+
+    es_sizes = kes.groupby(BLOCK_COLUMNS).size()
+    pairs = (kde.groupby(BLOCK_COLUMNS).size() * es_sizes).sum()
+    print(f"Sin KD-tree serían {pairs:,.0f} distancias dentro de los bloques ({n * n:,} sin bloqueo)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Comparables DE -> ES por bloque (marca, modelo) + KD-tree")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    m = sub.add_parser("match")
+    m.add_argument("--de", type=Path, required=True)
+    m.add_argument("--es", type=Path, required=True)
+    m.add_argument("--out", type=Path, required=True)
+    m.add_argument("--k", type=int, default=K)
+    m.add_argument("--max-distance", type=float)
+
+    b = sub.add_parser("bench")
+    b.add_argument("--n", type=int, default=100_000)
+    b.add_argument("--k", type=int, default=K)
+
+    args = ap.parse_args()
+    if args.cmd == "bench":
+        bench(args.n, args.k)
+        return
+
+    de = pd.read_parquet(args.de)
+    es = pd.read_parquet(args.es)
+    res = match(de, es, k=args.k, max_distance=args.max_distance)
+    res = res.join(de[["url", "price"]].add_prefix("de_"), on="de_index") \
+             .join(es[["url", "price"]].add_prefix("es_"), on="es_index")
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    res.to_parquet(args.out, index=False)
+    print(f"Anuncios DE con comparables: {res['de_index'].nunique()} / {len(de)} | pares: {len(res)}")
+    print("Parquet:", args.out)
+
+
+if __name__ == "__main__":
+    main()
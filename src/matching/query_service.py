@@ -0,0 +1,320 @@
+"""
+API local de consultas sobre los anuncios limpios.
+
+Carga los Parquet limpios en un índice columnar en memoria ordenado por
+(marca, modelo, año): cada segmento es un rango contiguo y el año se busca
+con searchsorted. Filtros por país / bin de km / combustible con bitmaps
+booleanos precalculados. Respuestas en una caché LRU que se vacía al recargar
+(POST /refresh o cuando cambia el mtime de algún Parquet).
+
+    python -m src.matching.query_service --data data/processed/mobile_de_clean.parquet \
+        --data data/processed/coches_net_clean.parquet
+
+    curl "localhost:8765/segment?brand=Volkswagen&model=Golf&year=2018&max_km=100000"
+    curl "localhost:8765/comparables?brand=Volkswagen&model=Golf&year=2018&km=80000&country=ES&k=5"
+    curl "localhost:8765/deals?brand=Audi&model=A3&limit=20"
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning.cube import KM_BINS
+from src.matching.fair_price import MODEL_JSON as FAIR_PRICE_JSON, FairPriceModel
+from src.matching.matcher import FEATURE_SCALE
+
+HOST = "127.0.0.1"
+PORT = 8765
+CACHE_SIZE = 1024
+MTIME_CHECK_SECONDS = 5
+MAX_ROWS = 200
+
+KM_LABELS = [f"({lo}, {hi}]" for lo, hi in zip(KM_BINS[:-1], KM_BINS[1:])]
+OUT_FIELDS = ["brand", "model", "year", "km", "price", "country", "title", "url"]
+
+
+class ListingIndex:
+    def __init__(self, df: pd.DataFrame, fair_model: FairPriceModel | None = None):
+        df = df.reset_index(drop=True)
+        brand_l = df["brand"].astype("string").str.lower().fillna("")
+        model_l = df["model"].astype("string").str.lower().fillna("")
+        year = pd.to_numeric(df["year"], errors="coerce").fillna(0).astype("int64")
+        order = np.lexsort((year.to_numpy(), model_l.to_numpy(), brand_l.to_numpy()))
+        df = df.iloc[order].reset_index(drop=True)
+        self.n = len(df)
+
+        # columnas como arrays contiguos
+        self.year = year.to_numpy()[order]
+        self.km = pd.to_numeric(df["km"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        self.price = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        self.kw = (pd.to_numeric(df["kw"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                   if "kw" in df else np.full(self.n, np.nan))
+        self.rows = df[[c for c in OUT_FIELDS if c in df]]
+
+        # segmento (marca, modelo) -> [inicio, fin)
+        keys = (brand_l.to_numpy()[order] + "|" + model_l.to_numpy()[order])
+        starts = np.r_[0, np.nonzero(keys[1:] != keys[:-1])[0] + 1] if self.n else np.array([], dtype=np.int64)
+        ends = np.r_[starts[1:], self.n] if self.n else starts
+        self.segments = {keys[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+
+        # bitmaps
+        self.bitmaps: dict[tuple[str, str], np.ndarray] = {}
+        country = df["country"].astype("string").fillna("")
+        for c in country.unique():
+            self.bitmaps[("country", c)] = (country == c).to_numpy()
+        km_bin = pd.cut(self.km, bins=KM_BINS, labels=KM_LABELS).astype("string")
+        for label in KM_LABELS:
+            self.bitmaps[("km_bin", label)] = (km_bin == label).to_numpy(dtype=bool, na_value=False)
+        if "fuel" in df:
+            fuel = df["fuel"].astype("string").str.upper().fillna("")
+            for f in fuel.unique():
+                self.bitmaps[("fuel", f)] = (fuel == f).to_numpy()
+
+        self.scores = fair_model.score(df) if fair_model is not None and self.n else None
+
+    # ---------------- helpers ----------------
+    def _range(self, brand: str, model: str, year_from=None, year_to=None) -> tuple[int, int]:
+        seg = self.segments.get(f"{brand.lower()}|{model.lower()}")
+        if seg is None:
+            return 0, 0
+        s, e = seg
+        years = self.year[s:e]
+        lo = s + (np.searchsorted(years, int(year_from), side="left") if year_from is not None else 0)
+        hi = s + (np.searchsorted(years, int(year_to), side="right") if year_to is not None else e - s)
+        return int(lo), int(hi)
+
+    def _mask(self, lo: int, hi: int, q: dict) -> np.ndarray:
+        mask = np.ones(hi - lo, dtype=bool)
+        for field in ("country", "km_bin", "fuel"):
+            if field in q:
+                bm = self.bitmaps.get((field, q[field] if field == "km_bin" else q[field].upper()))
+                mask &= bm[lo:hi] if bm is not None else False
+        if "max_km" in q:
+            mask &= self.km[lo:hi] <= float(q["max_km"])
+        if "min_km" in q:
+            mask &= self.km[lo:hi] >= float(q["min_km"])
+        if "max_price" in q:
+            mask &= self.price[lo:hi] <= float(q["max_price"])
+        return mask
+
+    def _years(self, q: dict):
+        if "year" in q:
+            return q["year"], q["year"]
+        return q.get("year_from"), q.get("year_to")
+
+    def _records(self, positions: np.ndarray, extra: dict | None = None) -> list[dict]:
+        out = self.rows.iloc[positions].astype(object).where(lambda d: d.notna(), None).to_dict("records")
+        for name, values in (extra or {}).items():
+            for r, v in zip(out, values):
+                r[name] = None if v is None or v != v else float(v)
+        return out
+
+    # ---------------- consultas ----------------
+    def segment(self, q: dict) -> dict:
+        lo, hi = self._range(q["brand"], q["model"], *self._years(q))
+        mask = self._mask(lo, hi, {k: v for k, v in q.items() if k != "country"})
+        out = {}
+        for key, bm in self.bitmaps.items():
+            if key[0] != "country" or ("country" in q and key[1] != q["country"].upper()):
+                continue
+            prices = self.price[lo:hi][mask & bm[lo:hi]]
+            prices = prices[~np.isnan(prices)]
+            if len(prices) == 0:
+                continue
+            p25, p50, p75 = np.percentile(prices, [25, 50, 75])
+            out[key[1]] = {"count": int(len(prices)), "mean": round(float(prices.mean()), 1),
+                           "p25": float(p25), "median": float(p50), "p75": float(p75),
+                           "min": float(prices.min()), "max": float(prices.max())}
+        return {"query": q, "countries": out}
+
+    def comparables(self, q: dict) -> dict:
+        year = int(q["year"])
+        span = int(q.get("year_span", 2))
+        lo, hi = self._range(q["brand"], q["model"], year - span, year + span)
+        mask = self._mask(lo, hi, {k: v for k, v in q.items() if k in ("country", "fuel", "max_price")})
+        pos = np.nonzero(mask)[0] + lo
+        if len(pos) == 0:
+            return {"query": q, "results": []}
+        d2 = ((self.year[pos] - year) / FEATURE_SCALE["year"]) ** 2
+        if "km" in q:
+            d2 = d2 + np.nan_to_num((self.km[pos] - float(q["km"])) / FEATURE_SCALE["km"], nan=10.0) ** 2
+        if "kw" in q:
+            d2 = d2 + np.nan_to_num((self.kw[pos] - float(q["kw"])) / FEATURE_SCALE["kw"], nan=0.0) ** 2
+        k = min(int(q.get("k", 10)), MAX_ROWS, len(pos))
+        best = np.argpartition(d2, k - 1)[:k]
+        best = best[np.argsort(d2[best])]
+        return {"query": q, "results": self._records(pos[best], {"distance": np.sqrt(d2[best])})}
+
+    def deals(self, q: dict) -> dict:
+        if self.scores is None:
+            return {"query": q, "error": f"sin modelo de precio justo ({FAIR_PRICE_JSON})", "results": []}
+        if "brand" in q and "model" in q:
+            lo, hi = self._range(q["brand"], q["model"], *self._years(q))
+        else:
+            lo, hi = 0, self.n
+        mask = self._mask(lo, hi, q)
+        discount = self.scores["discount"].to_numpy()[lo:hi]
+        mask &= discount <= -float(q.get("min_discount", 0.15))
+        pos = np.nonzero(mask)[0] + lo
+        pos = pos[np.argsort(discount[pos - lo])][: min(int(q.get("limit", 50)), MAX_ROWS)]
+        fair = self.scores["fair_price"].to_numpy()
+        return {"query": q, "results": self._records(pos, {"fair_price": fair[pos],
+                                                             "discount": self.scores["discount"].to_numpy()[pos]})}
+
+
+class LRUCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class QueryService:
+    def __init__(self, paths: list[Path], cache_size: int = CACHE_SIZE):
+        self.paths = paths
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._checked = 0.0
+        self.index = None
+        self.loaded_at = None
+        self.refresh()
+
+    def _current_mtimes(self):
+        return tuple(p.stat().st_mtime if p.exists() else None for p in self.paths)
+
+    def refresh(self) -> None:
+        mtimes = self._current_mtimes()
+        t0 = time.perf_counter()
+        df = pd.concat([pd.read_parquet(p) for p in self.paths if p.exists()], ignore_index=True)
+        fair = FairPriceModel.load(FAIR_PRICE_JSON) if FAIR_PRICE_JSON.exists() else None
+        index = ListingIndex(df, fair)
+        with self._lock:
+            self.index = index        # se cambia de golpe; las consultas en curso usan el anterior
+            self._mtimes = mtimes
+            self.loaded_at = time.time()
+            self.cache.clear()
+        print(f"Índice: {index.n} anuncios, {len(index.segments)} segmentos en {time.perf_counter() - t0:.2f}s")
+
+    def maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < MTIME_CHECK_SECONDS:
+            return
+        self._checked = now
+        if self._current_mtimes() != self._mtimes:
+            self.refresh()
+
+    def query(self, endpoint: str, q: dict) -> dict:
+        self.maybe_refresh()
+        key = (endpoint, tuple(sorted(q.items())))
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        res = getattr(self.index, endpoint)(q)
+        self.cache.put(key, res)
+        return res
+
+
+ENDPOINTS = {
+    "/segment": ("segment", ("brand", "model")),
+    "/comparables": ("comparables", ("brand", "model", "year")),
+    "/deals": ("deals", ()),
+}
+
+
+def make_handler(service: QueryService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            q = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+            if parts.path == "/health":
+                self._send(200, {"rows": service.index.n, "loaded_at": service.loaded_at,
+                                 "cache_hits": service.cache.hits, "cache_misses": service.cache.misses})
+                return
+            if parts.path not in ENDPOINTS:
+                self._send(404, {"error": "endpoint desconocido", "endpoints": sorted(ENDPOINTS) + ["/health", "/refresh"]})
+                return
+            name, required = ENDPOINTS[parts.path]
+            missing = [r for r in required if r not in q]
+            if missing:
+                self._send(400, {"error": f"faltan parámetros: {', '.join(missing)}"})
+                return
+            t0 = time.perf_counter()
+            try:
+                res = service.query(name, q)
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(200, {**res, "ms": round((time.perf_counter() - t0) * 1000, 3)})
+
+        def do_POST(self):
+            if urlsplit(self.path).path != "/refresh":
+                self._send(404, {"error": "endpoint desconocido"})
+                return
+            service.refresh()
+            self._send(200, {"rows": service.index.n, "loaded_at": service.loaded_at})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="API local de consultas sobre anuncios limpios")
+    ap.add_argument("--data", type=Path, action="append", required=True, help="Parquet limpio (repetible)")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    args = ap.parse_args()
+
+    service = QueryService(args.data, args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,88 +11,93 @@ def safe_int(x: str | None):
     digits = re.sub(r"[^\d]", "", x)
     return int(digits) if digits else None
 
-def main():
-    if not HTML_PATH.exists():
-        print("No existe:", HTML_PATH.resolve())
-        print("Primero corré 05_connect_chrome_dump_html.py")
-        return
-
-    html = HTML_PATH.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "html.parser")
-
+CARD_SELECTORS = [
+    "article[data-testid*='card']",
+    "div[data-testid*='card']",
+    "div.mt-CardBasic",
+    "li[data-testid*='ad']",
+    "article",
+]
+
+def find_cards(soup):
     # Buscar cards (estrategia como en tu notebook)
     candidates = []
-    selectors = [
-        "article[data-testid*='card']",
-        "div[data-testid*='card']",
-        "div.mt-CardBasic",
-        "li[data-testid*='ad']",
-        "article",
-    ]
-
     best_pool = []
-    for css in selectors:
+    for css in CARD_SELECTORS:
         found = [c for c in soup.select(css) if c.select_one("a[href]")]
         if len(found) > len(best_pool):
             best_pool = found
         if len(found) >= 10:
             candidates = found
             break
-    if not candidates:
-        candidates = best_pool
+    return candidates or best_pool
 
-    print("Cards encontradas:", len(candidates))
+def parse_card(c) -> dict | None:
+    a = c.select_one("a[href]")
+    if not a:
+        return None
 
-    rows = []
-    for c in candidates:
-        a = c.select_one("a[href]")
-        if not a:
-            continue
+    href = a.get("href")
+    if not href:
+        return None
+
+    if href.startswith("http"):
+        url = href
+    elif href.startswith("/"):
+        url = "https://www.coches.net" + href
+    else:
+        url = None
 
-        href = a.get("href")
-        if not href:
-            continue
+    title_el = c.select_one("h3") or c.select_one("h2") or a
+    title = title_el.get_text(" ", strip=True) if title_el else None
 
-        if href.startswith("http"):
-            url = href
-        elif href.startswith("/"):
-            url = "https://www.coches.net" + href
-        else:
-            url = None
+    text_block = c.get_text(" ", strip=True)
 
-        title_el = c.select_one("h3") or c.select_one("h2") or a
-        title = title_el.get_text(" ", strip=True) if title_el else None
+    m_price = re.search(r"(\d[\d\.\s]*)\s*€", text_block)
+    price = safe_int(m_price.group(1)) if m_price else None
 
-        text_block = c.get_text(" ", strip=True)
+    m_year = re.search(r"\b(19\d{2}|20\d{2})\b", text_block)
+    year = int(m_year.group(1)) if m_year else None
 
-        m_price = re.search(r"(\d[\d\.\s]*)\s*€", text_block)
-        price = safe_int(m_price.group(1)) if m_price else None
+    m_km = re.search(r"(\d[\d\.\s]*)\s*km\b", text_block, flags=re.I)
+    km = safe_int(m_km.group(1)) if m_km else None
 
-        m_year = re.search(r"\b(19\d{2}|20\d{2})\b", text_block)
-        year = int(m_year.group(1)) if m_year else None
+    m_cv = re.search(r"\b(\d{2,3})\s*cv\b", text_block, flags=re.I)
+    cv = int(m_cv.group(1)) if m_cv else None
 
-        m_km = re.search(r"(\d[\d\.\s]*)\s*km\b", text_block, flags=re.I)
-        km = safe_int(m_km.group(1)) if m_km else None
+    # filtro mínimo anti-basura
+    if not title or not price or not year or price < 2000:
+        return None
 
-        m_cv = re.search(r"\b(\d{2,3})\s*cv\b", text_block, flags=re.I)
-        cv = int(m_cv.group(1)) if m_cv else None
+    return {
+        "titulo": title,
+        "url": url,
+        "precio": price,
+        "anio": year,
+        "km": km,
+        "cv": cv
+    }
+
+def parse_dump(html: str) -> list[dict]:
+    """Cards válidas de un volcado HTML de coches.net (sin deduplicar)."""
+    soup = BeautifulSoup(html, "html.parser")
+    return [row for row in map(parse_card, find_cards(soup)) if row]
 
-        # filtro mínimo anti-basura
-        if not title or not price or not year or price < 2000:
-            continue
+def main():
+    if not HTML_PATH.exists():
+        print("No existe:", HTML_PATH.resolve())
+        print("Primero corré 05_connect_chrome_dump_html.py")
+        return
 
-        rows.append({
-            "titulo": title,
-            "url": url,
-            "precio": price,
-            "anio": year,
-            "km": km,
-            "cv": cv
-        })
+    html = HTML_PATH.read_text(encoding="utf-8", errors="ignore")
+    soup = BeautifulSoup(html, "html.parser")
+    candidates = find_cards(soup)
+    print("Cards encontradas:", len(candidates))
 
+    rows = [row for row in map(parse_card, candidates) if row]
     df = pd.DataFrame(rows).drop_duplicates(subset=["url", "titulo"])
     print("Anuncios válidos:", len(df))
     print(df.head(10).to_string(index=False))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,479 @@
+import asyncio
+import sys
+import re
+import csv
+import random
+from collections import deque
+from pathlib import Path
+from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright
+
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.page_archive import PageArchive
+from src.utils.schema import LISTING_FIELDS, coerce_row
+
+# ===================== CONFIG =====================
+HEADLESS = False
+SLOW_MODE = True
+
+BASE_URL = "https://www.coches.net/segunda-mano/?pg={pg}"
+# "listing" = paginar BASE_URL; "frontier" = visitar los anuncios de FRONTIER_TXT
+SOURCE = "listing"
+FRONTIER_TXT = Path("data/raw/coches_net_frontier.txt")   # lo llena sitemap_crawler.py
+USER_DATA_DIR = Path("pw_profile_cochesnet")
+CSV_OUT = Path("data/raw/coches_net_listings.csv")
+ARCHIVE_DIR = Path("data/archive")    # None = no archivar el HTML
+
+MAX_PAGES = 500
+CONCURRENCY = 3           # pestañas en paralelo dentro del mismo perfil
+MAX_RETRIES = 2           # una página/anuncio que falla vuelve a la cola hasta 2 veces
+DROPPED_TXT = Path("data/raw/coches_net_dropped_pages.txt")   # los que fallan todos los intentos
+METRICS_PORT = None       # p.ej. 9109 para exponer /metrics
+# ===================== /CONFIG =====================
+
+METRICS = Metrics("coches.net", snapshot_path=METRICS_DIR / "coches_net_crawler.json")
+
+# Una sola evaluación en la página: devuelve todas las cards ya "aplanadas".
+CARDS_JS = """
+() => {
+  const cards = document.querySelectorAll("div.mt-CardAd, article[data-testid*='card'], div[data-testid*='card']");
+  const out = [];
+  for (const c of cards) {
+    const a = c.querySelector("a.mt-CardAd-infoHeaderTitleLink") || c.querySelector("a[href*='covo.aspx']") || c.querySelector("a[href]");
+    if (!a) continue;
+    const title = c.querySelector("h2, h3, .mt-CardAd-infoHeaderTitle");
+    const price = c.querySelector(".mt-CardAdPrice-cashAmount");
+    out.push({
+      href: a.href,
+      title: (title ? title.innerText : a.innerText || "").trim(),
+      price: price ? price.innerText.trim() : null,
+      attrs: Array.from(c.querySelectorAll(".mt-CardAd-attrItem")).map(e => e.innerText.trim()),
+      text: c.innerText || "",
+    });
+  }
+  return out;
+}
+"""
+
+# Ficha de un anuncio con la misma forma que una card: parse_card saca precio,
+# año, km y CV del texto con las heurísticas de respaldo.
+AD_JS = """
+() => {
+  const h1 = document.querySelector("h1");
+  const main = document.querySelector("main") || document.body;
+  return {
+    href: location.href,
+    title: (h1 ? h1.innerText : document.title || "").trim(),
+    price: null,
+    attrs: [],
+    text: main.innerText || "",
+  };
+}
+"""
+
+# Página sin cards: bloqueo anti-bot (debug_cochesnet_pg1.html), render a medias o
+# fin real del listado. Solo el último baja last_pg; los otros dos se reintentan.
+BLOCK_RX = re.compile(r"eres un bot|algo no va bien|captcha-delivery|geo\.captcha|access denied", re.I)
+PAGE_LINK_RX = re.compile(r'aria-label="P[áa]gina (\d+)"')
+TOTAL_RX = re.compile(r"([\d.]+)\s+coches de segunda mano", re.I)
+
+FUEL_MAP = {
+    "gasolina": "PETROL",
+    "diesel": "DIESEL",
+    "diésel": "DIESEL",
+    "híbrido": "HYBRID",
+    "hibrido": "HYBRID",
+    "híbrido enchufable": "HYBRID",
+    "eléctrico": "ELECTRIC",
+    "electrico": "ELECTRIC",
+    "glp": "LPG",
+    "gnc": "CNG",
+}
+
+# ---------------- parsing ----------------
+def safe_int(x: str | None):
+    if not x:
+        return None
+    digits = re.sub(r"[^\d]", "", x)
+    return int(digits) if digits else None
+
+def extract_ad_id(url: str) -> str | None:
+    m = re.search(r"-(\d+)-covo\.aspx", url or "")
+    return m.group(1) if m else None
+
+def parse_card(card: dict) -> dict | None:
+    url = (card.get("href") or "").split("?")[0]
+    title = " ".join((card.get("title") or "").split())
+    text = " ".join((card.get("text") or "").split())
+    if not url or not title:
+        return None
+
+    price = safe_int(card.get("price"))
+    if price is None:
+        m_price = re.search(r"(\d{1,3}(?:\.\d{3})+|\d+)\s*€", text)
+        price = safe_int(m_price.group(1)) if m_price else None
+
+    fuel = year = km = cv = location = None
+    for attr in card.get("attrs") or []:
+        a = attr.strip()
+        al = a.lower()
+        if al in FUEL_MAP:
+            fuel = FUEL_MAP[al]
+        elif re.fullmatch(r"(19|20)\d{2}", a):
+            year = int(a)
+        elif al.endswith("km"):
+            km = safe_int(a)
+        elif re.fullmatch(r"\d{2,4}\s*cv", al):
+            cv = safe_int(a)
+        elif a and location is None:
+            location = a
+
+    # fallback: heurísticas de 06_parse_dump_html.py sobre el texto completo
+    if year is None:
+        m_year = re.search(r"\b(19\d{2}|20\d{2})\b", text)
+        year = int(m_year.group(1)) if m_year else None
+    if km is None:
+        m_km = re.search(r"(\d[\d\.,]*)\s*km\b", text, flags=re.I)
+        km = safe_int(m_km.group(1)) if m_km else None
+    if cv is None:
+        m_cv = re.search(r"\b(\d{2,3})\s*cv\b", text, flags=re.I)
+        cv = int(m_cv.group(1)) if m_cv else None
+
+    toks = title.split()
+    brand = toks[0] if toks else None
+    model = " ".join(toks[1:]) if len(toks) > 1 else None
+
+    return coerce_row({
+        "url": url,
+        "title": title,
+        "brand": brand,
+        "model": model,
+        "price_eur": price,
+        "km": km,
+        "kw": int(round(cv / 1.3596)) if cv else None,
+        "cv": cv,
+        "fuel": fuel,
+        "first_registration": str(year) if year else None,
+        "year": year,
+        "location": location,
+    }, country="ES")
+
+def empty_page_reason(html: str, pg: int) -> str:
+    """"blocked" | "end" (la paginación o el total dicen que no hay página pg) | "unrendered"."""
+    if BLOCK_RX.search(html):
+        return "blocked"
+    pages = [int(n) for n in PAGE_LINK_RX.findall(html)]
+    if pages and pg > max(pages):
+        return "end"
+    m = TOTAL_RX.search(html)
+    if m and safe_int(m.group(1)) == 0:
+        return "end"
+    return "unrendered"
+
+def parse_cards_html(html: str, url: str | None = None) -> list[dict]:
+    """Equivalente en BeautifulSoup de CARDS_JS, para HTML archivado/dumps."""
+    soup = BeautifulSoup(html, "html.parser")
+    rows = []
+    for c in soup.select("div.mt-CardAd, article[data-testid*='card'], div[data-testid*='card']"):
+        a = c.select_one("a.mt-CardAd-infoHeaderTitleLink") or c.select_one("a[href*='covo.aspx']") or c.select_one("a[href]")
+        if not a:
+            continue
+        href = a.get("href") or ""
+        if href.startswith("/"):
+            href = "https://www.coches.net" + href
+        title = c.select_one("h2, h3, .mt-CardAd-infoHeaderTitle")
+        price = c.select_one(".mt-CardAdPrice-cashAmount")
+        row = parse_card({
+            "href": href,
+            "title": (title or a).get_text(" ", strip=True),
+            "price": price.get_text(" ", strip=True) if price else None,
+            "attrs": [e.get_text(" ", strip=True) for e in c.select(".mt-CardAd-attrItem")],
+            "text": c.get_text(" ", strip=True),
+        })
+        if row:
+            rows.append(row)
+    return rows
+
+# ---------------- IO ----------------
+def ensure_csv_header(path: Path, fieldnames: list[str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        with path.open("w", newline="", encoding="utf-8") as f:
+            csv.DictWriter(f, fieldnames=fieldnames).writeheader()
+
+def append_rows_csv(path: Path, fieldnames: list[str], rows: list[dict]) -> None:
+    with path.open("a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writerows(rows)
+
+def append_dropped(path: Path, url: str, error: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8", newline="\n") as f:
+        f.write(f"{url}\t{error}\n")
+
+def load_frontier(path: Path, known: set[str]) -> deque:
+    """URLs del frontier sin guardar todavía, una por anuncio: deque de (url, intento)."""
+    out = deque()
+    if not path.exists():
+        return out
+    seen = set(known)
+    with path.open("r", encoding="utf-8") as f:
+        for ln in f:
+            url = ln.strip()
+            ad_id = extract_ad_id(url) or url
+            if url and ad_id not in seen:
+                seen.add(ad_id)
+                out.append((url, 0))
+    return out
+
+def load_known_ids(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        return {extract_ad_id(r.get("url", "")) for r in csv.DictReader(f)} - {None}
+
+# ---------------- crawl ----------------
+async def human_pause(min_ms=1500, max_ms=3500, wid: int | None = None):
+    if not SLOW_MODE:
+        return
+    with METRICS.timer("pause", worker=wid):
+        await asyncio.sleep(random.uniform(min_ms/1000, max_ms/1000))
+
+async def fetch_cards(page, pg: int, archive: PageArchive | None = None,
+                      wid: int | None = None) -> tuple[list[dict], str | None]:
+    """(cards, html). El HTML se lee si hay que archivarlo o si no salió ninguna card."""
+    url = BASE_URL.format(pg=pg)
+    with METRICS.timer("navigation", worker=wid):
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    METRICS.inc("pages", worker=wid)
+    with METRICS.timer("ready", worker=wid):
+        try:
+            await page.wait_for_selector("div.mt-CardAd", timeout=15000)
+        except Exception:
+            pass
+    with METRICS.timer("extraction", worker=wid):
+        cards = await page.evaluate(CARDS_JS)
+    html = None
+    if archive or not cards:
+        html = await page.content()
+    if archive:
+        # también las páginas vacías: un bloqueo queda guardado para diagnosticarlo
+        with METRICS.timer("write", worker=wid):
+            METRICS.inc("bytes", len(html.encode("utf-8")), worker=wid)
+            archive.add(url, html, site="coches.net", kind="search")
+    return cards, html
+
+async def fetch_ad(page, url: str, archive: PageArchive | None = None, wid: int | None = None) -> dict:
+    with METRICS.timer("navigation", worker=wid):
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    METRICS.inc("pages", worker=wid)
+    with METRICS.timer("ready", worker=wid):
+        try:
+            await page.wait_for_selector("h1", timeout=15000)
+        except Exception:
+            pass
+    with METRICS.timer("extraction", worker=wid):
+        card = await page.evaluate(AD_JS)
+    card["href"] = url
+    if archive:
+        with METRICS.timer("write", worker=wid):
+            html = await page.content()
+            METRICS.inc("bytes", len(html.encode("utf-8")), worker=wid)
+            archive.add(url, html, site="coches.net", kind="detail")
+    return card
+
+def save_cards(wid: int, cards: list[dict], state: dict) -> int:
+    """Parsea, deduplica contra state["known"] y añade al CSV. Con el lock tomado."""
+    rows = []
+    for card in cards:
+        row = parse_card(card)
+        if not row:
+            continue
+        ad_id = extract_ad_id(row["url"]) or row["url"]
+        if ad_id in state["known"]:
+            continue
+        state["known"].add(ad_id)
+        rows.append(row)
+    if rows:
+        with METRICS.timer("write", worker=wid):
+            append_rows_csv(CSV_OUT, LISTING_FIELDS, rows)
+        METRICS.inc("rows", len(rows), worker=wid)
+    state["saved"] += len(rows)
+    state["pages"] += 1
+    return len(rows)
+
+async def next_page(state: dict, lock: asyncio.Lock) -> tuple[int, int] | None:
+    """
+    (pg, intento): primero las páginas a reintentar, luego la siguiente nueva.
+    Sin páginas pero con otras en vuelo se espera: pueden fallar y volver a la cola.
+    """
+    while True:
+        async with lock:
+            while state["retry"]:
+                pg, attempt = state["retry"].popleft()
+                if pg <= state["last_pg"]:
+                    state["in_flight"] += 1
+                    return pg, attempt
+            if state["next_pg"] <= state["last_pg"]:
+                pg = state["next_pg"]
+                state["next_pg"] += 1
+                state["in_flight"] += 1
+                return pg, 0
+            if not state["in_flight"]:
+                return None
+        await asyncio.sleep(1)
+
+async def worker(wid: int, context, state: dict, lock: asyncio.Lock):
+    page = await context.new_page()
+    await page.set_extra_http_headers({"Accept-Language": "es-ES,es;q=0.9"})
+    try:
+        while True:
+            item = await next_page(state, lock)
+            if item is None:
+                return
+            pg, attempt = item
+            try:
+                if not await crawl_page(wid, page, pg, attempt, state, lock):
+                    return
+            finally:
+                async with lock:
+                    state["in_flight"] -= 1
+    finally:
+        await page.close()
+
+async def requeue_page(wid: int, pg: int, attempt: int, state: dict, lock: asyncio.Lock, error: str) -> None:
+    async with lock:
+        if attempt < MAX_RETRIES:
+            state["retry"].append((pg, attempt + 1))
+            print(f"  [w{wid}] pg={pg} {error} -> reintento {attempt + 1}/{MAX_RETRIES}")
+            METRICS.inc("retries", worker=wid)
+        else:
+            state["dropped"].append(BASE_URL.format(pg=pg))
+            append_dropped(DROPPED_TXT, BASE_URL.format(pg=pg), error)
+            print(f"  [w{wid}] pg={pg} {error} -> descartada tras {MAX_RETRIES} reintentos")
+            METRICS.inc("dropped", worker=wid)
+
+async def crawl_page(wid: int, page, pg: int, attempt: int, state: dict, lock: asyncio.Lock) -> bool:
+    """Una página del listado. False = fin de paginación confirmado."""
+    try:
+        cards, html = await fetch_cards(page, pg, state["archive"], wid)
+    except Exception as e:
+        await requeue_page(wid, pg, attempt, state, lock, f"error: {e!r}")
+        await human_pause(5000, 8000, wid)
+        return True
+
+    if not cards:
+        reason = empty_page_reason(html or "", pg)
+        if reason == "end":
+            async with lock:
+                state["last_pg"] = min(state["last_pg"], pg - 1)
+            print(f"  [w{wid}] pg={pg} sin cards. Fin de paginación.")
+            return False
+        if reason == "blocked":
+            METRICS.inc("blocks", worker=wid)
+        await requeue_page(wid, pg, attempt, state, lock, f"sin cards ({reason})")
+        await human_pause(*((20000, 40000) if reason == "blocked" else (5000, 8000)), wid=wid)
+        return True
+
+    async with lock:
+        n = save_cards(wid, cards, state)
+
+    print(f"  [w{wid}] pg={pg} cards={len(cards)} nuevos={n} total={state['saved']}")
+    await human_pause(wid=wid)
+    return True
+
+async def next_ad(state: dict, lock: asyncio.Lock) -> tuple[str, int] | None:
+    while True:
+        async with lock:
+            if state["frontier"]:
+                state["in_flight"] += 1
+                return state["frontier"].popleft()
+            if not state["in_flight"]:
+                return None
+        await asyncio.sleep(1)
+
+async def ad_worker(wid: int, context, state: dict, lock: asyncio.Lock):
+    """Modo frontier: un anuncio por navegación; los fallos vuelven al final de la cola."""
+    page = await context.new_page()
+    await page.set_extra_http_headers({"Accept-Language": "es-ES,es;q=0.9"})
+    try:
+        while True:
+            item = await next_ad(state, lock)
+            if item is None:
+                return
+            url, attempt = item
+            try:
+                await crawl_ad(wid, page, url, attempt, state, lock)
+            finally:
+                async with lock:
+                    state["in_flight"] -= 1
+    finally:
+        await page.close()
+
+async def crawl_ad(wid: int, page, url: str, attempt: int, state: dict, lock: asyncio.Lock) -> None:
+    try:
+        card = await fetch_ad(page, url, state["archive"], wid)
+    except Exception as e:
+        async with lock:
+            if attempt < MAX_RETRIES:
+                state["frontier"].append((url, attempt + 1))
+                print(f"  [w{wid}] {url} error: {e!r} -> reintento {attempt + 1}/{MAX_RETRIES}")
+                METRICS.inc("retries", worker=wid)
+            else:
+                state["dropped"].append(url)
+                append_dropped(DROPPED_TXT, url, repr(e))
+                print(f"  [w{wid}] {url} error: {e!r} -> descartado tras {MAX_RETRIES} reintentos")
+                METRICS.inc("dropped", worker=wid)
+        await human_pause(5000, 8000, wid)
+        return
+
+    async with lock:
+        n = save_cards(wid, [card], state)
+        left = len(state["frontier"])
+    print(f"  [w{wid}] {url} nuevo={n} total={state['saved']} quedan={left}")
+    await human_pause(wid=wid)
+
+async def main():
+    ensure_csv_header(CSV_OUT, LISTING_FIELDS)
+    known = load_known_ids(CSV_OUT)
+    print("Anuncios ya guardados:", len(known))
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+
+    USER_DATA_DIR.mkdir(exist_ok=True)
+    state = {"next_pg": 1, "last_pg": MAX_PAGES, "known": known, "saved": 0, "pages": 0,
+             "retry": deque(), "in_flight": 0, "dropped": [],
+             "archive": PageArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None}
+    lock = asyncio.Lock()
+    run = worker
+    if SOURCE == "frontier":
+        state["frontier"] = load_frontier(FRONTIER_TXT, known)
+        print(f"Anuncios pendientes en {FRONTIER_TXT}:", len(state["frontier"]))
+        run = ad_worker
+
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
+            user_data_dir=str(USER_DATA_DIR),
+            headless=HEADLESS,
+            args=["--disable-blink-features=AutomationControlled"],
+            viewport={"width": 1280, "height": 850},
+            locale="es-ES",
+        )
+        try:
+            await asyncio.gather(*(run(i + 1, context, state, lock) for i in range(CONCURRENCY)))
+        finally:
+            await context.close()
+
+    print("\n=== FIN ===")
+    print("Páginas recorridas:", state["pages"])
+    print("Guardados esta corrida:", state["saved"])
+    if state["dropped"]:
+        print(f"Descartadas ({len(state['dropped'])}):", DROPPED_TXT)
+    print("CSV:", CSV_OUT)
+    print("Métricas:", METRICS.summary())
+    METRICS.close()
+
+if __name__ == "__main__":
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+import io
+import re
+import gzip
+import json
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import requests
+
+from src.scraping.coches_net.coches_net_crawler import extract_ad_id, load_known_ids, CSV_OUT, FRONTIER_TXT
+from src.utils.metrics import Metrics, METRICS_DIR
+
+# ===================== CONFIG =====================
+ROBOTS_URL = "https://www.coches.net/robots.txt"
+# si robots.txt no declara sitemaps, arrancamos del que ya usaba 01_sitemaps_index.py
+FALLBACK_SITEMAPS = ["https://www.coches.net/servicios/sitemaps/sitemap-ad-sm-1.xml"]
+CHILD_FILTER = re.compile(r"sitemap-ad", re.I)   # solo sitemaps de anuncios
+
+STATE_JSON = Path("data/raw/coches_net_sitemaps_state.json")
+# los anuncios nuevos van a FRONTIER_TXT (coches_net_crawler.py con SOURCE = "frontier" los visita)
+
+MAX_WORKERS = 8
+FLUSH_EVERY = 1000
+METRICS_PORT = None      # p.ej. 9110 para exponer /metrics
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "application/xml,text/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "es-ES,es;q=0.9",
+    "Referer": "https://www.coches.net/",
+}
+# ===================== /CONFIG =====================
+
+_local = threading.local()
+
+def get_session() -> requests.Session:
+    # requests.Session no es thread-safe: una por hilo
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers.update(HEADERS)
+    return _local.session
+
+# ---------------- state ----------------
+def load_state(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_state(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=1, sort_keys=True), encoding="utf-8")
+    tmp.replace(path)
+
+def load_frontier_ids(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        return {extract_ad_id(ln.strip()) for ln in f if ln.strip()} - {None}
+
+# ---------------- fetch + stream parse ----------------
+def open_sitemap(url: str, cached: dict | None):
+    """
+    GET condicional en streaming. Devuelve (stream, response) o (None, response) si 304.
+    El stream ya viene descomprimido (Content-Encoding y también .xml.gz).
+    """
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    r = get_session().get(url, headers=headers, stream=True, timeout=60)
+    if r.status_code == 304:
+        r.close()
+        return None, r
+    r.raise_for_status()
+
+    r.raw.decode_content = True
+    stream = io.BufferedReader(r.raw, buffer_size=64 * 1024)
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = gzip.GzipFile(fileobj=stream)
+    return stream, r
+
+def iter_sitemap(stream):
+    """
+    iterparse en memoria constante: yield ("sitemap"|"url", loc, lastmod).
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if tag in ("sitemap", "url"):
+            loc = lastmod = None
+            for child in elem:
+                ctag = child.tag.rsplit("}", 1)[-1]
+                if ctag == "loc":
+                    loc = (child.text or "").strip()
+                elif ctag == "lastmod":
+                    lastmod = (child.text or "").strip()
+            if loc:
+                yield tag, loc, lastmod
+            elem.clear()
+            root.clear()
+
+def discover_roots() -> list[str]:
+    try:
+        r = get_session().get(ROBOTS_URL, timeout=30)
+        r.raise_for_status()
+        roots = re.findall(r"(?im)^\s*sitemap:\s*(\S+)", r.text)
+        if roots:
+            return roots
+    except requests.RequestException as e:
+        print(f"robots.txt no disponible ({e!r}). Uso sitemaps por defecto.")
+    return list(FALLBACK_SITEMAPS)
+
+# ---------------- crawler ----------------
+class SitemapCrawler:
+    def __init__(self, state: dict, known_ids: set[str], frontier: Path, metrics: Metrics | None = None):
+        self.state = state
+        self.known_ids = known_ids
+        self.frontier = frontier
+        self.metrics = metrics or Metrics("coches.net")
+        self.lock = threading.Lock()
+        self.stats = {"fetched": 0, "not_modified": 0, "unchanged_lastmod": 0, "urls": 0}
+
+    def _flush(self, urls: list[str]) -> None:
+        if not urls:
+            return
+        with self.lock, self.metrics.timer("write"):
+            self.frontier.parent.mkdir(parents=True, exist_ok=True)
+            with self.frontier.open("a", encoding="utf-8", newline="\n") as f:
+                for u in urls:
+                    f.write(u + "\n")
+        self.metrics.inc("links", len(urls))
+
+    def _remember(self, url: str, resp, lastmod: str | None) -> None:
+        with self.lock:
+            self.state[url] = {
+                "lastmod": lastmod,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+
+    def process(self, url: str, lastmod: str | None = None):
+        """
+        Procesa un sitemap. Si es un índice devuelve sus hijos; si es un urlset
+        manda los anuncios nuevos al frontier. Devuelve (hijos, (resp, lastmod)
+        a recordar o None); run() guarda los validadores de un índice solo
+        cuando todos sus hijos han ido bien.
+        """
+        cached = self.state.get(url)
+        if cached and lastmod and cached.get("lastmod") == lastmod:
+            with self.lock:
+                self.stats["unchanged_lastmod"] += 1
+            return [], None
+
+        with self.metrics.timer("navigation"):
+            stream, resp = open_sitemap(url, cached)
+        if stream is None:
+            with self.lock:
+                self.stats["not_modified"] += 1
+            self.metrics.inc("not_modified")
+            return [], (resp, lastmod or (cached or {}).get("lastmod"))
+
+        children = []
+        pending = []
+        n_urls = 0
+        t0 = time.perf_counter()
+        try:
+            for kind, loc, loc_lastmod in iter_sitemap(stream):
+                if kind == "sitemap":
+                    children.append((loc, loc_lastmod))
+                    continue
+                n_urls += 1
+                ad_id = extract_ad_id(loc) or loc
+                with self.lock:
+                    if ad_id in self.known_ids:
+                        continue
+                    self.known_ids.add(ad_id)
+                pending.append(loc)
+                if len(pending) >= FLUSH_EVERY:
+                    self._flush(pending)
+                    pending = []
+        finally:
+            resp.close()
+        # descarga en streaming + iterparse van juntos: se mide como extracción
+        self.metrics.observe("extraction", time.perf_counter() - t0)
+        self._flush(pending)
+        self.metrics.inc("pages")
+        self.metrics.inc("rows", n_urls)
+
+        with self.lock:
+            self.stats["fetched"] += 1
+            self.stats["urls"] += n_urls
+        return children, (resp, lastmod)
+
+    def run(self, roots: list[str], max_workers: int = MAX_WORKERS) -> None:
+        # índice -> [hijos pendientes, algún hijo falló, (resp, lastmod)]; un índice
+        # con hijos fallidos o sin terminar no se recuerda y se relista en la próxima corrida
+        pending: dict[str, list] = {}
+        parent: dict[str, str] = {}
+
+        def finish(url: str, ok: bool) -> None:
+            idx = parent.pop(url, None)
+            if idx is None:
+                return
+            entry = pending[idx]
+            entry[0] -= 1
+            entry[1] = entry[1] or not ok
+            if entry[0]:
+                return
+            del pending[idx]
+            if entry[1]:
+                print(f"  índice {idx}: hijos con error, se revisará en la próxima corrida")
+            elif entry[2]:
+                self._remember(idx, *entry[2])
+            finish(idx, not entry[1])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            futures = {ex.submit(self.process, u): u for u in roots}
+            seen = set(roots)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    url = futures.pop(fut)
+                    try:
+                        children, validators = fut.result()
+                    except Exception as e:
+                        print(f"  ERROR {url}: {e!r}")
+                        self.metrics.inc("errors")
+                        finish(url, False)
+                        continue
+                    children = [(u, lm) for u, lm in children if CHILD_FILTER.search(u) and u not in seen]
+                    if not children:
+                        if validators:
+                            self._remember(url, *validators)
+                        finish(url, True)
+                        continue
+                    print(f"  índice {url}: {len(children)} sitemaps hijos")
+                    pending[url] = [len(children), False, validators]
+                    for child, lm in children:
+                        seen.add(child)
+                        parent[child] = url
+                        futures[ex.submit(self.process, child, lm)] = child
+
+def main():
+    state = load_state(STATE_JSON)
+    known = load_frontier_ids(FRONTIER_TXT) | load_known_ids(CSV_OUT)
+    print("IDs ya conocidos:", len(known))
+
+    metrics = Metrics("coches.net", snapshot_path=METRICS_DIR / "sitemap_crawler.json")
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    crawler = SitemapCrawler(state, known, FRONTIER_TXT, metrics)
+    n_before = len(known)
+    try:
+        crawler.run(discover_roots())
+    finally:
+        save_state(STATE_JSON, state)
+        metrics.close()
+
+    s = crawler.stats
+    print("\n=== FIN ===")
+    print(f"Sitemaps descargados: {s['fetched']} | 304: {s['not_modified']} | sin cambios (lastmod): {s['unchanged_lastmod']}")
+    print(f"URLs leídas: {s['urls']} | nuevas al frontier: {len(known) - n_before}")
+    print("Frontier:", FRONTIER_TXT, '(visitar con coches_net_crawler.py, SOURCE = "frontier")')
+    print("Métricas:", metrics.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Mobile.de Async Scraper
+Variante concurrente de MobileDeScraper: mismos extractores y mismos
+segmentos CSV, pero con un cliente httpx con pool de conexiones y un
+limitador compartido (src/utils/rate_limit.py) para páginas y rangos.
+
+- La página 1 de cada rango da el total (get_total_pages); el resto de
+  páginas se lanzan a la vez y el limitador decide cuántas van en vuelo.
+- Los rangos de años también corren a la vez, con el mismo limitador.
+- 429 -> pausa global (2**intento * 10 s), errores de red -> espera solo
+  esa petición (2**intento * 5 s), como en fetch_page.
+- Las filas de un rango se escriben en el orden en que terminan las páginas.
+- BeautifulSoup (~10-15 ms por página), la caché sqlite/zstd y el archivo van por
+  asyncio.to_thread: en el event loop pararían todas las peticiones en
+  vuelo y descuadrarían los tiempos del limitador.
+
+    python -m src.scraping.mobile_de.mobile_de_async
+"""
+
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import httpx
+except ImportError:          # opcional: solo hace falta para este modo
+    httpx = None
+
+from src.scraping.mobile_de.mobile_de_scraper import MobileDeScraper, CAR_COLUMNS
+from src.utils.http_cache import CachedResponse, ResponseCache
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+from src.utils.rate_limit import AsyncLimiter, MAX_CONCURRENCY, MIN_INTERVAL, JITTER
+from src.utils.segments import SegmentWriter, concat_segments
+
+RANGE_CONCURRENCY = 2       # rangos de años a la vez (las páginas las limita el limitador)
+
+
+class AsyncMobileDeScraper(MobileDeScraper):
+    def __init__(self, base_url: str, output_dir: str = "mobile_de_data",
+                 cache_dir: Optional[str] = None, cache_ttl: float = 6 * 3600,
+                 archive_dir: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 concurrency: int = MAX_CONCURRENCY, min_interval: float = MIN_INTERVAL,
+                 jitter: float = JITTER):
+        if httpx is None:
+            raise RuntimeError("El modo async necesita httpx (pip install httpx)")
+        super().__init__(base_url, output_dir, cache_dir=cache_dir, cache_ttl=cache_ttl,
+                         archive_dir=archive_dir, metrics=metrics)
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.limiter: Optional[AsyncLimiter] = None
+        self.client = None
+
+    async def __aenter__(self):
+        # el limitador y el cliente se crean dentro del event loop que los usa
+        self.limiter = AsyncLimiter(self.concurrency, self.min_interval, self.jitter,
+                                    on_pause=self._on_pause)
+        self.client = httpx.AsyncClient(
+            timeout=30, follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency,
+                                max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        self.client = None
+
+    def _on_pause(self, seconds: float):
+        if self.progress:
+            self.progress.set_backoff(seconds)
+
+    async def _get(self, url: str, headers: Dict[str, str]) -> CachedResponse:
+        """GET por el limitador; con caché, los aciertos frescos no gastan turno"""
+        hit = await asyncio.to_thread(self.cache.get, url, headers) if self.cache else None
+        if hit and hit[1]:
+            self.cache.hits += 1
+            return hit[0]
+
+        req_headers = dict(headers)
+        if hit:
+            req_headers.update(ResponseCache.revalidation_headers(hit[0]))
+
+        async with self.limiter:
+            with self.metrics.timer("navigation"):
+                resp = await self.client.get(url, headers=req_headers)
+
+        if self.cache and resp.status_code == 304 and hit:
+            self.cache.revalidated += 1
+            await asyncio.to_thread(self.cache.refresh, url, headers)
+            return hit[0].as_revalidated()
+        resp_headers = {k.lower(): v for k, v in resp.headers.items()}
+        if self.cache:
+            self.cache.misses += 1
+            if resp.status_code == 200:
+                await asyncio.to_thread(self.cache.put, url, headers, resp.status_code, resp_headers, resp.content)
+        return CachedResponse(resp.status_code, resp_headers, resp.content, from_cache=False)
+
+    async def fetch_page_async(self, url: str, retries: int = 3) -> Optional[str]:
+        """fetch_page con el limitador compartido en vez de time.sleep"""
+        for attempt in range(retries):
+            try:
+                response = await self._get(url, self.get_headers())
+
+                if response.status_code == 200:
+                    self.metrics.inc("pages")
+                    if response.from_cache or response.revalidated:
+                        self.metrics.inc("cache_hits")
+                    else:
+                        self.metrics.inc("bytes", len(response.content))
+                    if self.archive and not (response.from_cache or response.revalidated):
+                        with self.metrics.timer("write"):
+                            await asyncio.to_thread(self.archive.add, url, response.text, site="mobile.de", kind="search")
+                    return response.text
+                elif response.status_code == 429:  # Too many requests: para todos
+                    wait_time = (2 ** attempt) * 10
+                    print(f"⚠️  Rate limited. Pausing all requests {wait_time}s...")
+                    self.metrics.inc("blocks")
+                    self.limiter.pause(wait_time)
+                else:
+                    print(f"❌ Status code {response.status_code} on attempt {attempt + 1}")
+                    self.metrics.inc("retries")
+
+            except httpx.HTTPError as e:
+                print(f"❌ Error on attempt {attempt + 1}: {e!r}")
+                self.metrics.inc("retries")
+                if attempt < retries - 1:
+                    wait_time = (2 ** attempt) * 5
+                    with self.metrics.timer("pause"):
+                        await asyncio.sleep(wait_time)
+
+        self.errors += 1
+        return None
+
+    async def _scrape_one(self, url: str, page: int) -> Tuple[int, Optional[List[Dict]]]:
+        html = await self.fetch_page_async(url)
+        if not html:
+            return page, None
+        with self.metrics.timer("extraction"):
+            cars = await asyncio.to_thread(self.scrape_page, html)
+        self.metrics.inc("rows", len(cars))
+        return page, cars
+
+    async def scrape_year_range_async(self, year_from: int, year_to: int,
+                                      max_pages: Optional[int] = None) -> Optional[SegmentWriter]:
+        """Página 1 para el total; el resto en paralelo dentro del presupuesto del limitador"""
+        label = f"{year_from}-{year_to}"
+        range_url = self._range_url(year_from, year_to)
+        print(f"🚗 [{label}] {range_url}")
+
+        own_progress = self.progress is None
+        if own_progress:
+            self.progress = Progress(f"{label} páginas", total=0, status_path=self._progress_path())
+
+        year_range_str = f"{year_from}_{year_to}"
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        seg = SegmentWriter(Path(self.output_dir) / f"mobile_de_{year_range_str}_{stamp}.part.csv", CAR_COLUMNS)
+        try:
+            html = await self.fetch_page_async(range_url)
+            if not html:
+                print(f"❌ [{label}] Failed to fetch first page")
+                seg.close()
+                seg.path.unlink(missing_ok=True)
+                return None
+            total_pages = await asyncio.to_thread(self.get_total_pages, html)
+            with self.metrics.timer("extraction"):
+                first = await asyncio.to_thread(self.scrape_page, html)
+            self.metrics.inc("rows", len(first))
+            del html
+            if max_pages:
+                total_pages = min(total_pages, max_pages)
+            print(f"📄 [{label}] Total pages: {total_pages}")
+            self.progress.add_total(total_pages)
+            self.progress.advance()
+            with self.metrics.timer("write"):
+                seg.write(first)
+            self.total_scraped += len(first)
+
+            tasks = [asyncio.create_task(self._scrape_one(self.build_url(range_url, page), page))
+                     for page in range(2, total_pages + 1)]
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    page, cars = await fut
+                    if cars is None:
+                        print(f"⚠️  [{label}] Skipping page {page}")
+                        self.progress.advance(blocked=True)
+                        continue
+                    self.progress.advance()
+                    with self.metrics.timer("write"):
+                        seg.write(cars)
+                    self.total_scraped += len(cars)
+                    print(f"   ✅ [{label}] page {page}/{total_pages}: {len(cars)} cars (Total: {seg.rows})")
+            finally:
+                for t in tasks:
+                    t.cancel()
+        finally:
+            seg.close()
+            if own_progress:
+                self.progress.close()
+                self.progress = None
+
+        if not seg.rows:
+            seg.path.unlink(missing_ok=True)
+            print(f"\n⚠️  [{label}] No se extrajeron coches de este rango")
+            return None
+        final_file = seg.finalize(Path(self.output_dir) / f"mobile_de_{year_range_str}_final_{stamp}.csv")
+        print(f"\n✅ [{label}] Final file saved: {final_file} ({seg.rows} cars, "
+              f"potencia {seg.non_null['potencia_cv']}/{seg.rows}, km {seg.non_null['kilometros']}/{seg.rows})")
+        return seg
+
+    async def scrape_all_years_async(self, year_ranges: List[tuple],
+                                     max_pages_per_range: Optional[int] = None,
+                                     range_concurrency: int = RANGE_CONCURRENCY) -> Optional[Path]:
+        """Rangos a la vez (sin la pausa de 10 s: el limitador ya marca el ritmo)"""
+        print(f"\n{'='*60}")
+        print(f"🚀 MOBILE.DE ASYNC SCRAPER")
+        print(f"{'='*60}")
+        print(f"Year ranges: {year_ranges}")
+        print(f"Concurrency: {self.concurrency} peticiones, {range_concurrency} rangos, "
+              f"≥{self.min_interval}s(+{self.jitter}s) entre arranques")
+        print(f"{'='*60}\n")
+
+        start_time = datetime.now()
+        self.progress = Progress("páginas", total=0, status_path=self._progress_path())
+        ranges_sem = asyncio.Semaphore(range_concurrency)
+
+        async def one(year_from: int, year_to: int):
+            async with ranges_sem:
+                return await self.scrape_year_range_async(year_from, year_to, max_pages_per_range)
+
+        try:
+            segments = await asyncio.gather(*(one(a, b) for a, b in year_ranges))
+        finally:
+            self.progress.close()
+            self.progress = None
+        segments = [s for s in segments if s]       # en el orden de year_ranges
+
+        if not segments:
+            print("\n❌ No se pudieron extraer datos. Revisa el archivo sample_page.html")
+            return None
+
+        combined_file = Path(self.output_dir) / f"mobile_de_combined_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        with self.metrics.timer("write"):
+            concat_segments([s.path for s in segments], combined_file)
+        total = sum(s.rows for s in segments)
+
+        print(f"\n{'='*60}")
+        print(f"✅ SCRAPING COMPLETED!")
+        print(f"{'='*60}")
+        print(f"Total cars scraped: {total}")
+        print(f"Total errors: {self.errors}")
+        print(f"Rate-limit pauses: {self.limiter.pauses}")
+        print(f"Duration: {datetime.now() - start_time}")
+        print(f"Combined file: {combined_file}")
+        print(f"Métricas: {self.metrics.summary()}")
+        print(f"{'='*60}\n")
+
+        print("\n📊 Dataset summary:")
+        for col in CAR_COLUMNS:
+            non_null = sum(s.non_null[col] for s in segments)
+            print(f"   {col}: {non_null}/{total} ({non_null/total*100:.1f}%)")
+        return combined_file
+
+
+async def amain():
+    base_url = "https://www.mobile.de/es/veh%C3%ADculos/buscar.html?isSearchRequest=true&s=Car&vc=Car&p=%3A30000&fr=2013&ml=%3A150000&cn=DE&pw=110&emc=EURO6&sr=4&ft=PETROL&ft=DIESEL&st=DEALER&ref=dsp"
+
+    year_ranges = [
+        (2013, 2015),
+        (2016, 2018),
+        (2019, 2021),
+        (2022, 2025)
+    ]
+
+    metrics = Metrics("mobile.de", snapshot_path=METRICS_DIR / "mobile_de_async.json")
+    async with AsyncMobileDeScraper(base_url, cache_dir="data/cache/http", archive_dir="data/archive",
+                                    metrics=metrics) as scraper:
+        print("🔧 MODO: Testing (primeras 2 páginas de los dos primeros rangos)\n")
+        await scraper.scrape_all_years_async(year_ranges[:2], max_pages_per_range=2)
+
+        # Para scraping completo, descomenta:
+        # await scraper.scrape_all_years_async(year_ranges)
+
+    metrics.close()
+
+
+def main():
+    asyncio.run(amain())
+
+
+if __name__ == "__main__":
+    main()
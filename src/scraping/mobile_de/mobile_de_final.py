@@ -8,12 +8,24 @@ from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
 
 from playwright.sync_api import sync_playwright
 
+from src.matching.fair_price import FairPriceModel, MODEL_JSON as FAIR_PRICE_JSON
+from src.utils.extractors import extract_from_listing_text, LISTING_VERSION
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.records import ListingBatch
+from src.utils.normalize import Normalizer
+from src.utils.idset import IdSet, load_line_ids, url_id
+
 # ===================== CONFIG =====================
 HEADLESS = False
 SLOW = True
 
 OUT_CSV = Path("data/raw/mobile_de_FRESH.csv")
 SEEN_URLS_TXT = Path("data/raw/mobile_de_seen_urls.txt")
+SEEN_IDS_CACHE = Path("data/ids/mobile_de_seen")   # .npy mapeable de SEEN_URLS_TXT; None = sin caché
+DEALS_CSV = Path("data/raw/mobile_de_deals.csv")
+
+METRICS_PORT = None      # p.ej. 9108 para exponer /metrics
+METRICS = Metrics("mobile.de", snapshot_path=METRICS_DIR / "mobile_de_final.json")
 
 MIN_YEAR = 2013
 MAX_YEAR = 2025
@@ -48,7 +60,8 @@ class SearchInfo:
 
 def rand_sleep(a=1.2, b=3.2):
     if SLOW:
-        time.sleep(random.uniform(a, b))
+        with METRICS.timer("pause"):
+            time.sleep(random.uniform(a, b))
 
 def build_search_url(year_from: int, year_to: int) -> str:
     params = dict(BASE_PARAMS)
@@ -69,71 +82,18 @@ def set_page(url: str, page_num: int) -> str:
 def normalize_url(u: str) -> str:
     return (u or "").strip()
 
-def extract_from_listing_text(text: str) -> dict:
-    t = " ".join((text or "").split())
-
-    m_price = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*€", t)
-    price = int(m_price.group(1).replace(".", "")) if m_price else None
-
-    m_fr = re.search(r"\bPR\s*(0?[1-9]|1[0-2])/(20\d{2}|19\d{2})\b", t)
-    first_reg = f"{int(m_fr.group(1)):02d}/{m_fr.group(2)}" if m_fr else None
-    year = int(m_fr.group(2)) if m_fr else None
-
-    m_km = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*km\b", t, flags=re.I)
-    km = int(m_km.group(1).replace(".", "")) if m_km else None
-
-    m_kw_cv = re.search(r"(\d{2,3})\s*kW\s*\((\d{2,3})\s*cv\)", t, flags=re.I)
-    kw = int(m_kw_cv.group(1)) if m_kw_cv else None
-    cv = int(m_kw_cv.group(2)) if m_kw_cv else None
-    if cv is None:
-        m_cv = re.search(r"\b(\d{2,3})\s*cv\b", t, flags=re.I)
-        cv = int(m_cv.group(1)) if m_cv else None
-    if kw is None:
-        m_kw = re.search(r"\b(\d{2,3})\s*kw\b", t, flags=re.I)
-        kw = int(m_kw.group(1)) if m_kw else None
-    if cv is None and kw is not None:
-        cv = int(round(kw * 1.3596))
-
-    fuel = None
-    if re.search(r"\bGasolina\b", t, flags=re.I):
-        fuel = "PETROL"
-    elif re.search(r"\bDiesel\b|\bDi[eé]sel\b", t, flags=re.I):
-        fuel = "DIESEL"
-
-    m_rating = re.search(r"(\d(?:\.\d)?)\s*estrellas\s*\(\s*(\d+)\s*\)", t, flags=re.I)
-    dealer_rating = float(m_rating.group(1)) if m_rating else None
-    dealer_rating_count = int(m_rating.group(2)) if m_rating else None
-
-    m_loc = re.search(r"\bDE-(\d{5})\s+([A-Za-zÄÖÜäöüß\-\s]+?)(?=\s+\d(?:\.\d)?\s*estrellas|\s*$)", t)
-    location = f"{m_loc.group(1)} {m_loc.group(2).strip()}" if m_loc else None
-
-    brand = None
-    model = None
-    if m_price:
-        left = t[: m_price.start()].strip()
-        left = re.sub(r"^(Patrocinado|NUEVO)\s+", "", left, flags=re.I).strip()
-        toks = left.split()
-        if toks:
-            brand = toks[0]
-            model = " ".join(toks[1:]) if len(toks) > 1 else None
-
-    return {
-        "title": t,
-        "brand": brand,
-        "model": model,
-        "price_eur": price,
-        "km": km,
-        "kw": kw,
-        "cv": cv,
-        "fuel": fuel,
-        "first_registration": first_reg,
-        "year": year,
-        "dealer_rating": dealer_rating,
-        "dealer_rating_count": dealer_rating_count,
-        "location": location,
-    }
+def goto(page, url: str, settle_ms: int):
+    with METRICS.timer("navigation"):
+        page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    METRICS.inc("pages")
+    with METRICS.timer("ready"):
+        page.wait_for_timeout(settle_ms)
 
 def accept_consent_if_needed(page):
+    with METRICS.timer("consent"):
+        _accept_consent(page)
+
+def _accept_consent(page):
     for txt in ["Aceptar", "Accept", "Rechazar", "Reject", "Einverstanden", "Alle akzeptieren", "Akzeptieren"]:
         btn = page.locator(f"button:has-text('{txt}')")
         if btn.count() > 0:
@@ -229,10 +189,12 @@ def ensure_csv(path: Path, fieldnames: list[str]):
             w = csv.DictWriter(f, fieldnames=fieldnames)
             w.writeheader()
 
-def load_seen_urls(path: Path) -> set[str]:
-    if not path.exists():
-        return set()
-    return {x.strip() for x in path.read_text(encoding="utf-8").splitlines() if x.strip()}
+def seen_key(url: str) -> str:
+    return url_id(url) or url
+
+def load_seen_ids(path: Path) -> IdSet:
+    """Ids ya vistos (enteros); con caché solo se parsea lo añadido a `path` desde la última vez."""
+    return load_line_ids(path, seen_key, cache=SEEN_IDS_CACHE)
 
 def append_seen_urls(path: Path, urls: list[str]):
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -240,7 +202,20 @@ def append_seen_urls(path: Path, urls: list[str]):
         for u in urls:
             f.write(u + "\n")
 
-def append_rows_csv(path: Path, fieldnames: list[str], rows: list[dict]):
+def passes_rules(row) -> bool:
+    if row["price_eur"] is None or row["km"] is None or row["cv"] is None or row["year"] is None:
+        return False
+    if row["price_eur"] > MAX_PRICE or row["km"] > MAX_KM or row["year"] < MIN_YEAR:
+        return False
+    if row["kw"] is not None and row["kw"] < MIN_KW:
+        return False
+    if row["fuel"] not in FUELS:
+        return False
+    if row["dealer_rating"] is not None and row["dealer_rating"] < MIN_SELLER_STARS:
+        return False
+    return True
+
+def append_rows_csv(path: Path, fieldnames: list[str], rows):
     with path.open("a", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
         for r in rows:
@@ -253,8 +228,7 @@ def split_year_ranges(page, start_year: int, end_year: int):
     while stack:
         y1, y2 = stack.pop()
         url = build_search_url(y1, y2)
-        page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        page.wait_for_timeout(2000)
+        goto(page, url, 2000)
         accept_consent_if_needed(page)
         page.wait_for_timeout(1500)
 
@@ -275,10 +249,24 @@ def main():
     fieldnames = [
         "url","title","brand","model","price_eur","km","kw","cv","fuel",
         "first_registration","year","dealer_rating","dealer_rating_count","location",
-        "year_from","year_to"
+        "year_from","year_to","extractor_version"
     ]
     ensure_csv(OUT_CSV, fieldnames)
-    seen = load_seen_urls(SEEN_URLS_TXT)
+    with OUT_CSV.open("r", encoding="utf-8") as f:
+        if next(csv.reader(f), []) != fieldnames:
+            print(f"ERROR: {OUT_CSV} tiene columnas de una versión anterior. Migrar con:")
+            print(f"  python -m src.utils.reprocess --csv {OUT_CSV} --kind listing")
+            return
+    seen = load_seen_ids(SEEN_URLS_TXT)
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+
+    # chollos al vuelo si ya hay un modelo de precio justo ajustado
+    fair_model = FairPriceModel.load(FAIR_PRICE_JSON) if FAIR_PRICE_JSON.exists() else None
+    normalizer = Normalizer() if fair_model else None
+    deal_fields = ["url", "title", "brand", "model", "price_eur", "fair_price", "discount", "z"]
+    if fair_model:
+        ensure_csv(DEALS_CSV, deal_fields)
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=HEADLESS, args=["--disable-blink-features=AutomationControlled"])
@@ -299,8 +287,7 @@ def main():
             base_url = build_search_url(y1, y2)
 
             # info + cap real
-            page.goto(set_page(base_url, 1), wait_until="domcontentloaded", timeout=60000)
-            page.wait_for_timeout(2000)
+            goto(page, set_page(base_url, 1), 2000)
             accept_consent_if_needed(page)
             page.wait_for_timeout(1500)
 
@@ -313,44 +300,59 @@ def main():
 
             for pg in range(1, max_pages + 1):
                 page_url = set_page(base_url, pg)
-                page.goto(page_url, wait_until="domcontentloaded", timeout=60000)
-                page.wait_for_timeout(1500)
+                goto(page, page_url, 1500)
                 accept_consent_if_needed(page)
                 rand_sleep()
 
-                listings = get_listing_links(page)
+                with METRICS.timer("extraction"):
+                    listings = get_listing_links(page)
+                METRICS.inc("links", len(listings))
 
-                rows = []
+                batch = ListingBatch(fieldnames)
                 new_seen = []
 
                 for ad_url, ad_text in listings:
-                    if ad_url in seen:
+                    if seen_key(ad_url) in seen:
                         continue
 
-                    data = extract_from_listing_text(ad_text)
-                    row = {"url": ad_url, **data, "year_from": y1, "year_to": y2}
+                    # el extractor escribe directamente en las columnas del batch
+                    row = batch.new_row(url=ad_url, year_from=y1, year_to=y2,
+                                        extractor_version=LISTING_VERSION)
+                    with METRICS.timer("extraction"):
+                        extract_from_listing_text(ad_text, out=row)
 
-                    if row["price_eur"] is None or row["km"] is None or row["cv"] is None or row["year"] is None:
-                        continue
-                    if row["price_eur"] > MAX_PRICE or row["km"] > MAX_KM or row["year"] < MIN_YEAR:
-                        continue
-                    if row["kw"] is not None and row["kw"] < MIN_KW:
-                        continue
-                    if row["fuel"] not in FUELS:
-                        continue
-                    if row["dealer_rating"] is not None and row["dealer_rating"] < MIN_SELLER_STARS:
+                    if not passes_rules(row):
+                        batch.pop()
                         continue
 
-                    rows.append(row)
                     new_seen.append(ad_url)
-                    seen.add(ad_url)
-
-                if rows:
-                    append_rows_csv(OUT_CSV, fieldnames, rows)
-                    append_seen_urls(SEEN_URLS_TXT, new_seen)
-                    total_saved += len(rows)
-
-                print(f"  pág {pg:>2}/{max_pages}: listings={len(listings)} guardados={len(rows)} total_guardado={total_saved}")
+                    seen.add(seen_key(ad_url))
+
+                if len(batch) and fair_model:
+                    deals = []
+                    titles = batch.column("title")
+                    for i, norm in enumerate(normalizer.normalize_many(titles)):
+                        row = batch.row(i)
+                        score = fair_model.score_row({**row, "brand": norm.brand, "model": norm.model})
+                        if score["deal"]:
+                            deals.append({"url": row["url"], "title": row["title"], "brand": norm.brand,
+                                          "model": norm.model, "price_eur": row["price_eur"],
+                                          "fair_price": score["fair_price"], "discount": round(score["discount"], 3),
+                                          "z": round(score["z"], 2)})
+                            print(f"  💶 Chollo: {norm.brand} {norm.model} {row['price_eur']}€ "
+                                  f"(justo ~{score['fair_price']}€, {score['discount']:.0%})")
+                    if deals:
+                        append_rows_csv(DEALS_CSV, deal_fields, deals)
+                        METRICS.inc("deals", len(deals))
+
+                if len(batch):
+                    with METRICS.timer("write"):
+                        append_rows_csv(OUT_CSV, fieldnames, batch.iter_dicts())
+                        append_seen_urls(SEEN_URLS_TXT, new_seen)
+                    METRICS.inc("rows", len(batch))
+                    total_saved += len(batch)
+
+                print(f"  pág {pg:>2}/{max_pages}: listings={len(listings)} guardados={len(batch)} total_guardado={total_saved}")
                 rand_sleep()
 
         context.close()
@@ -358,6 +360,8 @@ def main():
 
     print(f"\n✅ Listo. Total guardado: {total_saved}")
     print(f"CSV: {OUT_CSV.resolve()}")
+    print("Métricas:", METRICS.summary())
+    METRICS.close()
 
 if __name__ == "__main__":
     main()
@@ -6,22 +6,45 @@ Con inspección de HTML y selectores dinámicos
 
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
 import time
 import random
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
 import json
 from datetime import datetime
 import os
 import re
+from pathlib import Path
 from urllib.parse import urlencode, urlparse, parse_qs
 
+from src.utils.http_cache import ResponseCache
+from src.utils.page_archive import PageArchive
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+from src.utils.segments import SegmentWriter, concat_segments
+
+# Columnas de extract_car_data_v2 (orden fijo: los segmentos se concatenan tal cual)
+CAR_COLUMNS = ['titulo', 'url', 'precio', 'kilometros', 'potencia_cv', 'combustible',
+               'primera_matriculacion', 'ubicacion']
+
 class MobileDeScraper:
-    def __init__(self, base_url: str, output_dir: str = "mobile_de_data"):
+    def __init__(self, base_url: str, output_dir: str = "mobile_de_data",
+                 cache_dir: Optional[str] = None, cache_ttl: float = 6 * 3600,
+                 archive_dir: Optional[str] = None, metrics: Optional[Metrics] = None):
         self.base_url = base_url
         self.output_dir = output_dir
         self.session = requests.Session()
         
+        # Caché HTTP en disco (opcional): re-ejecutar sin volver a pedir cada página
+        self.cache = ResponseCache(cache_dir, ttl=cache_ttl) if cache_dir else None
+        self.last_from_cache = False
+        
+        # Archivo de páginas crudas para poder re-extraer sin red (ver src/utils/page_archive.py)
+        self.archive = PageArchive(archive_dir) if archive_dir else None
+        
+        # Tiempos por etapa y contadores (ver src/utils/metrics.py); sin snapshot si no se pasa
+        self.metrics = metrics or Metrics("mobile.de")
+        self.progress: Optional[Progress] = None
+        
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
@@ -55,32 +78,59 @@ class MobileDeScraper:
     def random_delay(self, min_sec: float = 2.0, max_sec: float = 5.0):
         """Random delay to avoid detection"""
         delay = random.uniform(min_sec, max_sec)
-        time.sleep(delay)
+        with self.metrics.timer("pause"):
+            time.sleep(delay)
+    
+    def _backoff(self, seconds: float):
+        """Espera anotada en la línea de progreso (si hay una en curso)"""
+        if self.progress:
+            self.progress.set_backoff(seconds)
+        with self.metrics.timer("pause"):
+            time.sleep(seconds)
     
     def fetch_page(self, url: str, retries: int = 3) -> Optional[str]:
         """Fetch a page with retries and exponential backoff"""
         for attempt in range(retries):
             try:
-                response = self.session.get(
-                    url,
-                    headers=self.get_headers(),
-                    timeout=30
-                )
-                
+                with self.metrics.timer("navigation"):
+                    if self.cache:
+                        response = self.cache.fetch(self.session, url, headers=self.get_headers(), timeout=30)
+                        # un 304 sí fue a la red: from_cache=False y se respeta el delay
+                        self.last_from_cache = response.from_cache
+                        on_disk = response.from_cache or response.revalidated
+                    else:
+                        response = self.session.get(
+                            url,
+                            headers=self.get_headers(),
+                            timeout=30
+                        )
+                        self.last_from_cache = on_disk = False
+
                 if response.status_code == 200:
+                    self.metrics.inc("pages")
+                    if on_disk:
+                        self.metrics.inc("cache_hits")
+                    else:
+                        self.metrics.inc("bytes", len(response.content))
+                    if self.archive and not on_disk:
+                        with self.metrics.timer("write"):
+                            self.archive.add(url, response.text, site="mobile.de", kind="search")
                     return response.text
                 elif response.status_code == 429:  # Too many requests
                     wait_time = (2 ** attempt) * 10
                     print(f"⚠️  Rate limited. Waiting {wait_time}s...")
-                    time.sleep(wait_time)
+                    self.metrics.inc("blocks")
+                    self._backoff(wait_time)
                 else:
                     print(f"❌ Status code {response.status_code} on attempt {attempt + 1}")
+                    self.metrics.inc("retries")
                     
             except requests.exceptions.RequestException as e:
                 print(f"❌ Error on attempt {attempt + 1}: {str(e)}")
+                self.metrics.inc("retries")
                 if attempt < retries - 1:
                     wait_time = (2 ** attempt) * 5
-                    time.sleep(wait_time)
+                    self._backoff(wait_time)
         
         self.errors += 1
         return None
@@ -375,6 +425,11 @@ class MobileDeScraper:
             print(f"⚠️  Error getting total pages: {str(e)}")
             return 1
     
+    def _progress_path(self) -> Optional[Path]:
+        """Status JSON junto al snapshot de métricas, si lo hay"""
+        snap = self.metrics.snapshot_path
+        return snap.with_name(snap.stem + ".progress.json") if snap else None
+    
     def build_url(self, base_url: str, page: int) -> str:
         """Build URL for specific page"""
         parsed = urlparse(base_url)
@@ -383,34 +438,19 @@ class MobileDeScraper:
         new_query = urlencode(params, doseq=True)
         return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{new_query}"
     
-    def save_checkpoint(self, data: List[Dict], year_range: str, page: int):
-        """Save intermediate results"""
-        if not data:
-            return
-        
-        df = pd.DataFrame(data)
-        checkpoint_file = os.path.join(
-            self.output_dir,
-            f"checkpoint_{year_range}_page_{page}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        )
-        df.to_csv(checkpoint_file, index=False, encoding='utf-8-sig')
-        print(f"💾 Checkpoint saved: {len(data)} cars in {checkpoint_file}")
-    
-    def scrape_year_range(self, year_from: int, year_to: int, max_pages: Optional[int] = None):
-        """Scrape cars for a specific year range"""
-        print(f"\n{'='*60}")
-        print(f"🚗 Scraping cars from {year_from} to {year_to}")
-        print(f"{'='*60}\n")
-        
-        # Modify URL for year range
+    def _range_url(self, year_from: int, year_to: int) -> str:
+        """Base URL with the year range filter"""
         parsed = urlparse(self.base_url)
         params = parse_qs(parsed.query)
         params['fr'] = [str(year_from)]
         params['to'] = [str(year_to)]
-        
         new_query = urlencode(params, doseq=True)
-        range_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{new_query}"
-        
+        return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{new_query}"
+    
+    def iter_year_range(self, year_from: int, year_to: int,
+                        max_pages: Optional[int] = None) -> Iterator[Tuple[int, List[Dict]]]:
+        """Yield (page, cars) page by page; nothing is accumulated here"""
+        range_url = self._range_url(year_from, year_to)
         print(f"🔗 URL: {range_url}\n")
         
         # Fetch first page
@@ -419,7 +459,7 @@ class MobileDeScraper:
         
         if not html:
             print("❌ Failed to fetch first page")
-            return []
+            return
         
         # Inspeccionar HTML de la primera página
         print("🔍 Inspecting first page structure...")
@@ -430,60 +470,74 @@ class MobileDeScraper:
             total_pages = min(total_pages, max_pages)
             print(f"   (Limited to {max_pages} pages)")
         
-        all_cars = []
-        year_range_str = f"{year_from}_{year_to}"
+        self.progress = Progress(f"{year_from}-{year_to} páginas", total=total_pages,
+                                 status_path=self._progress_path())
+        try:
+            for page in range(1, total_pages + 1):
+                print(f"\n📖 Page {page}/{total_pages}")
+                
+                if page == 1:
+                    page_html, html = html, None
+                else:
+                    page_html = self.fetch_page(self.build_url(range_url, page))
+                
+                if not page_html:
+                    print(f"⚠️  Skipping page {page}")
+                    self.progress.advance(blocked=True)
+                    continue
+                
+                # Extract cars from page
+                with self.metrics.timer("extraction"):
+                    cars = self.scrape_page(page_html)
+                self.metrics.inc("rows", len(cars))
+                self.progress.advance()
+                self.total_scraped += len(cars)
+                
+                yield page, cars
+                
+                # Random delay (no hace falta si la página salió de la caché)
+                if page < total_pages and not self.last_from_cache:
+                    self.random_delay(2.0, 5.0)
+        finally:
+            self.progress.close()
+            self.progress = None
+    
+    def scrape_year_range(self, year_from: int, year_to: int,
+                          max_pages: Optional[int] = None) -> Optional[SegmentWriter]:
+        """Scrape cars for a specific year range into an append-only segment"""
+        print(f"\n{'='*60}")
+        print(f"🚗 Scraping cars from {year_from} to {year_to}")
+        print(f"{'='*60}\n")
         
-        # Scrape each page
-        for page in range(1, total_pages + 1):
-            print(f"\n📖 Page {page}/{total_pages}")
-            
-            if page == 1:
-                page_html = html
-            else:
-                page_url = self.build_url(range_url, page)
-                page_html = self.fetch_page(page_url)
-            
-            if not page_html:
-                print(f"⚠️  Skipping page {page}")
-                continue
-            
-            # Extract cars from page
-            cars = self.scrape_page(page_html)
-            all_cars.extend(cars)
-            self.total_scraped += len(cars)
-            
-            print(f"   ✅ Extracted {len(cars)} cars (Total: {len(all_cars)})")
-            
-            # Save checkpoint every 100 cars
-            if len(all_cars) >= 100 and len(all_cars) % 100 < 50:
-                self.save_checkpoint(all_cars, year_range_str, page)
-            
-            # Random delay
-            if page < total_pages:
-                self.random_delay(2.0, 5.0)
-        
-        # Save final results
-        if all_cars:
-            df = pd.DataFrame(all_cars)
-            final_file = os.path.join(
-                self.output_dir,
-                f"mobile_de_{year_range_str}_final_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            )
-            df.to_csv(final_file, index=False, encoding='utf-8-sig')
-            print(f"\n✅ Final file saved: {final_file}")
-            print(f"   Total cars: {len(all_cars)}")
-            
-            # Mostrar estadísticas
-            print(f"\n📊 Estadísticas:")
-            print(f"   Coches con potencia: {df['potencia_cv'].notna().sum()}/{len(df)}")
-            print(f"   Coches con kilometraje: {df['kilometros'].notna().sum()}/{len(df)}")
-        else:
+        year_range_str = f"{year_from}_{year_to}"
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # El segmento .part.csv hace de checkpoint: cada página se añade al final
+        seg = SegmentWriter(Path(self.output_dir) / f"mobile_de_{year_range_str}_{stamp}.part.csv", CAR_COLUMNS)
+        with seg:
+            for page, cars in self.iter_year_range(year_from, year_to, max_pages):
+                with self.metrics.timer("write"):
+                    seg.write(cars)
+                print(f"   ✅ Extracted {len(cars)} cars (Total: {seg.rows})")
+        
+        if not seg.rows:
+            seg.path.unlink(missing_ok=True)
             print("\n⚠️  No se extrajeron coches de este rango")
+            return None
+        
+        final_file = seg.finalize(Path(self.output_dir) / f"mobile_de_{year_range_str}_final_{stamp}.csv")
+        print(f"\n✅ Final file saved: {final_file}")
+        print(f"   Total cars: {seg.rows}")
+        print(f"   Métricas: {self.metrics.summary()}")
         
-        return all_cars
+        # Mostrar estadísticas
+        print(f"\n📊 Estadísticas:")
+        print(f"   Coches con potencia: {seg.non_null['potencia_cv']}/{seg.rows}")
+        print(f"   Coches con kilometraje: {seg.non_null['kilometros']}/{seg.rows}")
+        return seg
     
-    def scrape_all_years(self, year_ranges: List[tuple], max_pages_per_range: Optional[int] = None):
-        """Scrape all year ranges"""
+    def scrape_all_years(self, year_ranges: List[tuple],
+                         max_pages_per_range: Optional[int] = None) -> Optional[Path]:
+        """Scrape all year ranges; the combined file concatenates the per-range segments"""
         print(f"\n{'='*60}")
         print(f"🚀 MOBILE.DE SCRAPER V2")
         print(f"{'='*60}")
@@ -492,45 +546,56 @@ class MobileDeScraper:
         print(f"{'='*60}\n")
         
         start_time = datetime.now()
-        all_data = []
+        segments: List[SegmentWriter] = []
         
-        for year_from, year_to in year_ranges:
-            cars = self.scrape_year_range(year_from, year_to, max_pages_per_range)
-            all_data.extend(cars)
+        for i, (year_from, year_to) in enumerate(year_ranges, start=1):
+            print(f"📅 Rango {i}/{len(year_ranges)} | coches hasta ahora: {sum(s.rows for s in segments)} | "
+                  f"transcurrido: {datetime.now() - start_time}")
+            seg = self.scrape_year_range(year_from, year_to, max_pages_per_range)
+            if seg:
+                segments.append(seg)
             
             if (year_from, year_to) != year_ranges[-1]:
                 print("\n⏸️  Taking a break between year ranges...")
-                time.sleep(10)
+                with self.metrics.timer("pause"):
+                    time.sleep(10)
         
-        # Save combined file
-        if all_data:
-            df = pd.DataFrame(all_data)
-            combined_file = os.path.join(
-                self.output_dir,
-                f"mobile_de_combined_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            )
-            df.to_csv(combined_file, index=False, encoding='utf-8-sig')
-            
-            end_time = datetime.now()
-            duration = end_time - start_time
-            
-            print(f"\n{'='*60}")
-            print(f"✅ SCRAPING COMPLETED!")
-            print(f"{'='*60}")
-            print(f"Total cars scraped: {len(all_data)}")
-            print(f"Total errors: {self.errors}")
-            print(f"Duration: {duration}")
-            print(f"Combined file: {combined_file}")
-            print(f"{'='*60}\n")
-            
-            print("\n📊 Dataset summary:")
-            for col in df.columns:
-                non_null = df[col].notna().sum()
-                print(f"   {col}: {non_null}/{len(df)} ({non_null/len(df)*100:.1f}%)")
-        else:
+        if not segments:
             print("\n❌ No se pudieron extraer datos. Revisa el archivo sample_page.html")
+            return None
+        
+        # Save combined file
+        combined_file = Path(self.output_dir) / f"mobile_de_combined_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        with self.metrics.timer("write"):
+            concat_segments([s.path for s in segments], combined_file)
+        total = sum(s.rows for s in segments)
+        
+        duration = datetime.now() - start_time
+        
+        print(f"\n{'='*60}")
+        print(f"✅ SCRAPING COMPLETED!")
+        print(f"{'='*60}")
+        print(f"Total cars scraped: {total}")
+        print(f"Total errors: {self.errors}")
+        print(f"Duration: {duration}")
+        print(f"Combined file: {combined_file}")
+        print(f"{'='*60}\n")
+        
+        print("\n📊 Dataset summary:")
+        for col in CAR_COLUMNS:
+            non_null = sum(s.non_null[col] for s in segments)
+            print(f"   {col}: {non_null}/{total} ({non_null/total*100:.1f}%)")
         
-        return all_data
+        return combined_file
+
+_replay_scraper = None
+
+def parse_search_page(html: str, url: Optional[str] = None) -> List[Dict]:
+    """Extractor sin red para el replay de src/utils/page_archive.py"""
+    global _replay_scraper
+    if _replay_scraper is None:
+        _replay_scraper = MobileDeScraper("", output_dir="data/replay")
+    return _replay_scraper.scrape_page(html)
 
 
 def main():
@@ -543,7 +608,10 @@ def main():
         (2022, 2025)
     ]
     
-    scraper = MobileDeScraper(base_url)
+    metrics = Metrics("mobile.de", snapshot_path=METRICS_DIR / "mobile_de_scraper.json")
+    # metrics.serve(9108)  # descomenta para exponer /metrics a Prometheus
+    scraper = MobileDeScraper(base_url, cache_dir="data/cache/http", archive_dir="data/archive",
+                              metrics=metrics)
     
     print("🔧 MODO: Testing (primeras 2 páginas de primer rango)")
     print("   Si funciona, cambia a scraping completo\n")
@@ -553,6 +621,8 @@ def main():
     
     # Para scraping completo, descomenta:
     # scraper.scrape_all_years(year_ranges)
+    
+    metrics.close()
 
 
 if __name__ == "__main__":
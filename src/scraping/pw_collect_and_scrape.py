@@ -7,6 +7,11 @@ from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 from playwright.async_api import async_playwright
 
+from src.utils.extractors import extract_detail, version_string
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+from src.utils.idset import IdSet, load_line_ids
+
 # =========================
 # CONFIG
 # =========================
@@ -19,9 +24,20 @@ SLOW_MODE = True
 
 URLS_OUT = Path("src/scraping/urls_all.txt")
 CSV_OUT = Path("data/raw/mobile_de_results_all.csv")
+# ids de URLS_OUT en .npy mapeable (ver src/utils/idset.py); al reanudar solo se relee lo nuevo
+URL_IDS_CACHE = Path("data/ids/urls_all")   # None = reconstruir siempre desde URLS_OUT
+
+EXTRACT_GROUPS = ("price", "km", "registration")
+EXTRACTOR_VERSION = version_string(EXTRACT_GROUPS)
+
+# Métricas por etapa: snapshot JSON cada 30s y, si hay puerto, /metrics para Prometheus
+METRICS_PORT = None     # p.ej. 9108
+METRICS = Metrics("mobile.de", snapshot_path=METRICS_DIR / "pw_collect_and_scrape.json")
+# ritmo / ETA / bloqueos en vivo (línea fija en terminal + JSON para mirarlo desde otra shell)
+PROGRESS_STATUS = METRICS_DIR / "pw_collect_and_scrape.progress.json"
 
 # =========================
-# Helpers: URL & parsing
+# Helpers: URL
 # =========================
 def normalize_url(u: str) -> str:
     u = (u or "").strip().strip(" ,")
@@ -44,46 +60,6 @@ def extract_id(u: str) -> str | None:
     q = parse_qs(parts.query)
     return q.get("id", [None])[0]
 
-def parse_int_from_text(text: str | None):
-    if not text:
-        return None
-    digits = re.sub(r"[^\d]", "", text)
-    return int(digits) if digits else None
-
-def first_line_matching(lines, pattern):
-    rx = re.compile(pattern, re.IGNORECASE)
-    for ln in lines:
-        ln = ln.strip()
-        if ln and rx.search(ln):
-            return ln
-    return None
-
-def parse_first_registration(text):
-    if not text:
-        return None, None
-    t = text.strip()
-
-    m = re.search(r"(0?[1-9]|1[0-2])\s*/\s*((?:19|20)\d{2})", t)
-    if m:
-        month = int(m.group(1))
-        year = int(m.group(2))
-        return f"{month:02d}/{year}", year
-
-    m2 = re.search(r"\b((?:19|20)\d{2})\b", t)
-    if m2:
-        year = int(m2.group(1))
-        return str(year), year
-
-    return t, None
-
-def price_from_title(title: str):
-    if not title:
-        return None
-    m = re.search(r"para\s+([\d\.\s]+)\s*€", title, re.IGNORECASE)
-    if not m:
-        return None
-    return parse_int_from_text(m.group(1))
-
 # =========================
 # Helpers: IO
 # =========================
@@ -92,8 +68,26 @@ def load_lines(path: Path) -> list[str]:
         return []
     return [x.strip() for x in path.read_text(encoding="utf-8").splitlines() if x.strip()]
 
-def load_existing_urls(path: Path) -> set[str]:
-    return {canonical_vehicle_url(x) for x in load_lines(path) if canonical_vehicle_url(x)}
+def url_key(u: str) -> str:
+    """Clave de dedup: id del anuncio (entero en IdSet) o la URL canónica si no tiene."""
+    return extract_id(u) or canonical_vehicle_url(u)
+
+def load_known_ids(path: Path) -> IdSet:
+    return load_line_ids(path, url_key, cache=URL_IDS_CACHE)
+
+def unique_urls(path: Path, limit: int) -> list[str]:
+    """URLs canónicas de `path` sin repetir id, en orden de llegada, hasta `limit`."""
+    seen, out = IdSet(), []
+    if not path.exists():
+        return out
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            u = canonical_vehicle_url(line.strip()) if line.strip() else ""
+            if u and seen.add(url_key(u)):
+                out.append(u)
+                if len(out) >= limit:
+                    break
+    return out
 
 def append_urls(path: Path, new_urls: list[str]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -108,16 +102,19 @@ def ensure_csv_header(path: Path, fieldnames: list[str]) -> None:
             w = csv.DictWriter(f, fieldnames=fieldnames)
             w.writeheader()
 
+def csv_header(path: Path) -> list[str]:
+    with path.open("r", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
 def append_csv_row(path: Path, fieldnames: list[str], row: dict) -> None:
     with path.open("a", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
         w.writerow(row)
 
-def load_scraped_ids_from_csv(path: Path) -> set[str]:
+def load_scraped_ids_from_csv(path: Path) -> IdSet:
+    out = IdSet()
     if not path.exists():
-        return set()
-
-    out = set()
+        return out
     with path.open("r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -133,7 +130,8 @@ def load_scraped_ids_from_csv(path: Path) -> set[str]:
 async def human_pause(min_ms=2500, max_ms=5000):
     if not SLOW_MODE:
         return
-    await asyncio.sleep(random.uniform(min_ms/1000, max_ms/1000))
+    with METRICS.timer("pause"):
+        await asyncio.sleep(random.uniform(min_ms/1000, max_ms/1000))
 
 async def make_page(p):
     """
@@ -158,16 +156,20 @@ async def safe_goto_soft(p, browser, context, page, url: str):
     """
     for attempt in range(1, 3):
         try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_timeout(1500)
-            try:
-                await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
-            except Exception:
-                pass
-            await page.wait_for_timeout(800)
+            with METRICS.timer("navigation"):
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+            with METRICS.timer("ready"):
+                await page.wait_for_timeout(1500)
+                try:
+                    await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
+                except Exception:
+                    pass
+                await page.wait_for_timeout(800)
+            METRICS.inc("pages")
             return browser, context, page
         except Exception as e:
             msg = repr(e)
+            METRICS.inc("retries")
             if "TargetClosedError" in msg or "has been closed" in msg:
                 print(f"   -> TargetClosedError navegando (attempt {attempt}). Recreo browser/context/page...")
                 try:
@@ -241,6 +243,7 @@ async def scrape_one(p, browser, context, page, url: str) -> tuple[dict, object,
 
     blocked = ("access denied" in title.lower()) or ("zugriff verweigert" in title.lower())
     if blocked:
+        METRICS.inc("blocks")
         return ({
             "url": url,
             "title": title,
@@ -249,43 +252,39 @@ async def scrape_one(p, browser, context, page, url: str) -> tuple[dict, object,
             "first_registration": None,
             "year": None,
             "blocked": True,
+            "extractor_version": EXTRACTOR_VERSION,
         }, browser, context, page)
 
-    price_val = price_from_title(title)
-
-    body_text = await page.locator("body").inner_text()
-    lines = [ln.strip() for ln in body_text.splitlines() if ln.strip()]
-
-    km_line = first_line_matching(lines, r"\b\d[\d\.\s]*\s?km\b")
-
-    reg_line = first_line_matching(lines, r"\b(0?[1-9]|1[0-2])\s*/\s*(?:19|20)\d{2}\b")
-    if not reg_line:
-        reg_line = first_line_matching(lines, r"\b(?:19|20)\d{2}\b")
-
-    first_reg, year = parse_first_registration(reg_line)
+    with METRICS.timer("extraction"):
+        body_text = await page.locator("body").inner_text()
+        data = extract_detail(title, body_text, groups=EXTRACT_GROUPS)
 
     return ({
         "url": url,
         "title": title,
-        "price_eur": price_val,
-        "km": parse_int_from_text(km_line),
-        "first_registration": first_reg,
-        "year": year,
+        **data,
         "blocked": False,
+        "extractor_version": EXTRACTOR_VERSION,
     }, browser, context, page)
 
 # =========================
 # Main
 # =========================
 async def main():
-    fieldnames = ["url", "title", "price_eur", "km", "first_registration", "year", "blocked"]
+    fieldnames = ["url", "title", "price_eur", "km", "first_registration", "year", "blocked", "extractor_version"]
     ensure_csv_header(CSV_OUT, fieldnames)
+    if csv_header(CSV_OUT) != fieldnames:
+        print(f"ERROR: {CSV_OUT} tiene columnas de una versión anterior. Migrar con:")
+        print(f"  python -m src.utils.reprocess --csv {CSV_OUT} --kind detail")
+        return
 
-    known_urls = load_existing_urls(URLS_OUT)
+    known_ids = load_known_ids(URLS_OUT)
     scraped_ids = load_scraped_ids_from_csv(CSV_OUT)
 
-    print(f"URLs ya guardadas (dedup por id): {len(known_urls)}")
+    print(f"URLs ya guardadas (dedup por id): {len(known_ids)}")
     print(f"IDs ya scrapeados (desde CSV): {len(scraped_ids)}")
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
 
     async with async_playwright() as p:
         browser, context, page = await make_page(p)
@@ -298,16 +297,20 @@ async def main():
         browser, context, page = await safe_goto_soft(p, browser, context, page, SEARCH_URL)
 
         pages_done = 0
-        while pages_done < MAX_PAGES and len(known_urls) < MAX_LINKS:
+        progress = Progress("phase1 páginas", total=MAX_PAGES, status_path=PROGRESS_STATUS)
+        while pages_done < MAX_PAGES and len(known_ids) < MAX_LINKS:
             pages_done += 1
 
-            links = await collect_links_from_results(page)
-            new_links = [u for u in links if u not in known_urls]
+            with METRICS.timer("extraction"):
+                links = await collect_links_from_results(page)
+            new_links = [u for u in links if known_ids.add(url_key(u))]
+            progress.advance()
 
             if new_links:
-                known_urls.update(new_links)
-                append_urls(URLS_OUT, new_links)
-                print(f"[page {pages_done}] +{len(new_links)} links | total={len(known_urls)}")
+                with METRICS.timer("write"):
+                    append_urls(URLS_OUT, new_links)
+                METRICS.inc("links", len(new_links))
+                print(f"[page {pages_done}] +{len(new_links)} links | total={len(known_ids)}")
             else:
                 print(f"[page {pages_done}] 0 links nuevos")
 
@@ -316,13 +319,14 @@ async def main():
             if not ok:
                 print("No encontré 'Siguiente'. Fin paginación.")
                 break
+        progress.close()
 
         # =========================
         # PHASE 2: Scrape (resume + recovery)
         # =========================
         print("\n=== PHASE 2: scraping anuncios (reanuda + recovery) ===")
 
-        all_urls = sorted(load_existing_urls(URLS_OUT))[:MAX_LINKS]
+        all_urls = unique_urls(URLS_OUT, MAX_LINKS)
         to_scrape = []
         for u in all_urls:
             ad_id = extract_id(u)
@@ -333,6 +337,7 @@ async def main():
 
         scraped_now = 0
         blocked_count = 0
+        progress = Progress("phase2", total=len(to_scrape), status_path=PROGRESS_STATUS)
 
         for i, url in enumerate(to_scrape, start=1):
             print(f"[{i}/{len(to_scrape)}] {url}")
@@ -344,24 +349,30 @@ async def main():
 
                     if row.get("blocked") or not row.get("title"):
                         print(f"   -> bloqueado/title vacío (attempt {attempt}). Espero 12s y reintento...")
-                        await page.wait_for_timeout(12000)
+                        METRICS.inc("retries")
+                        with METRICS.timer("pause"), progress.backoff(12):
+                            await page.wait_for_timeout(12000)
                         row, browser, context, page = await scrape_one(p, browser, context, page, url)
 
                     if row.get("blocked"):
                         blocked_count += 1
 
-                    append_csv_row(CSV_OUT, fieldnames, row)
+                    with METRICS.timer("write"):
+                        append_csv_row(CSV_OUT, fieldnames, row)
+                    METRICS.inc("rows")
                     ad_id = extract_id(row.get("url", ""))
                     if ad_id:
                         scraped_ids.add(ad_id)
 
                     scraped_now += 1
                     success = True
+                    progress.advance(blocked=bool(row.get("blocked")))
 
                     await human_pause(4000, 8000)
                     if scraped_now % 25 == 0:
                         print("   -> descanso 20s...")
-                        await page.wait_for_timeout(20000)
+                        with METRICS.timer("pause"), progress.backoff(20):
+                            await page.wait_for_timeout(20000)
 
                     break
 
@@ -369,7 +380,9 @@ async def main():
                     msg = repr(e)
                     if attempt < 2:
                         print(f"   -> Error (attempt {attempt}): {msg}\n      Reintento en 8s...")
-                        await page.wait_for_timeout(8000)
+                        METRICS.inc("retries")
+                        with METRICS.timer("pause"), progress.backoff(8):
+                            await page.wait_for_timeout(8000)
                         continue
 
             if not success:
@@ -382,7 +395,11 @@ async def main():
                     "first_registration": None,
                     "year": None,
                     "blocked": None,
+                    "extractor_version": None,
                 })
+                progress.advance()
+
+        progress.close()
 
         # cerrar al final
         try:
@@ -396,11 +413,13 @@ async def main():
 
     print("\n=== FIN ===")
     print(f"Páginas visitadas: {pages_done}")
-    print(f"URLs guardadas (dedup): {len(load_existing_urls(URLS_OUT))}")
+    print(f"URLs guardadas (dedup): {len(load_known_ids(URLS_OUT))}")
     print(f"Scrapeadas en esta corrida: {scraped_now}")
     print(f"Bloqueadas: {blocked_count}")
     print(f"URLs file: {URLS_OUT}")
     print(f"CSV file: {CSV_OUT}")
+    print("Métricas:", METRICS.summary())
+    METRICS.close()
 
 if __name__ == "__main__":
     if sys.platform.startswith("win"):
@@ -1,12 +1,26 @@
 import asyncio
+import os
 import sys
+from collections import deque
 import re
 import csv
 import random
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
+from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
 
+from src.utils.http_cache import ResponseCache
+from src.utils.page_archive import PageArchive
+from src.utils.extractors import extract_detail, DETAIL_VERSION
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+from src.utils.idset import IdSet, load_line_ids
+from src.utils import pw_tracing
+from src.utils.pw_tracing import NavTracer
+from src.utils.watchdog import MemoryWatchdog, restart_process
+from src.utils.deadlines import StageTimeout, Supervisor
+
 MAX_PAGES = 200
 MAX_LINKS = 20000
 HEADLESS = False
@@ -15,6 +29,37 @@ SLOW_MODE = True
 SEARCH_LIST = Path("src/scraping/search_urls.txt")
 URLS_OUT = Path("src/scraping/urls_all.txt")
 CSV_OUT = Path("data/raw/mobile_de_results_all.csv")
+# ids de URLS_OUT en .npy mapeable (ver src/utils/idset.py); al reanudar solo se relee lo nuevo
+URL_IDS_CACHE = Path("data/ids/urls_all")   # None = reconstruir siempre desde URLS_OUT
+
+# Caché HTTP de documentos (None = desactivada). Útil al re-correr ajustando selectores.
+HTTP_CACHE_DIR = None   # p.ej. Path("data/cache/http")
+HTTP_CACHE = ResponseCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR else None
+
+# Archivo de HTML crudo (None = desactivado). Permite re-extraer con src/utils/page_archive.py
+ARCHIVE_DIR = Path("data/archive")
+ARCHIVE = None          # se abre en main(): importar el módulo (replay) no crea el directorio
+
+# Métricas por etapa: snapshot JSON cada 30s y, si hay puerto, /metrics para Prometheus
+METRICS_PORT = None     # p.ej. 9108
+METRICS = Metrics("mobile.de", snapshot_path=METRICS_DIR / "pw_collect_and_scrape_multi.json")
+# ritmo / ETA / bloqueos en vivo (línea fija en terminal + JSON para mirarlo desde otra shell)
+PROGRESS_STATUS = METRICS_DIR / "pw_collect_and_scrape_multi.progress.json"
+
+# Trazas de Playwright: 1% de los anuncios + siempre los que tardan > 20s (ver src/utils/pw_tracing.py)
+TRACE_DIR = Path("data/traces")     # None = sin tracing
+TRACER = NavTracer(TRACE_DIR, sample_rate=0.01, slow_threshold_s=20, budget_mb=500)
+
+# Memoria: muestra cada 60s; navegador > 2.5GB -> browser nuevo; heap Python > 1.5GB -> reinicio
+# del proceso reanudando desde el CSV (sin repetir la PHASE 1)
+WATCHDOG = MemoryWatchdog(log_path=METRICS_DIR / "pw_collect_and_scrape_multi.memory.jsonl",
+                          interval=60, py_heap_limit_mb=1500, browser_rss_limit_mb=2500)
+RESUME_ENV = "PW_MULTI_RESUME"
+MAX_RESTARTS = 5
+
+# Deadlines por etapa (src/utils/deadlines.py): un anuncio colgado > 120s se cancela,
+# vuelve al frontier (máx. 2 veces) y se apunta en qué etapa se quedó
+SUPERVISOR = Supervisor(log_path=METRICS_DIR / "pw_collect_and_scrape_multi.hangs.jsonl", metrics=METRICS)
 
 # ====== REGLAS DURAS ======
 MIN_YEAR = 2013
@@ -44,60 +89,6 @@ def extract_id(u: str) -> str | None:
     return q.get("id", [None])[0]
 
 # ---------------- parsing helpers ----------------
-def parse_int_from_text(text: str | None):
-    if not text:
-        return None
-    digits = re.sub(r"[^\d]", "", text)
-    return int(digits) if digits else None
-
-def first_line_matching(lines, pattern):
-    rx = re.compile(pattern, re.IGNORECASE)
-    for ln in lines:
-        ln = ln.strip()
-        if ln and rx.search(ln):
-            return ln
-    return None
-
-def parse_first_registration(text):
-    if not text:
-        return None, None
-    t = text.strip()
-
-    m = re.search(r"(0?[1-9]|1[0-2])\s*/\s*((?:19|20)\d{2})", t)
-    if m:
-        month = int(m.group(1))
-        year = int(m.group(2))
-        return f"{month:02d}/{year}", year
-
-    m2 = re.search(r"\b((?:19|20)\d{2})\b", t)
-    if m2:
-        year = int(m2.group(1))
-        return str(year), year
-
-    return t, None
-
-def price_from_title(title: str):
-    if not title:
-        return None
-    m = re.search(r"para\s+([\d\.\s]+)\s*€", title, re.IGNORECASE)
-    if not m:
-        return None
-    return parse_int_from_text(m.group(1))
-
-def brand_model_from_title(title: str):
-    if not title:
-        return None, None
-    parts = re.split(r"\s+para\s+", title, flags=re.IGNORECASE, maxsplit=1)
-    left = parts[0].strip() if parts else title.strip()
-    if not left:
-        return None, None
-    tokens = left.split()
-    if len(tokens) == 1:
-        return tokens[0], None
-    brand = tokens[0].strip()
-    model = " ".join(tokens[1:]).strip()
-    return brand, model
-
 def apply_hard_rules(price_eur, km, year):
     reasons = []
     if year is None or year < MIN_YEAR:
@@ -116,8 +107,26 @@ def load_lines(path: Path) -> list[str]:
         return []
     return [x.strip() for x in path.read_text(encoding="utf-8").splitlines() if x.strip()]
 
-def load_existing_urls(path: Path) -> set[str]:
-    return {canonical_vehicle_url(x) for x in load_lines(path) if canonical_vehicle_url(x)}
+def url_key(u: str) -> str:
+    """Clave de dedup: id del anuncio (entero en IdSet) o la URL canónica si no tiene."""
+    return extract_id(u) or canonical_vehicle_url(u)
+
+def load_known_ids(path: Path) -> IdSet:
+    return load_line_ids(path, url_key, cache=URL_IDS_CACHE)
+
+def unique_urls(path: Path, limit: int) -> list[str]:
+    """URLs canónicas de `path` sin repetir id, en orden de llegada, hasta `limit`."""
+    seen, out = IdSet(), []
+    if not path.exists():
+        return out
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            u = canonical_vehicle_url(line.strip()) if line.strip() else ""
+            if u and seen.add(url_key(u)):
+                out.append(u)
+                if len(out) >= limit:
+                    break
+    return out
 
 def append_urls(path: Path, new_urls: list[str]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -132,15 +141,19 @@ def ensure_csv_header(path: Path, fieldnames: list[str]) -> None:
             w = csv.DictWriter(f, fieldnames=fieldnames)
             w.writeheader()
 
+def csv_header(path: Path) -> list[str]:
+    with path.open("r", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
 def append_csv_row(path: Path, fieldnames: list[str], row: dict) -> None:
     with path.open("a", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
         w.writerow(row)
 
-def load_scraped_ids_from_csv(path: Path) -> set[str]:
+def load_scraped_ids_from_csv(path: Path) -> IdSet:
+    out = IdSet()
     if not path.exists():
-        return set()
-    out = set()
+        return out
     with path.open("r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -154,7 +167,8 @@ def load_scraped_ids_from_csv(path: Path) -> set[str]:
 async def human_pause(min_ms=2500, max_ms=5000):
     if not SLOW_MODE:
         return
-    await asyncio.sleep(random.uniform(min_ms/1000, max_ms/1000))
+    with METRICS.timer("pause"):
+        await asyncio.sleep(random.uniform(min_ms/1000, max_ms/1000))
 
 async def make_page(p):
     browser = await p.chromium.launch(
@@ -166,22 +180,53 @@ async def make_page(p):
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
         viewport={"width": 1280, "height": 800},
     )
+    if HTTP_CACHE:
+        await context.route("**/*", HTTP_CACHE.playwright_route_handler())
+    await TRACER.attach(context)
     page = await context.new_page()
     return browser, context, page
 
+async def close_quietly(context, browser):
+    for obj in (context, browser):
+        try:
+            await obj.close()
+        except Exception:
+            pass
+
+async def fresh_page(p, browser, context, page):
+    """Tras cancelar una etapa colgada: pestaña nueva (o browser nuevo si el context murió)."""
+    try:
+        await page.close()
+    except Exception:
+        pass
+    try:
+        return browser, context, await context.new_page()
+    except Exception:
+        await close_quietly(context, browser)
+        return await make_page(p)
+
+async def wait_ready(page):
+    await page.wait_for_timeout(1500)
+    try:
+        await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
+    except Exception:
+        pass
+    await page.wait_for_timeout(800)
+
 async def safe_goto(p, browser, context, page, url: str):
     for attempt in range(1, 3):
         try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            await page.wait_for_timeout(1500)
-            try:
-                await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
-            except Exception:
-                pass
-            await page.wait_for_timeout(800)
+            with METRICS.timer("navigation"):
+                await SUPERVISOR.run("navigation", page.goto(url, wait_until="domcontentloaded", timeout=60000))
+            with METRICS.timer("ready"):
+                await SUPERVISOR.run("ready", wait_ready(page))
+            METRICS.inc("pages")
+            pw_tracing.note("goto_attempts", attempt)
             return browser, context, page
         except Exception as e:
             msg = repr(e)
+            METRICS.inc("retries")
+            pw_tracing.note("goto_errors", 1, add=True)
             if "TargetClosedError" in msg or "has been closed" in msg:
                 print(f"   -> TargetClosedError navegando (attempt {attempt}). Recreo browser/context/page...")
                 try:
@@ -231,6 +276,7 @@ async def safe_get_title(page):
         except Exception as e:
             msg = repr(e)
             if "Execution context was destroyed" in msg:
+                pw_tracing.note("title_context_destroyed", 1, add=True)
                 await page.wait_for_timeout(1200)
                 continue
             if attempt < 3:
@@ -274,11 +320,7 @@ async def go_next_page(page) -> bool:
                 pass
     return False
 
-async def scrape_one(p, browser, context, page, url: str):
-    browser, context, page = await safe_goto(p, browser, context, page, url)
-
-    title = await safe_get_title(page)
-
+def parse_detail(url: str, title: str, body_text: str) -> dict:
     blocked = ("access denied" in title.lower()) or ("zugriff verweigert" in title.lower())
     if blocked:
         return {
@@ -293,43 +335,80 @@ async def scrape_one(p, browser, context, page, url: str):
             "blocked": True,
             "skipped": True,
             "skip_reason": "blocked",
-        }, browser, context, page
-
-    brand, model = brand_model_from_title(title)
-    price_val = price_from_title(title)
+            "extractor_version": DETAIL_VERSION,
+        }
 
-    body_text = await page.locator("body").inner_text()
-    lines = [ln.strip() for ln in body_text.splitlines() if ln.strip()]
-
-    km_line = first_line_matching(lines, r"\b\d[\d\.\s]*\s?km\b")
-    km_val = parse_int_from_text(km_line)
-
-    reg_line = first_line_matching(lines, r"\b(0?[1-9]|1[0-2])\s*/\s*(?:19|20)\d{2}\b")
-    if not reg_line:
-        reg_line = first_line_matching(lines, r"\b(?:19|20)\d{2}\b")
-
-    first_reg, year_val = parse_first_registration(reg_line)
-
-    skipped, reason = apply_hard_rules(price_val, km_val, year_val)
+    data = extract_detail(title, body_text)
+    skipped, reason = apply_hard_rules(data["price_eur"], data["km"], data["year"])
 
     return {
         "url": url,
         "title": title,
-        "brand": brand,
-        "model": model,
-        "price_eur": price_val,
-        "km": km_val,
-        "first_registration": first_reg,
-        "year": year_val,
+        **data,
         "blocked": False,
         "skipped": skipped,
         "skip_reason": reason,
-    }, browser, context, page
+        "extractor_version": DETAIL_VERSION,
+    }
+
+def hung_row(url: str, stage: str) -> dict:
+    return {
+        "url": url,
+        "title": None,
+        "brand": None,
+        "model": None,
+        "price_eur": None,
+        "km": None,
+        "first_registration": None,
+        "year": None,
+        "blocked": False,
+        "skipped": True,
+        "skip_reason": f"hung:{stage}",
+        "extractor_version": None,
+    }
+
+def parse_detail_html(html: str, url: str) -> list[dict]:
+    """Misma extracción que scrape_one pero desde HTML archivado (replay sin red)."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    body = soup.body or soup
+    return [parse_detail(url, title, body.get_text("\n"))]
+
+async def scrape_one(p, browser, context, page, url: str):
+    async with TRACER.trace(context, url) as rec:
+        browser, context, page = await safe_goto(p, browser, context, page, url)
+        rec.mark("navigation")
+
+        with METRICS.timer("extraction"):
+            title = await SUPERVISOR.run("title", safe_get_title(page))
+            rec.mark("title")
+            if ARCHIVE and title:
+                try:
+                    html = await page.content()
+                    METRICS.inc("bytes", len(html.encode("utf-8")))
+                    ARCHIVE.add(url, html, site="mobile.de", kind="detail")
+                except Exception as e:
+                    print(f"   -> no pude archivar: {e!r}")
+                rec.mark("archive")
+
+            lower = title.lower()
+            blocked = ("access denied" in lower) or ("zugriff verweigert" in lower)
+            body_text = "" if blocked else await SUPERVISOR.run("extraction", page.locator("body").inner_text())
+            row = parse_detail(url, title, body_text)
+            rec.mark("extraction")
+        if blocked:
+            pw_tracing.note("blocked", True)
+    if blocked:
+        METRICS.inc("blocks")
+    return row, browser, context, page
 
 async def main():
+    global ARCHIVE
     if not SEARCH_LIST.exists():
         print("ERROR: no existe src/scraping/search_urls.txt")
         return
+    if ARCHIVE_DIR and ARCHIVE is None:
+        ARCHIVE = PageArchive(ARCHIVE_DIR)
 
     searches = load_lines(SEARCH_LIST)
     print("Búsquedas:", len(searches))
@@ -337,46 +416,75 @@ async def main():
     fieldnames = [
         "url", "title", "brand", "model",
         "price_eur", "km", "first_registration", "year",
-        "blocked", "skipped", "skip_reason"
+        "blocked", "skipped", "skip_reason", "extractor_version"
     ]
     ensure_csv_header(CSV_OUT, fieldnames)
+    if csv_header(CSV_OUT) != fieldnames:
+        print(f"ERROR: {CSV_OUT} tiene columnas de una versión anterior. Migrar con:")
+        print(f"  python -m src.utils.reprocess --csv {CSV_OUT} --kind detail")
+        return
 
-    known_urls = load_existing_urls(URLS_OUT)
+    known_ids = load_known_ids(URLS_OUT)
     scraped_ids = load_scraped_ids_from_csv(CSV_OUT)
-    print("URLs ya guardadas:", len(known_urls))
+    print("URLs ya guardadas:", len(known_ids))
     print("IDs ya scrapeados:", len(scraped_ids))
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+
+    restarts = int(os.environ.get(RESUME_ENV, "0"))
+    WATCHDOG.start()
+    WATCHDOG.track("known_ids", lambda: len(known_ids))
+    WATCHDOG.track("scraped_ids", lambda: len(scraped_ids))
 
     async with async_playwright() as p:
         browser, context, page = await make_page(p)
 
+        if restarts:
+            print(f"\n(reinicio {restarts} por memoria: salto la PHASE 1)")
+            searches = []
+
         print("\n=== PHASE 1: collect multi-search ===")
+        progress = Progress("phase1 páginas", status_path=PROGRESS_STATUS)
         for si, s_url in enumerate(searches, start=1):
             print(f"\n[SEARCH {si}/{len(searches)}] {s_url}")
             browser, context, page = await safe_goto(p, browser, context, page, s_url)
 
             for pi in range(1, MAX_PAGES + 1):
-                links = await collect_links_from_results(page)
-                new_links = [u for u in links if u not in known_urls]
+                if ARCHIVE:
+                    try:
+                        ARCHIVE.add(page.url, await page.content(), site="mobile.de", kind="search")
+                    except Exception:
+                        pass
+                with METRICS.timer("extraction"):
+                    links = await collect_links_from_results(page)
+                new_links = [u for u in links if known_ids.add(url_key(u))]
+                progress.advance()
 
                 if new_links:
-                    known_urls.update(new_links)
-                    append_urls(URLS_OUT, new_links)
-                    print(f"  [page {pi}] +{len(new_links)} links | total={len(known_urls)}")
+                    with METRICS.timer("write"):
+                        append_urls(URLS_OUT, new_links)
+                    METRICS.inc("links", len(new_links))
+                    print(f"  [page {pi}] +{len(new_links)} links | total={len(known_ids)}")
                 else:
                     print(f"  [page {pi}] 0 nuevos")
 
-                if len(known_urls) >= MAX_LINKS:
+                if len(known_ids) >= MAX_LINKS:
                     print("  Alcancé MAX_LINKS. Corto.")
                     break
 
-                ok = await go_next_page(page)
+                try:
+                    ok = await SUPERVISOR.run("next_page", go_next_page(page), url=page.url)
+                except StageTimeout:
+                    ok = False
                 await human_pause()
                 if not ok:
                     print("  No hay 'Siguiente'. Fin de esta búsqueda.")
                     break
 
+        progress.close()
+
         print("\n=== PHASE 2: scrape pendientes ===")
-        all_urls = sorted(load_existing_urls(URLS_OUT))[:MAX_LINKS]
+        all_urls = unique_urls(URLS_OUT, MAX_LINKS)
         to_scrape = []
         for u in all_urls:
             ad_id = extract_id(u)
@@ -388,34 +496,74 @@ async def main():
         blocked = 0
         scraped_now = 0
         skipped_now = 0
+        progress = Progress("phase2", total=len(to_scrape), status_path=PROGRESS_STATUS)
 
-        for i, url in enumerate(to_scrape, start=1):
-            print(f"[{i}/{len(to_scrape)}] {url}")
+        frontier = deque(to_scrape)
+        i = 0
+        while frontier:
+            url = frontier.popleft()
+            i += 1
+            print(f"[{i}/{i + len(frontier)}] {url}")
 
-            row, browser, context, page = await scrape_one(p, browser, context, page, url)
-
-            # reintento suave si title vacío
-            if not row.get("title"):
-                print("   -> title vacío. Reintento en 6s...")
-                await page.wait_for_timeout(6000)
-                row, browser, context, page = await scrape_one(p, browser, context, page, url)
+            try:
+                row, browser, context, page = await SUPERVISOR.run(
+                    "listing", scrape_one(p, browser, context, page, url), url=url)
+
+                # reintento suave si title vacío
+                if not row.get("title"):
+                    print("   -> title vacío. Reintento en 6s...")
+                    METRICS.inc("retries")
+                    with METRICS.timer("pause"), progress.backoff(6):
+                        await page.wait_for_timeout(6000)
+                    row, browser, context, page = await SUPERVISOR.run(
+                        "listing", scrape_one(p, browser, context, page, url), url=url)
+            except StageTimeout as e:
+                browser, context, page = await fresh_page(p, browser, context, page)
+                if SUPERVISOR.should_requeue(url):
+                    print("   -> vuelve al final del frontier")
+                    frontier.append(url)
+                    continue
+                print(f"   -> colgado {SUPERVISOR.max_requeues + 1} veces. Guardo fila vacía y sigo.")
+                row = hung_row(url, e.inner)
+            SUPERVISOR.done(url)
 
             if row.get("blocked"):
                 blocked += 1
             if row.get("skipped"):
                 skipped_now += 1
 
-            append_csv_row(CSV_OUT, fieldnames, row)
+            with METRICS.timer("write"):
+                append_csv_row(CSV_OUT, fieldnames, row)
+            METRICS.inc("rows")
 
             ad_id = extract_id(row.get("url", ""))
             if ad_id:
                 scraped_ids.add(ad_id)
 
             scraped_now += 1
+            progress.advance(blocked=bool(row.get("blocked")))
             await human_pause(3500, 7500)
             if scraped_now % 25 == 0:
                 print("   -> descanso 20s...")
-                await page.wait_for_timeout(20000)
+                with METRICS.timer("pause"), progress.backoff(20):
+                    await page.wait_for_timeout(20000)
+
+            action = WATCHDOG.poll()
+            if action == "restart" and restarts < MAX_RESTARTS:
+                # todo lo scrapeado ya está en el CSV: el proceso nuevo reanuda desde ahí
+                print("   -> memoria de Python al límite. Reinicio el proceso...")
+                progress.close()
+                METRICS.inc("restarts")
+                METRICS.close()
+                await close_quietly(context, browser)
+                restart_process("src.scraping.pw_collect_and_scrape_multi", {RESUME_ENV: str(restarts + 1)})
+            if action in ("recycle", "restart"):
+                print("   -> memoria al límite. Abro un navegador nuevo...")
+                METRICS.inc("recycles")
+                await close_quietly(context, browser)
+                browser, context, page = await make_page(p)
+
+        progress.close()
 
         try:
             await context.close()
@@ -427,11 +575,15 @@ async def main():
             pass
 
     print("\n=== FIN ===")
-    print("URLs:", len(load_existing_urls(URLS_OUT)))
+    print("URLs:", len(load_known_ids(URLS_OUT)))
     print("Scrapeadas esta corrida:", scraped_now)
     print("Bloqueadas:", blocked)
     print("Skipped (fuera de reglas):", skipped_now)
     print("CSV:", CSV_OUT)
+    print("Métricas:", METRICS.summary())
+    print("Tracing:", TRACER.summary())
+    print("Cuelgues por etapa:", SUPERVISOR.summary())
+    METRICS.close()
 
 if __name__ == "__main__":
     if sys.platform.startswith("win"):
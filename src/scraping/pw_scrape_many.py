@@ -1,73 +1,44 @@
 import asyncio
 import sys
-import re
 import csv
 import random
 from pathlib import Path
 from playwright.async_api import async_playwright
 
+from src.utils.extractors import extract_detail, version_string
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+
 URLS_PATH = Path("src/scraping/urls.txt")
 OUT_PATH = Path("data/raw/mobile_de_results.csv")
 
+EXTRACT_GROUPS = ("price", "km", "registration")
+EXTRACTOR_VERSION = version_string(EXTRACT_GROUPS)
+
+METRICS_PORT = None     # p.ej. 9108 para exponer /metrics
+METRICS = Metrics("mobile.de", snapshot_path=METRICS_DIR / "pw_scrape_many.json")
+
 def normalize_url(u: str) -> str:
     u = u.strip().strip(" ,")
     if (u.startswith("'") and u.endswith("'")) or (u.startswith('"') and u.endswith('"')):
         u = u[1:-1].strip()
     return u
 
-def first_line_matching(lines, pattern):
-    rx = re.compile(pattern, re.IGNORECASE)
-    for ln in lines:
-        ln = ln.strip()
-        if ln and rx.search(ln):
-            return ln
-    return None
-
-def parse_int_from_text(text):
-    if not text:
-        return None
-    digits = re.sub(r"[^\d]", "", text)
-    return int(digits) if digits else None
-
-def parse_first_registration(text):
-    if not text:
-        return None, None
-
-    t = text.strip()
-
-    m = re.search(r"(0?[1-9]|1[0-2])\s*/\s*((?:19|20)\d{2})", t)
-    if m:
-        month = int(m.group(1))
-        year = int(m.group(2))
-        return f"{month:02d}/{year}", year
-
-    m2 = re.search(r"\b((?:19|20)\d{2})\b", t)
-    if m2:
-        year = int(m2.group(1))
-        return str(year), year
-
-    return t, None
-
-def price_from_title(title: str):
-    if not title:
-        return None
-    m = re.search(r"para\s+([\d\.\s]+)\s*€", title, re.IGNORECASE)
-    if not m:
-        return None
-    return parse_int_from_text(m.group(1))
-
 async def goto_and_wait(page, url: str):
     # navegar sin networkidle (mobile.de nunca queda idle)
-    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    with METRICS.timer("navigation"):
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    METRICS.inc("pages")
 
-    # esperar a que el title tenga contenido (máx 15s)
-    try:
-        await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
-    except Exception:
-        pass
+    with METRICS.timer("ready"):
+        # esperar a que el title tenga contenido (máx 15s)
+        try:
+            await page.wait_for_function("document.title && document.title.length > 3", timeout=15000)
+        except Exception:
+            pass
 
-    # pequeña espera para que renderice
-    await page.wait_for_timeout(2000)
+        # pequeña espera para que renderice
+        await page.wait_for_timeout(2000)
 
 async def scrape_one(page, url: str) -> dict:
     await goto_and_wait(page, url)
@@ -76,6 +47,7 @@ async def scrape_one(page, url: str) -> dict:
 
     # si está bloqueado, devolvemos marcador
     if "access denied" in title.lower() or "zugriff verweigert" in title.lower():
+        METRICS.inc("blocks")
         return {
             "url": url,
             "title": title,
@@ -83,29 +55,19 @@ async def scrape_one(page, url: str) -> dict:
             "km": None,
             "first_registration": None,
             "year": None,
+            "extractor_version": EXTRACTOR_VERSION,
             "_blocked": True,
         }
 
-    price_val = price_from_title(title)
-
-    body_text = await page.locator("body").inner_text()
-    lines = [ln.strip() for ln in body_text.splitlines() if ln.strip()]
-
-    km_line = first_line_matching(lines, r"\b\d[\d\.\s]*\s?km\b")
-
-    reg_line = first_line_matching(lines, r"\b(0?[1-9]|1[0-2])\s*/\s*(?:19|20)\d{2}\b")
-    if not reg_line:
-        reg_line = first_line_matching(lines, r"\b(?:19|20)\d{2}\b")
-
-    first_reg, year = parse_first_registration(reg_line)
+    with METRICS.timer("extraction"):
+        body_text = await page.locator("body").inner_text()
+        data = extract_detail(title, body_text, groups=EXTRACT_GROUPS)
 
     return {
         "url": url,
         "title": title,
-        "price_eur": price_val,
-        "km": parse_int_from_text(km_line),
-        "first_registration": first_reg,
-        "year": year,
+        **data,
+        "extractor_version": EXTRACTOR_VERSION,
         "_blocked": False,
     }
 
@@ -123,6 +85,9 @@ async def main():
         return
 
     results = []
+    progress = Progress("detalles", total=len(urls), status_path=METRICS_DIR / "pw_scrape_many.progress.json")
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
@@ -142,17 +107,23 @@ async def main():
                 # si vino bloqueado o title vacío, reintento 1 vez con pausa larga
                 if data.get("_blocked") or (data.get("title", "").strip() == ""):
                     print("   -> Bloqueado o title vacío. Reintentando en 10s...")
-                    await page.wait_for_timeout(10000)
+                    METRICS.inc("retries")
+                    with METRICS.timer("pause"), progress.backoff(10):
+                        await page.wait_for_timeout(10000)
                     data = await scrape_one(page, url)
 
                 # quitamos el campo interno
-                data.pop("_blocked", None)
+                progress.advance(blocked=bool(data.pop("_blocked", None)))
                 results.append(data)
+                METRICS.inc("rows")
 
-                await page.wait_for_timeout(int(random.uniform(4000, 7000)))
+                with METRICS.timer("pause"):
+                    await page.wait_for_timeout(int(random.uniform(4000, 7000)))
 
             except Exception as e:
                 print("   -> ERROR:", repr(e))
+                METRICS.inc("errors")
+                progress.advance()
                 results.append({
                     "url": url,
                     "title": None,
@@ -164,15 +135,18 @@ async def main():
 
         await context.close()
         await browser.close()
+    progress.close()
 
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    fieldnames = ["url", "title", "price_eur", "km", "first_registration", "year"]
-    with OUT_PATH.open("w", newline="", encoding="utf-8") as f:
+    fieldnames = ["url", "title", "price_eur", "km", "first_registration", "year", "extractor_version"]
+    with METRICS.timer("write"), OUT_PATH.open("w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
         w.writeheader()
         w.writerows(results)
 
     print(f"\nOK: guardado {len(results)} filas en {OUT_PATH}")
+    print("Métricas:", METRICS.summary())
+    METRICS.close()
 
 if __name__ == "__main__":
     if sys.platform.startswith("win"):
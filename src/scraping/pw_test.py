@@ -1,8 +1,9 @@
 import asyncio
 import sys
-import re
 from playwright.async_api import async_playwright
 
+from src.utils.extractors import first_line_matching, parse_int_from_text, parse_first_registration
+
 URL = "https://www.mobile.de/es/veh%C3%ADculos/detalles.html?id=423842448&sb=rel&od=up&vc=Car&cn=DE&ml=%3A175000&fr=2013&st=DEALER&pw=74&sr=4&dam=0&emc=EURO6&s=Car&searchId=0f1d3c77-c4c3-cc19-9b73-e53d57f96a2f&ref=srp&refId=0f1d3c77-c4c3-cc19-9b73-e53d57f96a2f"
 
 def normalize_url(u: str) -> str:
@@ -11,39 +12,6 @@ def normalize_url(u: str) -> str:
         u = u[1:-1].strip()
     return u
 
-def first_line_matching(lines, pattern):
-    rx = re.compile(pattern, re.IGNORECASE)
-    for ln in lines:
-        ln = ln.strip()
-        if ln and rx.search(ln):
-            return ln
-    return None
-
-def parse_int_from_text(text):
-    if not text:
-        return None
-    digits = re.sub(r"[^\d]", "", text)
-    return int(digits) if digits else None
-
-def parse_first_registration(text):
-    if not text:
-        return None, None
-
-    t = text.strip()
-
-    m = re.search(r"(0?[1-9]|1[0-2])\s*/\s*((?:19|20)\d{2})", t)
-    if m:
-        month = int(m.group(1))
-        year = int(m.group(2))
-        return f"{month:02d}/{year}", year
-
-    m2 = re.search(r"\b((?:19|20)\d{2})\b", t)
-    if m2:
-        year = int(m2.group(1))
-        return str(year), year
-
-    return t, None
-
 async def extract_fields(url: str):
     url = normalize_url(url)
     print("0) URL:", url)
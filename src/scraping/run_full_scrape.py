@@ -5,17 +5,31 @@ import re
 import time
 from playwright.async_api import async_playwright, TimeoutError
 
+from src.utils.extractors import extract_detail, DETAIL_VERSION
+from src.utils.metrics import Metrics, METRICS_DIR
+from src.utils.progress import Progress
+
 # =========================
 # CONFIG
 # =========================
 
 OUT_CSV = "data/raw/mobile_de_results_all.csv"
+FIELDNAMES = [
+    "url", "title", "brand", "model",
+    "price_eur", "km",
+    "first_registration", "year",
+    "extractor_version"
+]
 URLS_FILE = "src/scraping/urls_all.txt"
 
 MAX_PAGES = 200          # seguridad
 SLEEP_EVERY = 25         # pausa cada X anuncios
 SLEEP_SECONDS = 20
 
+METRICS_PORT = None      # p.ej. 9108 para exponer /metrics
+METRICS = Metrics("mobile.de", snapshot_path=METRICS_DIR / "run_full_scrape.json")
+PROGRESS_STATUS = METRICS_DIR / "run_full_scrape.progress.json"
+
 YEAR_BLOCKS = [
     (2013, 2015),
     (2016, 2018),
@@ -65,17 +79,14 @@ def append_urls(new_urls):
 def csv_exists():
     return os.path.exists(OUT_CSV)
 
+def csv_header():
+    with open(OUT_CSV, "r", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
 def write_csv_row(row):
     write_header = not csv_exists()
     with open(OUT_CSV, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "url", "title", "brand", "model",
-                "price_eur", "km",
-                "first_registration", "year"
-            ]
-        )
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         if write_header:
             writer.writeheader()
         writer.writerow(row)
@@ -86,53 +97,26 @@ def write_csv_row(row):
 
 async def scrape_detail(page, url):
     try:
-        await page.goto(url, timeout=60000)
-        await page.wait_for_timeout(1200)
+        with METRICS.timer("navigation"):
+            await page.goto(url, timeout=60000)
+        with METRICS.timer("ready"):
+            await page.wait_for_timeout(1200)
     except TimeoutError:
+        METRICS.inc("timeouts")
         return None
+    METRICS.inc("pages")
+
+    with METRICS.timer("extraction"):
+        title = await page.title()
+        body_text = await page.locator("body").inner_text()
 
-    text = await page.content()
-    title = await page.title()
-
-    # precio
-    price = None
-    m = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*€", text)
-    if m:
-        price = int(m.group(1).replace(".", ""))
-
-    # km
-    km = None
-    m = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*km", text)
-    if m:
-        km = int(m.group(1).replace(".", ""))
-
-    # matriculación
-    first_reg = None
-    year = None
-    m = re.search(r"(\d{2}/\d{4})", text)
-    if m:
-        first_reg = m.group(1)
-        year = int(first_reg.split("/")[1])
-
-    # brand / model desde title
-    brand = None
-    model = None
-    if title:
-        parts = title.split(" para ")[0].split(" ")
-        if len(parts) >= 2:
-            brand = parts[0]
-            model = " ".join(parts[1:])
-
-    return {
-        "url": url,
-        "title": title,
-        "brand": brand,
-        "model": model,
-        "price_eur": price,
-        "km": km,
-        "first_registration": first_reg,
-        "year": year,
-    }
+        # misma extracción que pw_collect_and_scrape_multi (src/utils/extractors.py)
+        return {
+            "url": url,
+            "title": title,
+            **extract_detail(title, body_text),
+            "extractor_version": DETAIL_VERSION,
+        }
 
 # =========================
 # MAIN
@@ -141,9 +125,15 @@ async def scrape_detail(page, url):
 async def main():
     os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
     os.makedirs(os.path.dirname(URLS_FILE), exist_ok=True)
+    if csv_exists() and csv_header() != FIELDNAMES:
+        print(f"ERROR: {OUT_CSV} tiene columnas de una versión anterior. Migrar con:")
+        print(f"  python -m src.utils.reprocess --csv {OUT_CSV} --kind detail")
+        return
 
     seen_urls = read_existing_urls()
     seen_ids = {extract_id(u) for u in seen_urls}
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
@@ -151,6 +141,7 @@ async def main():
         page = await context.new_page()
 
         print("\n=== PHASE 1: recolectando links ===")
+        progress = Progress("phase1 páginas", status_path=PROGRESS_STATUS)
 
         for fr, to in YEAR_BLOCKS:
             print(f"\n>>> BLOQUE {fr}-{to}")
@@ -160,15 +151,21 @@ async def main():
                 search_url = build_search_url(fr, to, sr)
 
                 try:
-                    await page.goto(search_url, timeout=60000)
-                    await page.wait_for_timeout(1500)
+                    with METRICS.timer("navigation"):
+                        await page.goto(search_url, timeout=60000)
+                    with METRICS.timer("ready"):
+                        await page.wait_for_timeout(1500)
                 except:
+                    METRICS.inc("timeouts")
                     break
+                METRICS.inc("pages")
+                progress.advance()
 
-                links = await page.eval_on_selector_all(
-                    "a[href*='detalles.html?id=']",
-                    "els => els.map(e => e.href)"
-                )
+                with METRICS.timer("extraction"):
+                    links = await page.eval_on_selector_all(
+                        "a[href*='detalles.html?id=']",
+                        "els => els.map(e => e.href)"
+                    )
 
                 new_links = []
                 for l in links:
@@ -181,23 +178,34 @@ async def main():
                 if not new_links:
                     break
 
-                append_urls(new_links)
+                with METRICS.timer("write"):
+                    append_urls(new_links)
+                METRICS.inc("links", len(new_links))
                 print(f"  +{len(new_links)} links")
 
+        progress.close()
         print("\n=== PHASE 2: scraping anuncios ===")
 
         urls = list(seen_urls)
         count = 0
+        progress = Progress("phase2", total=len(urls), status_path=PROGRESS_STATUS)
 
         for i, url in enumerate(urls, 1):
             row = await scrape_detail(page, url)
             if row:
-                write_csv_row(row)
+                with METRICS.timer("write"):
+                    write_csv_row(row)
+                METRICS.inc("rows")
                 count += 1
+            title = (row or {}).get("title") or ""
+            progress.advance(blocked="access denied" in title.lower() or "zugriff verweigert" in title.lower())
 
             if i % SLEEP_EVERY == 0:
                 print("   -> descanso 20s...")
-                time.sleep(SLEEP_SECONDS)
+                with METRICS.timer("pause"), progress.backoff(SLEEP_SECONDS):
+                    time.sleep(SLEEP_SECONDS)
+
+        progress.close()
 
         await browser.close()
 
@@ -205,6 +213,8 @@ async def main():
         print(f"URLs totales: {len(urls)}")
         print(f"Filas scrapeadas: {count}")
         print(f"CSV: {OUT_CSV}")
+        print("Métricas:", METRICS.summary())
+        METRICS.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
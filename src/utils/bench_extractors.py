@@ -0,0 +1,252 @@
+"""
+Micro-benchmarks de los extractores sobre los HTML guardados en la raíz del
+repo (debug_*.html) y variantes sintéticas escaladas (×N cards / textos).
+
+Cada caso se calibra para que una ronda dure >= MIN_ROUND_S y se repite
+ROUNDS veces; se guarda mínimo / mediana / media / desviación por llamada.
+Con --save se escribe la línea base; sin --save se compara contra ella y
+sale con código 1 si algún caso es más lento que baseline × (1 + tolerancia).
+
+    python -m src.utils.bench_extractors --save            # nueva línea base
+    python -m src.utils.bench_extractors                   # comparar
+    python -m src.utils.bench_extractors -k listing --scale 1 10 100
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.scraping.coches_net.coches_net_crawler import parse_cards_html
+from src.scraping.mobile_de.mobile_de_scraper import MobileDeScraper
+from src.utils.extractors import (
+    brand_model_from_title, extract_detail, extract_from_listing_text, parse_first_registration, price_from_title,
+)
+
+BASELINE_JSON = Path("data/benchmarks/extractors_baseline.json")
+FIXTURES_DIR = Path(".")
+FIXTURES = {
+    "mobile_blocked": "debug_page.html",
+    "cochesnet_chrome": "debug_connected_chrome.html",
+    "cochesnet_pw_post": "debug_pw_post.html",
+    "cochesnet_error": "debug_cochesnet_pg1.html",
+}
+SCALES = (1, 4)
+ROUNDS = 7
+MIN_ROUND_S = 0.05
+TOLERANCE = 0.25
+
+parse_dump = importlib.import_module("src.scraping.coches_net.06_parse_dump_html").parse_dump
+
+
+# ---------------- datos ----------------
+def load_fixture(name: str) -> str | None:
+    path = FIXTURES_DIR / FIXTURES[name]
+    return path.read_text(encoding="utf-8", errors="ignore") if path.exists() else None
+
+
+def scale_html(html: str, n: int) -> str:
+    """Repite el contenido del <body> n veces (más cards, mismo marcado)."""
+    if n <= 1:
+        return html
+    m = re.search(r"<body[^>]*>(.*)</body>", html, flags=re.S | re.I)
+    if not m:
+        return html * n
+    inner = m.group(1)
+    return html[:m.start(1)] + inner * n + html[m.end(1):]
+
+
+BRANDS = ["Volkswagen Golf 2.0 TDI", "BMW 320d Touring", "Audi A4 Avant 40 TDI", "Mercedes-Benz C 220 d",
+          "SEAT Leon FR 1.5 TSI", "Ford Focus ST-Line"]
+
+
+def synthetic_listing_texts(n: int, seed: int = 0) -> list[str]:
+    """Textos de card de listado de mobile.de con la forma que ve extract_from_listing_text."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        kw = rng.randint(85, 200)
+        out.append(
+            f"{rng.choice(['', 'Patrocinado ', 'NUEVO '])}{rng.choice(BRANDS)} "
+            f"{rng.randint(8, 45)}.{rng.randint(0, 999):03d} € "
+            f"PR {rng.randint(1, 12):02d}/{rng.randint(2013, 2024)} • {rng.randint(5, 180)}.{rng.randint(0, 999):03d} km • "
+            f"{kw} kW ({round(kw * 1.3596)} CV) • {rng.choice(['Diésel', 'Gasolina'])} "
+            f"DE-{rng.randint(10000, 99999)} {rng.choice(['München', 'Berlin', 'Köln', 'Bad Homburg'])} "
+            f"{rng.choice(['4.5', '4.8', '5'])} estrellas ({rng.randint(5, 900)})"
+        )
+    return out
+
+
+def synthetic_mobile_page(n_cards: int, seed: int = 0) -> str:
+    """Página de resultados de mobile.de mínima con n_cards <article> (camino 'article' de scrape_page)."""
+    rng = random.Random(seed)
+    cards = []
+    for i, text in enumerate(synthetic_listing_texts(n_cards, seed)):
+        cards.append(
+            f'<article class="result-item"><h2><a href="/fahrzeug/{i}">{rng.choice(BRANDS)}</a></h2>'
+            f'<span class="price-block">{rng.randint(8, 45)}.{rng.randint(0, 999):03d} €</span>'
+            f"<div>{text}</div></article>"
+        )
+    return (f"<html><head><title>Resultados</title></head><body><span>Página 1 de {max(n_cards // 20, 1)}</span>"
+            + "".join(cards) + "</body></html>")
+
+
+def synthetic_titles(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(BRANDS)} para {rng.randint(8, 45)}.{rng.randint(0, 999):03d} € - mobile.de"
+            for _ in range(n)]
+
+
+def synthetic_registrations(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    forms = ["{m}/{y}", "EZ {m}/{y}", "Primera matriculación {m} / {y}", "{y}", "sin dato"]
+    return [rng.choice(forms).format(m=rng.randint(1, 12), y=rng.randint(2010, 2024)) for _ in range(n)]
+
+
+# ---------------- casos ----------------
+def build_cases(scales=SCALES) -> dict[str, tuple]:
+    """nombre -> (función sin argumentos, nº de items por llamada)."""
+    scraper = MobileDeScraper("", output_dir=tempfile.mkdtemp(prefix="bench_mobile_"))
+    cases = {}
+
+    for name in FIXTURES:
+        html = load_fixture(name)
+        if html is None:
+            continue
+        for n in scales:
+            doc = scale_html(html, n)
+            if name.startswith("mobile"):
+                cases[f"mobile.scrape_page[{name}x{n}]"] = (lambda d=doc: scraper.scrape_page(d), 1)
+                cases[f"mobile.get_total_pages[{name}x{n}]"] = (lambda d=doc: scraper.get_total_pages(d), 1)
+            else:
+                cases[f"cochesnet.06_parse_dump[{name}x{n}]"] = (lambda d=doc: parse_dump(d), 1)
+                cases[f"cochesnet.parse_cards_html[{name}x{n}]"] = (lambda d=doc: parse_cards_html(d), 1)
+
+    for n in scales:
+        page = synthetic_mobile_page(24 * n)
+        cases[f"mobile.scrape_page[synthetic_{24 * n}cards]"] = (lambda d=page: scraper.scrape_page(d), 24 * n)
+        cases[f"mobile.get_total_pages[synthetic_{24 * n}cards]"] = (lambda d=page: scraper.get_total_pages(d), 1)
+
+    texts = synthetic_listing_texts(1000)
+    cases["extract_from_listing_text[1000]"] = (lambda: [extract_from_listing_text(t) for t in texts], 1000)
+    titles = synthetic_titles(1000)
+    cases["price_from_title[1000]"] = (lambda: [price_from_title(t) for t in titles], 1000)
+    cases["brand_model_from_title[1000]"] = (lambda: [brand_model_from_title(t) for t in titles], 1000)
+    regs = synthetic_registrations(1000)
+    cases["parse_first_registration[1000]"] = (lambda: [parse_first_registration(r) for r in regs], 1000)
+    body = "\n".join(["Kilometraje", "123.456 km", "Primera matriculación", "03/2019"] + texts[:50])
+    cases["extract_detail[200]"] = (lambda: [extract_detail(t, body) for t in titles[:200]], 200)
+    return cases
+
+
+# ---------------- medición ----------------
+def measure(fn, rounds: int = ROUNDS, min_round_s: float = MIN_ROUND_S) -> dict:
+    sink = io.StringIO()     # MobileDeScraper imprime mucho: fuera de la medición
+    with contextlib.redirect_stdout(sink):
+        fn()                 # calentamiento (regex compiladas, imports perezosos)
+        t0 = time.perf_counter()
+        fn()
+        one = max(time.perf_counter() - t0, 1e-7)
+        loops = max(1, int(min_round_s / one))
+        per_call = []
+        for _ in range(rounds):
+            sink.seek(0)
+            sink.truncate()
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            per_call.append((time.perf_counter() - t0) / loops)
+    return {
+        "min": min(per_call), "median": statistics.median(per_call), "mean": statistics.fmean(per_call),
+        "stddev": statistics.stdev(per_call) if len(per_call) > 1 else 0.0, "rounds": rounds, "loops": loops,
+    }
+
+
+def machine_info() -> dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def fmt_time(s: float) -> str:
+    if s >= 1:
+        return f"{s:.2f}s"
+    if s >= 1e-3:
+        return f"{s * 1e3:.2f}ms"
+    return f"{s * 1e6:.1f}µs"
+
+
+def run(cases: dict, pattern: str | None = None) -> dict[str, dict]:
+    results = {}
+    width = max((len(n) for n in cases), default=0)
+    for name, (fn, items) in cases.items():
+        if pattern and pattern not in name:
+            continue
+        r = measure(fn)
+        r["items"] = items
+        results[name] = r
+        per_item = f" | {fmt_time(r['median'] / items)}/item" if items > 1 else ""
+        print(f"{name:<{width}}  med {fmt_time(r['median']):>9}  min {fmt_time(r['min']):>9}  "
+              f"±{fmt_time(r['stddev']):>8}{per_item}")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"\nvs línea base ({baseline.get('saved_at', '?')}, python {baseline.get('machine', {}).get('python', '?')}):")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"  {name}: nuevo")
+            continue
+        ratio = r["median"] / base["median"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  ⚠️ REGRESIÓN"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "  ✅ mejora"
+        print(f"  {name}: {ratio:.2f}x{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmarks de extractores sobre los debug_*.html")
+    ap.add_argument("-k", dest="pattern", help="solo casos cuyo nombre contenga esto")
+    ap.add_argument("--scale", type=int, nargs="+", default=list(SCALES))
+    ap.add_argument("--save", action="store_true", help="guardar como línea base")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_JSON)
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = ap.parse_args()
+
+    results = run(build_cases(args.scale), args.pattern)
+
+    if args.save:
+        data = {"saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": machine_info(), "results": results}
+        if args.baseline.exists() and args.pattern:
+            # guardado parcial: conservar el resto de casos
+            old = json.loads(args.baseline.read_text(encoding="utf-8"))
+            data["results"] = {**old.get("results", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(data, indent=1), encoding="utf-8")
+        print("Línea base:", args.baseline)
+        return
+
+    if not args.baseline.exists():
+        print(f"\nSin línea base en {args.baseline} (ejecuta con --save)")
+        return
+    regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} casos más lentos que la línea base + {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
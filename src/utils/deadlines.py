@@ -0,0 +1,126 @@
+"""
+Deadlines por etapa para que una pestaña colgada no congele el crawl.
+
+Cada etapa (navigation, ready, title, extraction, next_page...) tiene un
+máximo en segundos y todo el anuncio uno global ("listing"), así que la
+latencia de cola por anuncio queda acotada. Al pasarse se cancela la tarea
+(asyncio.wait_for), se registra qué etapa se colgó (JSONL + contadores) y
+se lanza StageTimeout para que el bucle devuelva la URL al frontier.
+
+    SUPERVISOR = Supervisor(log_path=METRICS_DIR / "multi.hangs.jsonl")
+    try:
+        row = await SUPERVISOR.run("listing", scrape_one(page, url), url=url)
+    except StageTimeout as e:
+        frontier.append(url)          # e.stage dice dónde se quedó
+
+Dentro de scrape_one, SUPERVISOR.run("navigation", page.goto(url)) etc.; si
+salta la deadline global, se registra la etapa interna que estaba en curso.
+Cada intento de anuncio cuenta como mucho un cuelgue: si una etapa interna
+ya se pasó y luego salta también la global, solo se añade la línea al JSONL.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+STAGE_DEADLINES = {
+    "navigation": 65.0,     # page.goto ya tiene timeout de 60s; esto cubre renderers bloqueados
+    "ready": 25.0,
+    "title": 20.0,          # safe_get_title entero (sus 3 reintentos)
+    "extraction": 20.0,
+    "next_page": 20.0,
+    "listing": 120.0,       # anuncio completo, reintentos incluidos
+}
+MAX_REQUEUES = 2
+
+_url: ContextVar[str | None] = ContextVar("deadline_url", default=None)
+
+
+class StageTimeout(Exception):
+    # no hereda de TimeoutError: un run() exterior no debe confundirla con la suya
+    def __init__(self, stage: str, url: str | None, seconds: float, inner: str | None = None):
+        self.stage = stage
+        self.url = url
+        self.seconds = seconds
+        self.inner = inner or stage
+        super().__init__(f"{stage} > {seconds:g}s (colgado en {self.inner}) {url or ''}".strip())
+
+
+class Supervisor:
+    def __init__(self, deadlines: dict[str, float] | None = None, log_path: Path | None = None,
+                 metrics=None, max_requeues: int = MAX_REQUEUES):
+        self.deadlines = {**STAGE_DEADLINES, **(deadlines or {})}
+        self.log_path = log_path
+        self.metrics = metrics
+        self.max_requeues = max_requeues
+        self.hangs: Counter = Counter()
+        self.requeues: Counter = Counter()
+        self._where: dict[str, str] = {}
+        self._hung: set[str] = set()        # URLs con cuelgue ya contado en este intento
+
+    async def run(self, stage: str, aw, url: str | None = None, deadline: float | None = None):
+        """await aw con la deadline de la etapa; StageTimeout si se pasa."""
+        url = url or _url.get()
+        seconds = deadline or self.deadlines.get(stage)
+        token = _url.set(url)
+        prev = None
+        if url is not None:
+            prev = self._where.get(url)
+            self._where[url] = stage
+        cancelled = False
+        try:
+            if seconds is None:
+                return await aw
+            return await asyncio.wait_for(aw, timeout=seconds)
+        except asyncio.TimeoutError:
+            inner = self._where.get(url, stage) if url is not None else stage
+            self._record(stage, inner, url, seconds)
+            raise StageTimeout(stage, url, seconds, inner) from None
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            _url.reset(token)
+            # al terminar vuelve la etapa de fuera; si la canceló una deadline
+            # exterior se deja la propia para que esa la registre
+            if url is not None and not cancelled:
+                if prev is None:
+                    self._where.pop(url, None)
+                else:
+                    self._where[url] = prev
+
+    def done(self, url: str) -> None:
+        """Anuncio terminado: olvida su etapa en curso."""
+        self._where.pop(url, None)
+        self._hung.discard(url)
+
+    def should_requeue(self, url: str) -> bool:
+        """Cuenta el reintento; False cuando la URL ya agotó MAX_REQUEUES."""
+        self.requeues[url] += 1
+        self.done(url)
+        return self.requeues[url] <= self.max_requeues
+
+    def _record(self, stage: str, inner: str, url: str | None, seconds: float) -> None:
+        escalated = url is not None and url in self._hung
+        if not escalated:
+            if url is not None:
+                self._hung.add(url)
+            self.hangs[inner] += 1
+            if self.metrics is not None:
+                self.metrics.inc("hangs")
+                self.metrics.inc(f"hangs_{inner}")
+        print(f"   -> ⏱️ deadline {stage} ({seconds:g}s) superada; colgado en '{inner}'")
+        if self.log_path is None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.log_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"at": time.time(), "url": url, "deadline_stage": stage,
+                                "hung_stage": inner, "deadline_s": seconds, "escalated": escalated}) + "\n")
+
+    def summary(self) -> str:
+        if not self.hangs:
+            return "sin cuelgues"
+        return " ".join(f"{k}={v}" for k, v in self.hangs.most_common())
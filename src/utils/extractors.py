@@ -0,0 +1,208 @@
+"""
+Extractores compartidos (antes copiados en cada script de scraping).
+
+Cada grupo de campos tiene su propia versión. Las filas guardan
+`extractor_version` (p.ej. "brand_model=1,km=1,price=1,registration=1") y
+src/utils/reprocess.py re-extrae solo los grupos cuya versión cambió:
+si se toca la regex de km basta con subir FIELD_VERSIONS["km"].
+"""
+
+import re
+
+FIELD_VERSIONS = {
+    "price": 1,
+    "km": 1,
+    "registration": 1,
+    "brand_model": 1,
+    "power": 1,
+    "fuel": 1,
+    "dealer": 1,
+    "location": 1,
+}
+
+# grupo -> columnas que produce
+FIELD_GROUPS = {
+    "price": ["price_eur"],
+    "km": ["km"],
+    "registration": ["first_registration", "year"],
+    "brand_model": ["brand", "model"],
+    "power": ["kw", "cv"],
+    "fuel": ["fuel"],
+    "dealer": ["dealer_rating", "dealer_rating_count"],
+    "location": ["location"],
+}
+
+DETAIL_GROUPS = ("price", "km", "registration", "brand_model")
+LISTING_GROUPS = tuple(FIELD_VERSIONS)
+
+
+def version_string(groups=None) -> str:
+    groups = sorted(groups or FIELD_VERSIONS)
+    return ",".join(f"{g}={FIELD_VERSIONS[g]}" for g in groups)
+
+
+DETAIL_VERSION = version_string(DETAIL_GROUPS)
+LISTING_VERSION = version_string(LISTING_GROUPS)
+
+
+def parse_version(version: str | None) -> dict[str, int]:
+    out = {}
+    for part in (version or "").split(","):
+        name, _, num = part.partition("=")
+        if name and num.isdigit():
+            out[name.strip()] = int(num)
+    return out
+
+
+def stale_groups(version: str | None, groups=None) -> set[str]:
+    """Grupos de campos cuya versión guardada no coincide con la actual."""
+    stored = parse_version(version)
+    return {g for g in (groups or FIELD_VERSIONS) if stored.get(g) != FIELD_VERSIONS[g]}
+
+
+# ---------------- helpers ----------------
+def parse_int_from_text(text: str | None):
+    if not text:
+        return None
+    digits = re.sub(r"[^\d]", "", text)
+    return int(digits) if digits else None
+
+def first_line_matching(lines, pattern):
+    rx = re.compile(pattern, re.IGNORECASE)
+    for ln in lines:
+        ln = ln.strip()
+        if ln and rx.search(ln):
+            return ln
+    return None
+
+def parse_first_registration(text):
+    if not text:
+        return None, None
+    t = text.strip()
+
+    m = re.search(r"(0?[1-9]|1[0-2])\s*/\s*((?:19|20)\d{2})", t)
+    if m:
+        month = int(m.group(1))
+        year = int(m.group(2))
+        return f"{month:02d}/{year}", year
+
+    m2 = re.search(r"\b((?:19|20)\d{2})\b", t)
+    if m2:
+        year = int(m2.group(1))
+        return str(year), year
+
+    return t, None
+
+def price_from_title(title: str):
+    if not title:
+        return None
+    m = re.search(r"para\s+([\d\.\s]+)\s*€", title, re.IGNORECASE)
+    if not m:
+        return None
+    return parse_int_from_text(m.group(1))
+
+def brand_model_from_title(title: str):
+    if not title:
+        return None, None
+    parts = re.split(r"\s+para\s+", title, flags=re.IGNORECASE, maxsplit=1)
+    left = parts[0].strip() if parts else title.strip()
+    if not left:
+        return None, None
+    tokens = left.split()
+    if len(tokens) == 1:
+        return tokens[0], None
+    brand = tokens[0].strip()
+    model = " ".join(tokens[1:]).strip()
+    return brand, model
+
+
+# ---------------- página de detalle (mobile.de) ----------------
+def extract_detail(title: str, body_text: str, groups=DETAIL_GROUPS, out=None) -> dict:
+    """
+    Campos de una ficha de detalle a partir del <title> y el texto del body.
+    `groups` permite recalcular solo una parte (reprocesado selectivo).
+    `out` puede ser una fila de ListingBatch (src/utils/records.py) para
+    escribir directamente en las columnas.
+    """
+    out = {} if out is None else out
+    if "brand_model" in groups:
+        out["brand"], out["model"] = brand_model_from_title(title)
+    if "price" in groups:
+        out["price_eur"] = price_from_title(title)
+
+    if "km" in groups or "registration" in groups:
+        lines = [ln.strip() for ln in (body_text or "").splitlines() if ln.strip()]
+        if "km" in groups:
+            km_line = first_line_matching(lines, r"\b\d[\d\.\s]*\s?km\b")
+            out["km"] = parse_int_from_text(km_line)
+        if "registration" in groups:
+            reg_line = first_line_matching(lines, r"\b(0?[1-9]|1[0-2])\s*/\s*(?:19|20)\d{2}\b")
+            if not reg_line:
+                reg_line = first_line_matching(lines, r"\b(?:19|20)\d{2}\b")
+            out["first_registration"], out["year"] = parse_first_registration(reg_line)
+    return out
+
+
+# ---------------- texto de la card del listado (mobile.de) ----------------
+def extract_from_listing_text(text: str, groups=LISTING_GROUPS, out=None) -> dict:
+    t = " ".join((text or "").split())
+    out = {} if out is None else out       # o una fila de ListingBatch
+    out["title"] = t
+
+    m_price = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*€", t)
+    if "price" in groups:
+        out["price_eur"] = int(m_price.group(1).replace(".", "")) if m_price else None
+
+    if "registration" in groups:
+        m_fr = re.search(r"\bPR\s*(0?[1-9]|1[0-2])/(20\d{2}|19\d{2})\b", t)
+        out["first_registration"] = f"{int(m_fr.group(1)):02d}/{m_fr.group(2)}" if m_fr else None
+        out["year"] = int(m_fr.group(2)) if m_fr else None
+
+    if "km" in groups:
+        m_km = re.search(r"(\d{1,3}(?:\.\d{3})*)\s*km\b", t, flags=re.I)
+        out["km"] = int(m_km.group(1).replace(".", "")) if m_km else None
+
+    if "power" in groups:
+        m_kw_cv = re.search(r"(\d{2,3})\s*kW\s*\((\d{2,3})\s*cv\)", t, flags=re.I)
+        kw = int(m_kw_cv.group(1)) if m_kw_cv else None
+        cv = int(m_kw_cv.group(2)) if m_kw_cv else None
+        if cv is None:
+            m_cv = re.search(r"\b(\d{2,3})\s*cv\b", t, flags=re.I)
+            cv = int(m_cv.group(1)) if m_cv else None
+        if kw is None:
+            m_kw = re.search(r"\b(\d{2,3})\s*kw\b", t, flags=re.I)
+            kw = int(m_kw.group(1)) if m_kw else None
+        if cv is None and kw is not None:
+            cv = int(round(kw * 1.3596))
+        out["kw"], out["cv"] = kw, cv
+
+    if "fuel" in groups:
+        fuel = None
+        if re.search(r"\bGasolina\b", t, flags=re.I):
+            fuel = "PETROL"
+        elif re.search(r"\bDiesel\b|\bDi[eé]sel\b", t, flags=re.I):
+            fuel = "DIESEL"
+        out["fuel"] = fuel
+
+    if "dealer" in groups:
+        m_rating = re.search(r"(\d(?:\.\d)?)\s*estrellas\s*\(\s*(\d+)\s*\)", t, flags=re.I)
+        out["dealer_rating"] = float(m_rating.group(1)) if m_rating else None
+        out["dealer_rating_count"] = int(m_rating.group(2)) if m_rating else None
+
+    if "location" in groups:
+        m_loc = re.search(r"\bDE-(\d{5})\s+([A-Za-zÄÖÜäöüß\-\s]+?)(?=\s+\d(?:\.\d)?\s*estrellas|\s*$)", t)
+        out["location"] = f"{m_loc.group(1)} {m_loc.group(2).strip()}" if m_loc else None
+
+    if "brand_model" in groups:
+        brand = None
+        model = None
+        if m_price:
+            left = t[: m_price.start()].strip()
+            left = re.sub(r"^(Patrocinado|NUEVO)\s+", "", left, flags=re.I).strip()
+            toks = left.split()
+            if toks:
+                brand = toks[0]
+                model = " ".join(toks[1:]) if len(toks) > 1 else None
+        out["brand"], out["model"] = brand, model
+
+    return out
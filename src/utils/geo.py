@@ -0,0 +1,196 @@
+"""
+Índice geográfico de códigos postales alemanes (PLZ).
+
+- Tabla PLZ -> lat/lon offline en arrays compactos (data/geo/plz_de.npz),
+  generada una vez desde el volcado de GeoNames (DE.txt, download.geonames.org/export/zip).
+  Sin tabla se usa el centroide de la zona (primer dígito del PLZ).
+- Distancias haversine vectorizadas a hubs de recogida y pasos de frontera.
+- GeoIndex (cKDTree sobre la esfera unidad) para "anuncios a menos de R km".
+
+    python -m src.utils.geo build --geonames DE.txt
+    python -m src.utils.geo near --input data/processed/mobile_de_clean.parquet --plz 80331 --radius 50
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+GEO_NPZ = Path("data/geo/plz_de.npz")
+EARTH_RADIUS_KM = 6371.0
+
+# centroides aproximados por primer dígito del PLZ (respaldo sin tabla)
+ZONE_CENTROIDS = {
+    "0": (51.05, 13.10), "1": (52.52, 13.40), "2": (53.55, 9.99), "3": (52.10, 9.90), "4": (51.45, 7.20),
+    "5": (50.75, 7.10), "6": (50.05, 8.40), "7": (48.70, 9.00), "8": (48.20, 11.60), "9": (49.60, 11.10),
+}
+
+# destinos en España y pasos de frontera por carretera
+HUBS = {
+    "Madrid": (40.42, -3.70),
+    "Barcelona": (41.39, 2.17),
+}
+BORDER_CROSSINGS = {
+    "La Jonquera": (42.42, 2.87),
+    "Irun": (43.34, -1.79),
+}
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distancia en km; acepta escalares o arrays con broadcasting."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype="float64")) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(lat, lon, points: dict[str, tuple[float, float]]) -> pd.DataFrame:
+    """(n anuncios × m puntos) en km."""
+    names = list(points)
+    plat = np.array([points[p][0] for p in names])
+    plon = np.array([points[p][1] for p in names])
+    d = haversine(np.asarray(lat)[:, None], np.asarray(lon)[:, None], plat[None, :], plon[None, :])
+    return pd.DataFrame(d, columns=names)
+
+
+def route_km(lat, lon, hub: str = "Madrid") -> np.ndarray:
+    """Distancia en línea recta anuncio -> mejor paso de frontera -> hub español."""
+    cross = distance_matrix(lat, lon, BORDER_CROSSINGS).to_numpy()
+    hlat, hlon = HUBS[hub]
+    to_hub = np.array([haversine(c[0], c[1], hlat, hlon) for c in BORDER_CROSSINGS.values()])
+    return (cross + to_hub[None, :]).min(axis=1)
+
+
+def _to_xyz(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(np.asarray(lat, dtype="float64")), np.radians(np.asarray(lon, dtype="float64"))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord(radius_km: float) -> float:
+    return 2 * np.sin(radius_km / (2 * EARTH_RADIUS_KM))
+
+
+# ---------------- tabla PLZ ----------------
+class PlzTable:
+    def __init__(self, plz: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+        order = np.argsort(plz)
+        self.plz = plz[order].astype(np.uint32)
+        self.lat = lat[order].astype(np.float32)
+        self.lon = lon[order].astype(np.float32)
+
+    @classmethod
+    def load(cls, path: Path = GEO_NPZ) -> "PlzTable":
+        if path.exists():
+            data = np.load(path)
+            return cls(data["plz"], data["lat"], data["lon"])
+        return cls(np.empty(0, np.uint32), np.empty(0, np.float32), np.empty(0, np.float32))
+
+    @classmethod
+    def from_geonames(cls, txt: Path) -> "PlzTable":
+        # country, postal code, place, admin1, code1, admin2, code2, admin3, code3, lat, lon, accuracy
+        df = pd.read_csv(txt, sep="\t", header=None, usecols=[1, 9, 10], names=["plz", "lat", "lon"],
+                         dtype={"plz": "string"})
+        df = df[df["plz"].str.fullmatch(r"\d{5}", na=False)]
+        # un PLZ puede tener varios lugares: media de sus coordenadas
+        df = df.assign(plz=df["plz"].astype(np.uint32)).groupby("plz", as_index=False)[["lat", "lon"]].mean()
+        return cls(df["plz"].to_numpy(), df["lat"].to_numpy(), df["lon"].to_numpy())
+
+    def save(self, path: Path = GEO_NPZ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, plz=self.plz, lat=self.lat, lon=self.lon)
+
+    def lookup(self, plz: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Serie de PLZ (texto de 5 dígitos) -> lat, lon, exacto. NaN si no hay ni zona."""
+        s = plz.astype("string")
+        n = len(s)
+        lat = np.full(n, np.nan)
+        lon = np.full(n, np.nan)
+        exact = np.zeros(n, dtype=bool)
+
+        valid = s.str.fullmatch(r"\d{5}", na=False).to_numpy()
+        if len(self.plz) and valid.any():
+            codes = s[valid].astype(np.uint32).to_numpy()
+            pos = np.clip(np.searchsorted(self.plz, codes), 0, len(self.plz) - 1)
+            hit = self.plz[pos] == codes
+            idx = np.nonzero(valid)[0][hit]
+            lat[idx], lon[idx] = self.lat[pos[hit]], self.lon[pos[hit]]
+            exact[idx] = True
+
+        missing = np.isnan(lat) & valid
+        if missing.any():
+            zone = s[missing].str[0]
+            lat[missing] = zone.map({z: c[0] for z, c in ZONE_CENTROIDS.items()}).to_numpy(dtype="float64")
+            lon[missing] = zone.map({z: c[1] for z, c in ZONE_CENTROIDS.items()}).to_numpy(dtype="float64")
+        return lat, lon, exact
+
+    def locate(self, location: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """'DE-80331 München' -> lat, lon, exacto."""
+        return self.lookup(location.astype("string").str.extract(r"(\d{5})", expand=False))
+
+
+# ---------------- índice espacial ----------------
+class GeoIndex:
+    """cKDTree sobre coordenadas 3D; los radios en km se pasan a cuerda."""
+
+    def __init__(self, lat, lon):
+        lat, lon = np.asarray(lat, dtype="float64"), np.asarray(lon, dtype="float64")
+        self.positions = np.nonzero(~(np.isnan(lat) | np.isnan(lon)))[0]
+        self.tree = cKDTree(_to_xyz(lat[self.positions], lon[self.positions]))
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Posiciones (en el array original) a menos de radius_km del punto."""
+        hits = self.tree.query_ball_point(_to_xyz([lat], [lon])[0], _chord(radius_km))
+        return np.sort(self.positions[hits])
+
+    def within_many(self, lat, lon, radius_km: float) -> list[np.ndarray]:
+        hits = self.tree.query_ball_point(_to_xyz(lat, lon), _chord(radius_km))
+        return [np.sort(self.positions[h]) for h in hits]
+
+
+_table: PlzTable | None = None
+
+
+def default_table() -> PlzTable:
+    global _table
+    if _table is None:
+        _table = PlzTable.load()
+    return _table
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tabla PLZ -> lat/lon y consultas por radio")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="genera data/geo/plz_de.npz desde el volcado de GeoNames")
+    b.add_argument("--geonames", type=Path, required=True)
+    b.add_argument("--out", type=Path, default=GEO_NPZ)
+
+    n = sub.add_parser("near", help="anuncios a menos de R km de un PLZ")
+    n.add_argument("--input", type=Path, required=True)
+    n.add_argument("--plz", required=True)
+    n.add_argument("--radius", type=float, default=50)
+
+    args = ap.parse_args()
+    if args.cmd == "build":
+        table = PlzTable.from_geonames(args.geonames)
+        table.save(args.out)
+        print(f"PLZ: {len(table.plz)} | tabla: {args.out}")
+        return
+
+    table = default_table()
+    df = pd.read_parquet(args.input)
+    lat, lon, exact = table.locate(df["location"])
+    clat, clon, _ = table.lookup(pd.Series([args.plz]))
+    if np.isnan(clat[0]):
+        print(f"PLZ desconocido: {args.plz}")
+        return
+    pos = GeoIndex(lat, lon).within(clat[0], clon[0], args.radius)
+    print(f"Con coordenadas: {int((~np.isnan(lat)).sum())}/{len(df)} (exactas: {int(exact.sum())})")
+    print(f"A menos de {args.radius:g} km de {args.plz}: {len(pos)}")
+    cols = [c for c in ("brand", "model", "year", "km", "price", "location", "url") if c in df]
+    print(df.iloc[pos][cols].head(20))
+
+
+if __name__ == "__main__":
+    main()
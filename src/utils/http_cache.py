@@ -0,0 +1,260 @@
+"""
+Caché HTTP persistente en disco.
+
+- Clave: URL normalizada + cabeceras que cambian la respuesta (Accept-Language).
+- Cuerpos comprimidos con zstd y guardados por hash de contenido (dedup).
+- TTL, revalidación con ETag / Last-Modified y expulsión LRU por tamaño.
+
+Sirve tanto para `requests` (ResponseCache.fetch) como para Playwright
+(ResponseCache.playwright_route_handler).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import zstandard as zstd
+
+DEFAULT_DIR = Path("data/cache/http")
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+VARY_HEADERS = ("accept-language",)
+# parámetros que cambian en cada búsqueda pero no el contenido
+IGNORED_PARAMS = {"searchId", "refId"}
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(query), ""))
+
+
+class CachedResponse:
+    """Respuesta mínima compatible con lo que usan los scrapers (status_code, headers, text)."""
+
+    def __init__(self, status_code: int, headers: dict, content: bytes, from_cache: bool,
+                 revalidated: bool = False):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache      # True solo si no hubo petición (acierto fresco)
+        self.revalidated = revalidated    # 304: hubo petición, el cuerpo sale del disco
+
+    def as_revalidated(self) -> "CachedResponse":
+        return CachedResponse(self.status_code, self.headers, self.content, from_cache=False, revalidated=True)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+class ResponseCache:
+    def __init__(self, root: str | Path = DEFAULT_DIR, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, level: int = 10):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._cctx = zstd.ZstdCompressor(level=level)
+        self._dctx = zstd.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root / "index.sqlite", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT,"
+            " blob TEXT, size INTEGER, stored_at REAL, accessed REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._db.commit()
+        self.hits = self.misses = self.revalidated = 0
+        self._bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT blob, size FROM entries)"
+        ).fetchone()[0]
+
+    # ---------------- claves / blobs ----------------
+    def key(self, url: str, headers: dict | None = None) -> str:
+        h = {k.lower(): v for k, v in (headers or {}).items()}
+        vary = "\n".join(f"{k}:{h.get(k, '')}" for k in VARY_HEADERS)
+        return hashlib.sha256(f"{normalize_url(url)}\n{vary}".encode("utf-8")).hexdigest()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs / digest[:2] / f"{digest}.zst"
+
+    def _write_blob(self, body: bytes) -> tuple[str, int, bool]:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if path.exists():
+            return digest, path.stat().st_size, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = self._cctx.compress(body)
+        tmp = path.with_suffix(f".tmp{os.getpid()}_{threading.get_ident()}")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        return digest, len(data), True
+
+    # ---------------- API ----------------
+    def get(self, url: str, headers: dict | None = None):
+        """Devuelve (CachedResponse, fresh) o None si no está en caché."""
+        k = self.key(url, headers)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, blob, stored_at FROM entries WHERE key = ?", (k,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, hdrs, blob, stored_at = row
+            try:
+                body = self._dctx.decompress(self._blob_path(blob).read_bytes())
+            except FileNotFoundError:
+                # blob borrado a mano o a medias: la fila no sirve, cuenta como fallo
+                self._db.execute("DELETE FROM entries WHERE key = ? AND blob = ?", (k, blob))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), k))
+            self._db.commit()
+        fresh = (time.time() - stored_at) < self.ttl
+        return CachedResponse(status, json.loads(hdrs), body, from_cache=True), fresh
+
+    def put(self, url: str, headers: dict | None, status: int, resp_headers, body: bytes) -> None:
+        k = self.key(url, headers)
+        kept = {name: resp_headers[name] for name in STORED_HEADERS if resp_headers.get(name)}
+        now = time.time()
+        with self._lock:
+            # blob y fila juntos: evict/_drop_blob_if_unused no pueden borrar el blob en medio
+            digest, size, is_new = self._write_blob(body)
+            old = self._db.execute("SELECT blob FROM entries WHERE key = ?", (k,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (k, normalize_url(url), status, json.dumps(kept), digest, size, now, now),
+            )
+            self._db.commit()
+            if is_new:
+                self._bytes += size
+            if old and old[0] != digest:
+                self._drop_blob_if_unused(old[0])
+        self.evict()
+
+    def refresh(self, url: str, headers: dict | None = None) -> None:
+        """Marca una entrada como recién validada (respuesta 304)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET stored_at = ?, accessed = ? WHERE key = ?",
+                (now, now, self.key(url, headers)),
+            )
+            self._db.commit()
+
+    @staticmethod
+    def revalidation_headers(cached: CachedResponse) -> dict:
+        out = {}
+        if cached.headers.get("etag"):
+            out["If-None-Match"] = cached.headers["etag"]
+        if cached.headers.get("last-modified"):
+            out["If-Modified-Since"] = cached.headers["last-modified"]
+        return out
+
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def evict(self) -> int:
+        """Expulsa las entradas menos usadas hasta quedar bajo max_bytes."""
+        if self._bytes <= self.max_bytes:
+            return 0
+        removed = 0
+        with self._lock:
+            rows = self._db.execute("SELECT key, blob FROM entries ORDER BY accessed ASC").fetchall()
+            for key, blob in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._drop_blob_if_unused(blob)
+                removed += 1
+            self._db.commit()
+        return removed
+
+    def _drop_blob_if_unused(self, blob: str) -> None:
+        # llamar con self._lock tomado
+        if self._db.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone():
+            return
+        path = self._blob_path(blob)
+        try:
+            self._bytes -= path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    # ---------------- requests ----------------
+    def fetch(self, session, url: str, headers: dict | None = None, timeout: float = 30) -> CachedResponse:
+        """
+        GET con caché: fresco -> disco; caducado -> GET condicional; 304 -> disco
+        (from_cache=False, revalidated=True: sí hubo petición). Solo se guardan respuestas 200.
+        """
+        hit = self.get(url, headers)
+        if hit and hit[1]:
+            self.hits += 1
+            return hit[0]
+
+        req_headers = dict(headers or {})
+        if hit:
+            req_headers.update(self.revalidation_headers(hit[0]))
+
+        resp = session.get(url, headers=req_headers, timeout=timeout)
+        if resp.status_code == 304 and hit:
+            self.revalidated += 1
+            self.refresh(url, headers)
+            return hit[0].as_revalidated()
+
+        self.misses += 1
+        resp_headers = {k.lower(): v for k, v in resp.headers.items()}
+        if resp.status_code == 200:
+            self.put(url, headers, resp.status_code, resp_headers, resp.content)
+        return CachedResponse(resp.status_code, resp_headers, resp.content, from_cache=False)
+
+    # ---------------- Playwright ----------------
+    def playwright_route_handler(self, resource_types=("document",)):
+        """
+        Handler para `await context.route("**/*", cache.playwright_route_handler())`.
+        Solo cachea GET de los tipos indicados; el resto sigue de largo.
+        """
+        async def handler(route):
+            request = route.request
+            if request.method != "GET" or request.resource_type not in resource_types:
+                await route.continue_()
+                return
+
+            url = request.url
+            headers = request.headers
+            hit = self.get(url, headers)
+            if hit and hit[1]:
+                self.hits += 1
+                cached = hit[0]
+                await route.fulfill(status=cached.status_code, headers=cached.headers, body=cached.content)
+                return
+
+            fetch_headers = dict(headers)
+            if hit:
+                fetch_headers.update(self.revalidation_headers(hit[0]))
+            response = await route.fetch(headers=fetch_headers)
+
+            if response.status == 304 and hit:
+                self.revalidated += 1
+                self.refresh(url, headers)
+                cached = hit[0]
+                await route.fulfill(status=cached.status_code, headers=cached.headers, body=cached.content)
+                return
+
+            self.misses += 1
+            body = await response.body()
+            if response.status == 200:
+                self.put(url, headers, response.status, {k.lower(): v for k, v in response.headers.items()}, body)
+            await route.fulfill(response=response, body=body)
+
+        return handler
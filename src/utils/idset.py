@@ -0,0 +1,375 @@
+"""
+Conjunto compacto de ids de anuncio para dedup a millones de entradas.
+
+Los ids de mobile.de son enteros de 9 dígitos: en vez de sets de URLs
+(~90 bytes de texto + ~60 de objeto + hueco en la tabla por entrada) se
+guarda un array NumPy uint64 ordenado (8 bytes/id, búsqueda binaria) más un
+set pequeño con lo añadido desde la última fusión. Un filtro de Bloom
+opcional (~20 bits/id con holgura) responde "seguro que no está" sin tocar
+el array mientras este sigue mapeado desde disco (sin fallos de página en
+frío); ya en RAM, el bisect (~1.5µs) sale más barato que el Bloom en Python.
+
+Persistencia: <ruta>.npy (ids, np.load con mmap_mode="r": carga inmediata,
+el SO pagina lo que se consulte), <ruta>.bloom.npy y <ruta>.json (metadatos).
+load_line_ids() además recuerda hasta qué byte del fichero de origen leyó,
+así que al reanudar solo parsea las líneas nuevas.
+
+    known = load_line_ids(URLS_OUT, extract_id, cache=IDS_CACHE)
+    if ad_id not in known:
+        known.add(ad_id)
+
+    python -m src.utils.idset bench --n 10000000     # RAM set de URLs vs IdSet
+    python -m src.utils.idset build data/raw/mobile_de_urls.txt --cache data/ids/urls
+"""
+
+import argparse
+import bisect
+import json
+import re
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+MERGE_EVERY = 100_000       # ids nuevos en el set antes de fusionarlos al array
+BLOOM_BITS_PER_ID = 10      # ~1% de falsos positivos con k=7
+BLOOM_K = 7
+CHUNK = 1_000_000
+
+MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_M1 = 0xBF58476D1CE4E5B9
+_M2 = 0x94D049BB133111EB
+
+
+# ---------------- hash ----------------
+def _mix_int(x: int) -> int:
+    """splitmix64 sobre int de Python (misma salida que _mix_array)."""
+    x = (x + _GOLDEN) & MASK64
+    x = ((x ^ (x >> 30)) * _M1) & MASK64
+    x = ((x ^ (x >> 27)) * _M2) & MASK64
+    return x ^ (x >> 31)
+
+
+def _mix_array(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        x = x.astype(np.uint64) + np.uint64(_GOLDEN)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(_M1)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(_M2)
+        return x ^ (x >> np.uint64(31))
+
+
+# ---------------- Bloom ----------------
+class BloomFilter:
+    def __init__(self, n_bits: int, k: int = BLOOM_K, bits: np.ndarray | None = None):
+        self.m = max(64, (int(n_bits) + 63) // 64 * 64)
+        self.k = k
+        self.bits = bits if bits is not None else np.zeros(self.m // 8, dtype=np.uint8)
+        self._view = memoryview(self.bits)      # acceso escalar sin crear escalares de NumPy
+
+    @classmethod
+    def for_capacity(cls, n: int, bits_per_id: int = BLOOM_BITS_PER_ID, k: int = BLOOM_K) -> "BloomFilter":
+        return cls(max(n, 1024) * bits_per_id, k)
+
+    def _positions(self, ids: np.ndarray) -> np.ndarray:
+        # un solo hash de 64 bits partido en dos de 32 (Kirsch-Mitzenmacher)
+        h = _mix_array(ids)
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)
+        return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.m)
+
+    def add_many(self, ids: np.ndarray) -> None:
+        for start in range(0, len(ids), CHUNK):
+            pos = self._positions(ids[start:start + CHUNK]).ravel()
+            np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp),
+                             (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def contains_many(self, ids: np.ndarray) -> np.ndarray:
+        out = np.empty(len(ids), dtype=bool)
+        for start in range(0, len(ids), CHUNK):
+            pos = self._positions(ids[start:start + CHUNK])
+            hit = (self.bits[(pos >> np.uint64(3)).astype(np.intp)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1
+            out[start:start + CHUNK] = hit.all(axis=1)
+        return out
+
+    def _int_positions(self, x: int):
+        h = _mix_int(x)
+        h1, h2, m = h & 0xFFFFFFFF, (h >> 32) | 1, self.m
+        return ((h1 + i * h2) % m for i in range(self.k))
+
+    def add(self, x: int) -> None:
+        view = self._view
+        for p in self._int_positions(x):
+            view[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, x: int) -> bool:
+        view = self._view
+        return all(view[p >> 3] >> (p & 7) & 1 for p in self._int_positions(x))
+
+
+# ---------------- IdSet ----------------
+_URL_ID = re.compile(r"[?&]id=(\d+)|/(\d{6,})(?:\.html)?/?(?:[?#]|$)")
+
+
+def url_id(url: str) -> str | None:
+    """Id numérico de una URL de anuncio (?id=123 o /…/123.html)."""
+    m = _URL_ID.search(url or "")
+    return (m.group(1) or m.group(2)) if m else None
+
+
+def _as_int(x) -> int | None:
+    if isinstance(x, (int, np.integer)):
+        return int(x)
+    s = str(x).strip()
+    return int(s) if s.isdigit() and len(s) < 20 else None
+
+
+class IdSet:
+    """Set de ids enteros; lo que no sea un id numérico va a un set aparte (raro)."""
+
+    def __init__(self, ids: np.ndarray | None = None, bloom: bool | BloomFilter = False):
+        self._set_base(ids if ids is not None else np.empty(0, dtype=np.uint64))
+        self._new: set[int] = set()
+        self._other: set[str] = set()
+        if bloom is True:
+            self.bloom = BloomFilter.for_capacity(2 * len(self._base))
+            self.bloom.add_many(self._base)
+        else:
+            self.bloom = bloom or None
+
+    @classmethod
+    def from_iter(cls, items, bloom: bool = False) -> "IdSet":
+        out = cls(bloom=False)
+        out.update(items)
+        out._merge()
+        if bloom:
+            out.bloom = BloomFilter.for_capacity(2 * len(out._base))
+            out.bloom.add_many(out._base)
+        return out
+
+    # ---------------- set ----------------
+    def _set_base(self, ids: np.ndarray) -> None:
+        self._base = ids
+        self._mapped = isinstance(ids, np.memmap)
+        # bisect sobre memoryview: ~1µs por consulta, frente a varios µs de np.searchsorted escalar
+        self._view = memoryview(np.ascontiguousarray(ids, dtype=np.uint64)).cast("B").cast("Q")
+
+    def _in_base(self, k: int) -> bool:
+        view = self._view
+        i = bisect.bisect_left(view, k)
+        return i < len(view) and view[i] == k
+
+    def __contains__(self, x) -> bool:
+        k = _as_int(x)
+        if k is None:
+            return str(x) in self._other
+        return k in self._new or self._maybe_in_base(k)
+
+    def _maybe_in_base(self, k: int) -> bool:
+        if self._mapped and self.bloom is not None and k not in self.bloom:
+            return False
+        return self._in_base(k)
+
+    def add(self, x) -> bool:
+        """True si era nuevo."""
+        k = _as_int(x)
+        if k is None:
+            s = str(x)
+            if s in self._other:
+                return False
+            self._other.add(s)
+            return True
+        if k in self._new or self._maybe_in_base(k):
+            return False
+        self._new.add(k)
+        if self.bloom is not None:
+            self.bloom.add(k)
+        if len(self._new) >= MERGE_EVERY:
+            self._merge()
+        return True
+
+    def update(self, items) -> int:
+        return sum(self.add(x) for x in items if x is not None)
+
+    def contains_many(self, ids) -> np.ndarray:
+        """Versión vectorizada para ids numéricos (array de bool)."""
+        ids = np.asarray(ids, dtype=np.uint64)
+        self._merge()
+        if len(self._base) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        i = np.searchsorted(self._base, ids)
+        i[i == len(self._base)] = 0
+        return self._base[i] == ids
+
+    def _merge(self) -> None:
+        if not self._new:
+            return
+        new = np.fromiter(self._new, dtype=np.uint64, count=len(self._new))
+        self._set_base(np.union1d(self._base, new))      # ordenado y único; sale de memmap a RAM
+        self._new.clear()
+        if self.bloom is not None and len(self._base) * BLOOM_BITS_PER_ID > self.bloom.m:
+            # lleno: los falsos positivos se dispararían; se rehace con holgura x2
+            self.bloom = BloomFilter.for_capacity(2 * len(self._base), k=self.bloom.k)
+            self.bloom.add_many(self._base)
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._new) + len(self._other)
+
+    def __iter__(self):
+        self._merge()
+        yield from (int(x) for x in self._base)
+        yield from self._other
+
+    def nbytes(self) -> int:
+        """Aproximado: array + Bloom + sets (~70 bytes por entrada de set)."""
+        bloom = self.bloom.bits.nbytes if self.bloom is not None else 0
+        return int(self._base.nbytes) + bloom + 70 * (len(self._new) + len(self._other))
+
+    # ---------------- disco ----------------
+    def save(self, path: Path, **meta) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._merge()
+        npy = path.with_suffix(".npy")
+        # sin ids nuevos la base sigue mapeada de ese mismo fichero: no ha cambiado, y
+        # reemplazar un fichero mapeado falla en Windows (PermissionError)
+        if not (self._mapped and Path(self._base.filename).resolve() == npy.resolve()):
+            tmp = path.with_name(path.name + ".tmp.npy")
+            np.save(tmp, np.ascontiguousarray(self._base, dtype=np.uint64))
+            tmp.replace(npy)
+        if self.bloom is not None:
+            tmp = path.with_name(path.name + ".bloom.tmp.npy")
+            np.save(tmp, self.bloom.bits)
+            tmp.replace(path.with_suffix(".bloom.npy"))
+        info = {"n": len(self._base), "other": sorted(self._other), "saved_at": time.time(),
+                "bloom_bits": self.bloom.m if self.bloom is not None else None,
+                "bloom_k": self.bloom.k if self.bloom is not None else None, **meta}
+        path.with_suffix(".json").write_text(json.dumps(info), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "IdSet":
+        path = Path(path)
+        info = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+        ids = np.load(path.with_suffix(".npy"), mmap_mode="r" if mmap else None)
+        bloom = None
+        bloom_path = path.with_suffix(".bloom.npy")
+        if info.get("bloom_bits") and bloom_path.exists():
+            # copia en RAM: add() escribe bits y el fichero no debe cambiar hasta save()
+            bloom = BloomFilter(info["bloom_bits"], info["bloom_k"], bits=np.load(bloom_path))
+        out = cls(ids, bloom=bloom)
+        out._other = set(info.get("other", []))
+        out.meta = info
+        return out
+
+
+def load_line_ids(source: Path, key, cache: Path | None = None, bloom: bool = True) -> IdSet:
+    """
+    IdSet de las líneas de `source` (key(línea) -> id o None). Con cache, los
+    ids ya vistos se cargan del .npy y solo se parsea lo añadido al fichero
+    desde entonces (los ficheros de URLs son de solo-append).
+    """
+    source = Path(source)
+    ids, offset = None, 0
+    if cache is not None and Path(cache).with_suffix(".json").exists():
+        try:
+            ids = IdSet.load(cache)
+            offset = ids.meta.get("source_bytes", 0)
+            if ids.meta.get("source") != str(source) or not source.exists() or source.stat().st_size < offset:
+                ids, offset = None, 0      # el origen cambió: reconstruir
+        except (OSError, ValueError, KeyError):
+            ids, offset = None, 0
+    if ids is None:
+        ids = IdSet(bloom=bloom)
+    if not source.exists():
+        return ids
+
+    with source.open("rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1          # una línea a medio escribir se relee la próxima vez
+    fresh = offset == 0
+    for line in data[:end].decode("utf-8", errors="ignore").splitlines():
+        line = line.strip()
+        if line:
+            ids.add(key(line) or line)
+    if cache is not None and (end or fresh):
+        ids.save(cache, source=str(source), source_bytes=offset + end)
+    return ids
+
+
+# ---------------- CLI ----------------
+def _bench(n: int) -> None:
+    rng = np.random.default_rng(0)
+    raw = rng.permutation(np.unique(rng.integers(100_000_000, 999_999_999, size=n, dtype=np.int64)))
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    urls = {f"https://suchen.mobile.de/fahrzeuge/details.html?id={x}" for x in raw.tolist()}
+    t_set = time.perf_counter() - t0
+    set_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    probe = [f"https://suchen.mobile.de/fahrzeuge/details.html?id={x}" for x in raw[:100_000].tolist()]
+    t0 = time.perf_counter()
+    sum(u in urls for u in probe)
+    t_set_q = (time.perf_counter() - t0) / len(probe)
+    del urls, probe
+    tracemalloc.stop()
+
+    def lookups(ids: IdSet) -> tuple[float, float]:
+        hits = raw[:100_000].tolist()
+        misses = (raw[:100_000] + 1_000_000_000).tolist()
+        t0 = time.perf_counter()
+        sum(x in ids for x in hits)
+        t_hit = (time.perf_counter() - t0) / len(hits)
+        t0 = time.perf_counter()
+        sum(x in ids for x in misses)
+        return t_hit, (time.perf_counter() - t0) / len(misses)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    ids = IdSet(np.unique(raw.astype(np.uint64)))
+    t_ids = time.perf_counter() - t0
+    ids_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    t_hit, t_miss = lookups(ids)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ids.bloom = BloomFilter.for_capacity(2 * len(ids))
+        ids.bloom.add_many(ids._base)
+        ids.save(Path(tmp) / "ids")
+        t0 = time.perf_counter()
+        mapped = IdSet.load(Path(tmp) / "ids")
+        t_load = time.perf_counter() - t0
+        m_hit, m_miss = lookups(mapped)
+        del mapped
+
+    print(f"n={n:,}")
+    print(f"  set de URLs      : {set_mb:9.1f} MB  build {t_set:6.2f}s  lookup {t_set_q * 1e6:.2f}µs")
+    print(f"  IdSet (RAM)      : {ids_mb:9.1f} MB  build {t_ids:6.2f}s  lookup {t_hit * 1e6:.2f}µs hit "
+          f"{t_miss * 1e6:.2f}µs miss")
+    print(f"  IdSet (mmap+Bloom): carga {t_load * 1e3:.1f}ms  lookup {m_hit * 1e6:.2f}µs hit "
+          f"{m_miss * 1e6:.2f}µs miss")
+    print(f"  ratio RAM        : {set_mb / max(ids_mb, 1e-9):.0f}x")
+
+def main():
+    ap = argparse.ArgumentParser(description="Conjuntos compactos de ids para dedup")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="RAM y latencia: set de URLs vs IdSet")
+    b.add_argument("--n", type=int, default=1_000_000)
+    bl = sub.add_parser("build", help="construir/actualizar la caché .npy de un fichero de URLs")
+    bl.add_argument("source", type=Path)
+    bl.add_argument("--cache", type=Path, required=True)
+    args = ap.parse_args()
+
+    if args.cmd == "bench":
+        _bench(args.n)
+    else:
+        t0 = time.perf_counter()
+        ids = load_line_ids(args.source, url_id, cache=args.cache)
+        print(f"{len(ids):,} ids en {time.perf_counter() - t0:.2f}s | ~{ids.nbytes() / 1e6:.1f} MB -> {args.cache}.npy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Métricas de scraping: tiempos por etapa y contadores por sitio / worker.
+
+Etapas típicas: navigation, ready, consent, extraction, write, pause.
+Contadores típicos: pages, rows, blocks, retries, bytes.
+
+Se exportan como texto Prometheus (Metrics.serve -> /metrics, /metrics.json)
+y/o como snapshot JSON periódico en disco (snapshot_path).
+
+    METRICS = Metrics("mobile.de", snapshot_path=Path("data/metrics/run_full_scrape.json"))
+    with METRICS.timer("navigation", worker=1):
+        await page.goto(url)
+    METRICS.inc("pages", worker=1)
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SNAPSHOT_EVERY = 30.0
+METRICS_DIR = Path("data/metrics")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(BUCKETS) and value > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": round(self.total, 4), "max": round(self.max, 4),
+                "avg": round(self.total / self.count, 4) if self.count else None,
+                "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.counts))}
+
+
+def _labels(**kw) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in kw.items() if v is not None)
+
+
+class Metrics:
+    def __init__(self, site: str, snapshot_path: Path | None = None, snapshot_every: float = SNAPSHOT_EVERY):
+        self.site = site
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, str], float] = {}
+        self._hists: dict[tuple[str, str], Histogram] = {}
+        self._last_snapshot = time.monotonic()
+        self._server = None
+
+    # ---------------- registro ----------------
+    def inc(self, name: str, n: float = 1, worker=None) -> None:
+        key = (name, str(worker) if worker is not None else "")
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+        self._maybe_snapshot()
+
+    def observe(self, stage: str, seconds: float, worker=None) -> None:
+        key = (stage, str(worker) if worker is not None else "")
+        with self._lock:
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = Histogram()
+            h.observe(seconds)
+        self._maybe_snapshot()
+
+    @contextmanager
+    def timer(self, stage: str, worker=None):
+        """Vale también con await dentro: mide tiempo de pared."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0, worker)
+
+    def counter(self, name: str) -> float:
+        """Total de un contador sumando todos los workers."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    # ---------------- exportación ----------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {}
+            for (name, worker), v in sorted(self._counters.items()):
+                counters.setdefault(name, {})[worker or "_"] = v
+            stages = {}
+            for (stage, worker), h in sorted(self._hists.items()):
+                stages.setdefault(stage, {})[worker or "_"] = h.to_dict()
+        return {"site": self.site, "started": self.started, "at": time.time(),
+                "uptime_s": round(time.time() - self.started, 1), "counters": counters, "stages": stages}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            hists = sorted((k, h.to_dict()) for k, h in self._hists.items())
+        names = sorted({n for (n, _), _ in counters})
+        for name in names:
+            lines.append(f"# TYPE scraper_{name}_total counter")
+            for (n, worker), v in counters:
+                if n == name:
+                    lines.append(f"scraper_{name}_total{{{_labels(site=self.site, worker=worker or None)}}} {v}")
+        if hists:
+            lines.append("# TYPE scraper_stage_seconds histogram")
+        for (stage, worker), h in hists:
+            lab = _labels(site=self.site, worker=worker or None, stage=stage)
+            acc = 0
+            for le, c in h["buckets"].items():
+                acc += c
+                lines.append(f'scraper_stage_seconds_bucket{{{lab},le="{le}"}} {acc}')
+            lines.append(f"scraper_stage_seconds_sum{{{lab}}} {h['sum']}")
+            lines.append(f"scraper_stage_seconds_count{{{lab}}} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: Path | None = None) -> None:
+        path = path or self.snapshot_path
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), indent=1), encoding="utf-8")
+        tmp.replace(path)
+
+    def _maybe_snapshot(self) -> None:
+        if self.snapshot_path is None:
+            return
+        now = time.monotonic()
+        if now - self._last_snapshot < self.snapshot_every:
+            return
+        self._last_snapshot = now
+        try:
+            self.write_snapshot()
+        except OSError as e:
+            print(f"⚠️ No pude escribir métricas: {e!r}")
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """Endpoint /metrics (Prometheus) y /metrics.json en un hilo aparte."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, ctype = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Métricas en http://{host}:{port}/metrics")
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        parts = [f"{n}={sum(v.values()):g}" for n, v in snap["counters"].items()]
+        for stage, by_worker in snap["stages"].items():
+            count = sum(h["count"] for h in by_worker.values())
+            total = sum(h["sum"] for h in by_worker.values())
+            parts.append(f"{stage}={total / count:.2f}s×{count}" if count else stage)
+        return " | ".join(parts)
+
+    def close(self) -> None:
+        self.write_snapshot()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
@@ -0,0 +1,366 @@
+"""
+Normalizador de marca / modelo / acabado a partir del título del anuncio.
+
+- Limpia ruido ("Patrocinado", "NUEVO") y mojibake ("CitroÃ«n" -> "Citroën").
+- Trie de tokens con alias de marcas y modelos (coincidencia más larga:
+  "land rover range rover evoque" -> Land Rover / Range Rover Evoque).
+- Si no hay coincidencia exacta, fallback difuso con difflib.
+- Cada título resuelto se memoriza en memoria y en sqlite
+  (data/cache/normalize.sqlite); al cambiar el diccionario se sube
+  DICT_VERSION y la caché se vacía sola.
+
+    python -m src.utils.normalize "Patrocinado VW Golf 1.5 TSI Life para 21.990 €"
+"""
+
+import difflib
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+from typing import NamedTuple
+
+CACHE_DB = Path("data/cache/normalize.sqlite")
+DICT_VERSION = 1
+FUZZY_CUTOFF = 0.85
+
+NOISE_RX = re.compile(r"^(?:Patrocinado|NUEVO|Nuevo|Sponsored|Neu)\s+", re.I)
+# el título acaba donde empieza el precio ("... para 21.990 €" / "... 21.990 €")
+CUT_RX = re.compile(r"\s+para\s+|\s\d{1,3}(?:\.\d{3})+\s*€|\s\d+\s*€", re.I)
+SPLIT_RX = re.compile(r"[\s,/|]+")
+
+# marca canónica -> alias (en minúsculas, sin acentos; pueden ser varias palabras)
+BRANDS = {
+    "Volkswagen": ["volkswagen", "vw"],
+    "Audi": ["audi"],
+    "BMW": ["bmw"],
+    "Mercedes-Benz": ["mercedes-benz", "mercedes benz", "mercedes", "mb"],
+    "Opel": ["opel"],
+    "Ford": ["ford"],
+    "Skoda": ["skoda"],
+    "SEAT": ["seat"],
+    "Cupra": ["cupra"],
+    "Renault": ["renault"],
+    "Peugeot": ["peugeot"],
+    "Citroen": ["citroen"],
+    "Toyota": ["toyota"],
+    "Hyundai": ["hyundai"],
+    "Kia": ["kia"],
+    "Mazda": ["mazda"],
+    "Nissan": ["nissan"],
+    "Volvo": ["volvo"],
+    "Fiat": ["fiat"],
+    "MINI": ["mini"],
+    "Dacia": ["dacia"],
+    "Porsche": ["porsche"],
+    "Land Rover": ["land rover", "land-rover", "landrover", "land"],
+    "Jaguar": ["jaguar"],
+    "Jeep": ["jeep"],
+    "Suzuki": ["suzuki"],
+    "Mitsubishi": ["mitsubishi"],
+    "Honda": ["honda"],
+    "Alfa Romeo": ["alfa romeo", "alfa-romeo", "alfa"],
+    "Lexus": ["lexus"],
+    "DS": ["ds", "ds automobiles"],
+    "Tesla": ["tesla"],
+    "Smart": ["smart"],
+    "Subaru": ["subaru"],
+}
+
+# marca -> modelo canónico -> alias
+MODELS = {
+    "Volkswagen": {
+        "Golf": ["golf"], "Golf Variant": ["golf variant"], "Golf Sportsvan": ["golf sportsvan"],
+        "Polo": ["polo"], "Passat": ["passat"], "Passat Variant": ["passat variant"],
+        "Tiguan": ["tiguan"], "Tiguan Allspace": ["tiguan allspace"], "T-Roc": ["t-roc", "t roc", "troc"],
+        "T-Cross": ["t-cross", "t cross", "tcross"], "Touran": ["touran"], "Touareg": ["touareg"],
+        "Arteon": ["arteon"], "up!": ["up!", "up"], "ID.3": ["id.3", "id3"], "ID.4": ["id.4", "id4"],
+        "Caddy": ["caddy"], "Sharan": ["sharan"], "Scirocco": ["scirocco"], "Taigo": ["taigo"],
+        "Multivan": ["multivan", "t6 multivan"], "Transporter": ["transporter"],
+    },
+    "Audi": {
+        **{m: [m.lower()] for m in ("A1", "A3", "A4", "A5", "A6", "A7", "A8", "Q2", "Q3", "Q5", "Q7", "Q8", "TT")},
+        "A3 Sportback": ["a3 sportback"], "A4 Avant": ["a4 avant"], "A6 Avant": ["a6 avant"],
+        "e-tron": ["e-tron", "etron"], "RS3": ["rs3", "rs 3"], "S3": ["s3"],
+    },
+    "BMW": {
+        **{f"Serie {n}": [f"serie {n}", f"{n}er", f"series {n}", f"{n} series"] for n in range(1, 9)},
+        **{m: [m.lower()] for m in ("X1", "X2", "X3", "X4", "X5", "X6", "X7", "Z4", "i3", "i4", "iX", "M3", "M4")},
+    },
+    "Mercedes-Benz": {
+        **{f"Clase {c}": [f"clase {c.lower()}", f"{c.lower()}-klasse", f"{c.lower()}-class", c.lower()]
+           for c in ("A", "B", "C", "E", "S", "V", "G")},
+        **{m: [m.lower()] for m in ("CLA", "CLS", "GLA", "GLB", "GLC", "GLE", "GLS", "EQA", "EQC", "Vito", "Sprinter")},
+    },
+    "Opel": {m: [m.lower()] for m in ("Corsa", "Astra", "Insignia", "Mokka", "Crossland", "Grandland", "Zafira", "Combo")},
+    "Ford": {
+        **{m: [m.lower()] for m in ("Focus", "Fiesta", "Kuga", "Puma", "Mondeo", "Mustang", "Galaxy", "Ranger", "Transit", "EcoSport")},
+        "S-Max": ["s-max", "smax"], "C-Max": ["c-max", "cmax"], "Mustang Mach-E": ["mustang mach-e", "mach-e"],
+    },
+    "Skoda": {m: [m.lower()] for m in ("Octavia", "Fabia", "Superb", "Kodiaq", "Karoq", "Kamiq", "Scala", "Enyaq", "Yeti")},
+    "SEAT": {
+        **{m: [m.lower()] for m in ("Ibiza", "Leon", "Arona", "Ateca", "Tarraco", "Alhambra", "Mii")},
+        "Leon ST": ["leon st"],
+    },
+    "Cupra": {m: [m.lower()] for m in ("Formentor", "Born", "Leon", "Ateca")},
+    "Renault": {m: [m.lower()] for m in ("Clio", "Megane", "Captur", "Kadjar", "Arkana", "Austral", "Scenic", "Zoe", "Twingo", "Kangoo", "Talisman")},
+    "Peugeot": {m: [m.lower()] for m in ("108", "208", "2008", "308", "3008", "508", "5008", "Rifter", "Partner")},
+    "Citroen": {
+        **{m: [m.lower()] for m in ("C1", "C3", "C4", "C5", "Berlingo")},
+        "C3 Aircross": ["c3 aircross"], "C5 Aircross": ["c5 aircross"], "C4 Picasso": ["c4 picasso", "c4 spacetourer"],
+    },
+    "Toyota": {
+        **{m: [m.lower()] for m in ("Yaris", "Corolla", "Auris", "Aygo", "Prius", "RAV4", "Camry", "Supra")},
+        "C-HR": ["c-hr", "chr"], "Yaris Cross": ["yaris cross"], "Land Cruiser": ["land cruiser"],
+    },
+    "Hyundai": {m: [m.lower()] for m in ("i10", "i20", "i30", "Tucson", "Kona", "Santa Fe", "Ioniq", "Bayon")},
+    "Kia": {
+        **{m: [m.lower()] for m in ("Picanto", "Rio", "Ceed", "Sportage", "Sorento", "Niro", "Stonic", "EV6")},
+        "XCeed": ["xceed"], "ProCeed": ["proceed"],
+    },
+    "Mazda": {m: [m.lower()] for m in ("Mazda2", "Mazda3", "Mazda6", "CX-3", "CX-30", "CX-5", "CX-60", "MX-5")},
+    "Nissan": {m: [m.lower()] for m in ("Micra", "Juke", "Qashqai", "X-Trail", "Leaf", "Navara")},
+    "Volvo": {m: [m.lower()] for m in ("XC40", "XC60", "XC90", "V40", "V60", "V90", "S60", "S90")},
+    "Fiat": {m: [m.lower()] for m in ("500", "500X", "500L", "Panda", "Tipo", "Ducato", "Punto")},
+    "MINI": {m: [m.lower()] for m in ("Cooper", "One", "Countryman", "Clubman", "Paceman")},
+    "Dacia": {m: [m.lower()] for m in ("Sandero", "Duster", "Logan", "Jogger", "Spring")},
+    "Porsche": {m: [m.lower()] for m in ("911", "Cayenne", "Macan", "Panamera", "Taycan", "Boxster", "Cayman")},
+    "Land Rover": {
+        "Range Rover": ["range rover"], "Range Rover Evoque": ["range rover evoque", "evoque"],
+        "Range Rover Sport": ["range rover sport"], "Range Rover Velar": ["range rover velar", "velar"],
+        "Discovery": ["discovery"], "Discovery Sport": ["discovery sport"], "Defender": ["defender"],
+    },
+    "Jaguar": {m: [m.lower()] for m in ("XE", "XF", "XJ", "F-Pace", "E-Pace", "I-Pace", "F-Type")},
+    "Jeep": {m: [m.lower()] for m in ("Renegade", "Compass", "Wrangler", "Cherokee", "Avenger")},
+    "Suzuki": {m: [m.lower()] for m in ("Swift", "Vitara", "Ignis", "Jimny", "S-Cross")},
+    "Mitsubishi": {m: [m.lower()] for m in ("Outlander", "ASX", "Space Star", "Eclipse Cross", "L200")},
+    "Honda": {m: [m.lower()] for m in ("Civic", "Jazz", "CR-V", "HR-V", "e")},
+    "Alfa Romeo": {m: [m.lower()] for m in ("Giulia", "Giulietta", "Stelvio", "Tonale", "MiTo")},
+    "Lexus": {m: [m.lower()] for m in ("CT", "IS", "ES", "NX", "RX", "UX")},
+    "DS": {m: [m.lower(), m.lower().replace(" ", "")] for m in ("DS 3", "DS 4", "DS 7")},
+    "Tesla": {"Model 3": ["model 3"], "Model Y": ["model y"], "Model S": ["model s"], "Model X": ["model x"]},
+    "Smart": {m: [m.lower()] for m in ("ForTwo", "ForFour", "#1")},
+    "Subaru": {m: [m.lower()] for m in ("Impreza", "Forester", "Outback", "XV")},
+}
+
+# BMW: "320d" / "118i" -> Serie 3 / Serie 1
+BMW_CODE_RX = re.compile(r"^([1-8])\d{2}[a-z]{0,2}$")
+
+
+class Normalized(NamedTuple):
+    brand: str | None
+    model: str | None
+    trim: str | None
+    how: str   # exact | fuzzy | raw
+
+
+def fix_mojibake(text: str) -> str:
+    """'CitroÃ«n' -> 'Citroën' (UTF-8 leído como latin-1/cp1252)."""
+    if "Ã" not in text and "Â" not in text:
+        return text
+    return " ".join(_fix_word(w) for w in text.split(" "))
+
+
+def _fix_word(word: str) -> str:
+    # palabra a palabra: un "€" bien codificado no debe estropear el resto
+    if "Ã" not in word and "Â" not in word:
+        return word
+    for enc in ("cp1252", "latin-1"):
+        try:
+            return word.encode(enc).decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            continue
+    return word
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def clean_title(title: str) -> str:
+    t = " ".join(fix_mojibake(title or "").split())
+    while True:
+        t2 = NOISE_RX.sub("", t)
+        if t2 == t:
+            break
+        t = t2
+    m = CUT_RX.search(t)
+    return (t[: m.start()] if m else t).strip()
+
+
+# ---------------- trie de tokens ----------------
+class TokenTrie:
+    def __init__(self):
+        self.root: dict = {}
+
+    def add(self, phrase: str, value) -> None:
+        node = self.root
+        for tok in SPLIT_RX.split(phrase.strip()):
+            node = node.setdefault(tok, {})
+        node[None] = value
+
+    def longest(self, tokens: list[str], start: int = 0):
+        """(valor, tokens consumidos) de la coincidencia más larga desde `start`."""
+        node, best, used = self.root, None, 0
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if None in node:
+                best, used = node[None], i - start + 1
+        return best, used
+
+
+def _build():
+    brands = TokenTrie()
+    for canon, aliases in BRANDS.items():
+        for a in aliases:
+            brands.add(a, canon)
+    models = {}
+    for brand, table in MODELS.items():
+        trie = TokenTrie()
+        for canon, aliases in table.items():
+            for a in aliases:
+                trie.add(_fold(a), canon)
+        models[brand] = trie
+    # candidatos para el fallback difuso (una palabra)
+    brand_words = {a: c for c, al in BRANDS.items() for a in al if " " not in a and len(a) > 3}
+    model_words = {b: {_fold(a): c for c, al in t.items() for a in al if " " not in a and len(a) > 3}
+                   for b, t in MODELS.items()}
+    return brands, models, brand_words, model_words
+
+
+BRAND_TRIE, MODEL_TRIES, BRAND_WORDS, MODEL_WORDS = _build()
+
+
+def _fuzzy(word: str, candidates: dict):
+    if len(word) <= 3:
+        return None
+    hit = difflib.get_close_matches(word, candidates.keys(), n=1, cutoff=FUZZY_CUTOFF)
+    return candidates[hit[0]] if hit else None
+
+
+def resolve(title: str) -> Normalized:
+    """Resuelve un título sin caché."""
+    text = clean_title(title)
+    if not text:
+        return Normalized(None, None, None, "raw")
+    raw_tokens = [t for t in SPLIT_RX.split(text) if t]
+    tokens = [_fold(t) for t in raw_tokens]
+    how = "exact"
+
+    brand, used = BRAND_TRIE.longest(tokens)
+    if brand is None:
+        brand = _fuzzy(tokens[0], BRAND_WORDS)
+        used = 1
+        if brand is None:
+            model = raw_tokens[1] if len(raw_tokens) > 1 else None
+            trim = " ".join(raw_tokens[2:]) or None
+            return Normalized(raw_tokens[0], model, trim, "raw")
+        how = "fuzzy"
+
+    pos = used
+    model = None
+    trie = MODEL_TRIES.get(brand)
+    if trie and pos < len(tokens):
+        model, n = trie.longest(tokens, pos)
+        if model is None and brand == "BMW":
+            m = BMW_CODE_RX.match(tokens[pos])
+            if m:
+                model, n = f"Serie {m.group(1)}", 0   # el código queda en el acabado
+        if model is None:
+            model = _fuzzy(tokens[pos], MODEL_WORDS.get(brand, {}))
+            n = 1
+            if model is not None:
+                how = "fuzzy"
+        pos += n if model is not None else 0
+    if model is None and pos < len(raw_tokens):
+        model = raw_tokens[pos]
+        pos += 1
+        how = "raw" if how == "exact" else how
+
+    trim = " ".join(raw_tokens[pos:]) or None
+    return Normalized(brand, model, trim, how)
+
+
+# ---------------- caché persistente ----------------
+class Normalizer:
+    def __init__(self, db_path: str | Path | None = CACHE_DB):
+        self._memo: dict[str, Normalized] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path is not None:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS titles (key TEXT PRIMARY KEY, brand TEXT, model TEXT, trim TEXT, how TEXT)"
+            )
+            row = self._db.execute("SELECT v FROM meta WHERE k = 'dict_version'").fetchone()
+            if row is None or int(row[0]) != DICT_VERSION:
+                self._db.execute("DELETE FROM titles")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dict_version', ?)", (str(DICT_VERSION),))
+            self._db.commit()
+        self.hits = self.misses = 0
+
+    def normalize(self, title: str) -> Normalized:
+        return self.normalize_many([title])[0]
+
+    def normalize_many(self, titles) -> list[Normalized]:
+        titles = ["" if t is None else str(t) for t in titles]
+        with self._lock:
+            missing = [t for t in dict.fromkeys(titles) if t not in self._memo]
+            self.hits += len(titles) - len(missing)
+            if missing and self._db is not None:
+                self._load(missing)
+                missing = [t for t in missing if t not in self._memo]
+            if missing:
+                self.misses += len(missing)
+                fresh = {t: resolve(t) for t in missing}
+                self._memo.update(fresh)
+                if self._db is not None:
+                    self._db.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, ?)",
+                                         [(t, *r) for t, r in fresh.items()])
+                    self._db.commit()
+            return [self._memo[t] for t in titles]
+
+    def _load(self, keys: list[str]) -> None:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            q = f"SELECT key, brand, model, trim, how FROM titles WHERE key IN ({','.join('?' * len(chunk))})"
+            for key, *vals in self._db.execute(q, chunk):
+                self._memo[key] = Normalized(*vals)
+
+    def normalize_series(self, titles):
+        """pandas Series de títulos -> DataFrame (brand, model, trim, how); resuelve cada título único una vez."""
+        import pandas as pd
+
+        codes, uniques = pd.factorize(titles.fillna(""), sort=False)
+        res = pd.DataFrame(self.normalize_many(uniques), columns=list(Normalized._fields))
+        out = res.iloc[codes].reset_index(drop=True)
+        out.index = titles.index
+        return out
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default: Normalizer | None = None
+
+
+def normalize_title(title: str) -> Normalized:
+    global _default
+    if _default is None:
+        _default = Normalizer()
+    return _default.normalize(title)
+
+
+if __name__ == "__main__":
+    n = Normalizer(db_path=None)
+    for t in sys.argv[1:] or [line.rstrip("\n") for line in sys.stdin]:
+        print(t, "->", n.normalize(t))
@@ -0,0 +1,205 @@
+"""
+Archivo de páginas crudas (tipo WARC) + modo replay offline.
+
+Cada página descargada se guarda como un frame zstd en un fichero de
+segmento append-only (`pages-00001.arc`), precedido de una cabecera JSON
+(url, fecha, hash, site, kind). `index.jsonl` apunta a (segmento, offset,
+longitud). Si el contenido ya estaba archivado (mismo sha256) solo se
+añade una línea al índice.
+
+Replay: re-ejecuta un extractor sobre todo el archivo en paralelo, sin red:
+
+    python -m src.utils.page_archive replay --extractor mobile_de_detail --out data/interim/replay.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import zstandard as zstd
+
+DEFAULT_DIR = Path("data/archive")
+SEGMENT_MAX_BYTES = 1024**3
+HEADER_SEP = b"\r\n\r\n"
+
+# nombre -> ("modulo:funcion", site, kind, columnas). La función recibe (html, url) y devuelve
+# lista de filas; site/kind son las páginas del archivo a las que se aplica por defecto.
+EXTRACTORS = {
+    "mobile_de_search": (
+        "src.scraping.mobile_de.mobile_de_scraper:parse_search_page", "mobile.de", "search",
+        ["url", "titulo", "precio", "kilometros", "potencia_cv", "combustible", "primera_matriculacion", "ubicacion"],
+    ),
+    "mobile_de_detail": (
+        "src.scraping.pw_collect_and_scrape_multi:parse_detail_html", "mobile.de", "detail",
+        ["url", "title", "brand", "model", "price_eur", "km", "first_registration", "year", "blocked", "skipped", "skip_reason"],
+    ),
+    "coches_net_cards": (
+        "src.scraping.coches_net.coches_net_crawler:parse_cards_html", "coches.net", "search",
+        None,   # esquema común (LISTING_FIELDS)
+    ),
+}
+
+
+class PageArchive:
+    def __init__(self, root: str | Path = DEFAULT_DIR, level: int = 9):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.jsonl"
+        self._cctx = zstd.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+        self._by_sha: dict[str, tuple[str, int, int]] | None = None
+        self._segment = None
+
+    def _load(self) -> None:
+        # el índice en memoria solo hace falta para escribir (dedup)
+        self._by_sha = {}
+        for e in self.iter_index():
+            self._by_sha.setdefault(e["sha"], (e["segment"], e["offset"], e["length"]))
+        self._segment = self._current_segment()
+
+    def _current_segment(self) -> str:
+        segs = sorted(self.root.glob("pages-*.arc"))
+        if segs and segs[-1].stat().st_size < SEGMENT_MAX_BYTES:
+            return segs[-1].name
+        return f"pages-{len(segs) + 1:05d}.arc"
+
+    def iter_index(self):
+        if not self.index_path.exists():
+            return
+        with self.index_path.open("r", encoding="utf-8") as f:
+            for ln in f:
+                if ln.strip():
+                    yield json.loads(ln)
+
+    def add(self, url: str, html: str, site: str = "", kind: str = "") -> bool:
+        """Archiva una página. Devuelve True si el contenido era nuevo."""
+        body = html.encode("utf-8")
+        sha = hashlib.sha256(body).hexdigest()
+        entry = {"url": url, "ts": time.time(), "sha": sha, "site": site, "kind": kind}
+        with self._lock:
+            if self._by_sha is None:
+                self._load()
+            is_new = sha not in self._by_sha
+            if is_new:
+                header = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+                frame = self._cctx.compress(header + HEADER_SEP + body)
+                seg_path = self.root / self._segment
+                with seg_path.open("ab") as f:
+                    offset = f.tell()
+                    f.write(frame)
+                self._by_sha[sha] = (self._segment, offset, len(frame))
+                if offset + len(frame) >= SEGMENT_MAX_BYTES:
+                    self._segment = self._current_segment()
+            segment, offset, length = self._by_sha[sha]
+            entry.update(segment=segment, offset=offset, length=length)
+            with self.index_path.open("a", encoding="utf-8", newline="\n") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return is_new
+
+    def entries(self, site: str | None = None, kind: str | None = None, latest_only: bool = True) -> list[dict]:
+        out = {}
+        rows = []
+        for e in self.iter_index():
+            if site and e.get("site") != site:
+                continue
+            if kind and e.get("kind") != kind:
+                continue
+            if latest_only:
+                out[e["url"]] = e
+            else:
+                rows.append(e)
+        return list(out.values()) if latest_only else rows
+
+
+def read_entry(root: Path, entry: dict, dctx=None) -> str:
+    dctx = dctx or zstd.ZstdDecompressor()
+    with (root / entry["segment"]).open("rb") as f:
+        f.seek(entry["offset"])
+        raw = dctx.decompress(f.read(entry["length"]))
+    return raw.split(HEADER_SEP, 1)[1].decode("utf-8", errors="replace")
+
+
+# ---------------- replay ----------------
+def _load_extractor(name: str):
+    path = EXTRACTORS[name][0]
+    mod, func = path.split(":")
+    return getattr(importlib.import_module(mod), func)
+
+
+def _replay_chunk(args):
+    root, name, chunk = args
+    extractor = _load_extractor(name)
+    dctx = zstd.ZstdDecompressor()
+    rows = []
+    for entry in chunk:
+        html = read_entry(Path(root), entry, dctx)
+        for row in extractor(html, entry["url"]) or []:
+            row.setdefault("source_url", entry["url"])
+            row.setdefault("fetched_at", entry["ts"])
+            rows.append(row)
+    return rows
+
+
+def replay(root: Path, name: str, out: Path, site: str | None = None, kind: str | None = None,
+           workers: int | None = None, chunk_size: int = 200) -> int:
+    """site/kind: por defecto los del extractor (solo sus páginas)."""
+    _, default_site, default_kind, fields = EXTRACTORS[name]
+    site, kind = site or default_site, kind or default_kind
+    archive = PageArchive(root)
+    entries = archive.entries(site=site, kind=kind)
+    if fields is None:
+        from src.utils.schema import LISTING_FIELDS
+        fields = LISTING_FIELDS
+    fields = list(fields) + ["source_url", "fetched_at"]
+
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    out.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with out.open("w", newline="", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as ex:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        for rows in ex.map(_replay_chunk, [(str(root), name, c) for c in chunks]):
+            w.writerows(rows)
+            n += len(rows)
+    print(f"Replay '{name}' ({site}/{kind}): {len(entries)} páginas -> {n} filas en {out}")
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Archivo de páginas y replay offline de extractores")
+    ap.add_argument("--root", type=Path, default=DEFAULT_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("replay", help="re-ejecuta un extractor sobre el archivo")
+    r.add_argument("--extractor", choices=sorted(EXTRACTORS), required=True)
+    r.add_argument("--out", type=Path, required=True)
+    r.add_argument("--site", help="por defecto el del extractor")
+    r.add_argument("--kind", help="por defecto el del extractor")
+    r.add_argument("--workers", type=int)
+
+    st = sub.add_parser("stats", help="resumen del archivo")
+    st.add_argument("--site")
+
+    args = ap.parse_args()
+    if args.cmd == "replay":
+        replay(args.root, args.extractor, args.out, site=args.site, kind=args.kind, workers=args.workers)
+    else:
+        archive = PageArchive(args.root)
+        entries = list(archive.iter_index())
+        if args.site:
+            entries = [e for e in entries if e.get("site") == args.site]
+        size = sum(p.stat().st_size for p in args.root.glob("pages-*.arc"))
+        print(f"Registros: {len(entries)} | URLs: {len({e['url'] for e in entries})} "
+              f"| contenidos únicos: {len({e['sha'] for e in entries})} | {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
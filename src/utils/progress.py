@@ -0,0 +1,241 @@
+"""
+Progreso en vivo para crawls largos: ritmo móvil, ETA, tasa de bloqueos y backoff.
+
+- Ritmo sobre una ventana móvil (ROLLING_WINDOW s), no la media desde el
+  arranque: un cambio de config se nota en segundos.
+- ETA con lo que queda en el frontier (total puede crecer con add_total).
+- En terminal, una línea de estado fija abajo que se redibuja en el sitio;
+  los print() normales siguen saliendo por encima. Fuera de terminal (logs,
+  nohup) se imprime una línea cada LOG_EVERY s.
+- Opcional: status JSON en disco (status_path) para mirarlo desde otra shell.
+
+    PROGRESS = Progress("phase2", total=len(to_scrape), status_path=METRICS_DIR / "run.progress.json")
+    for url in to_scrape:
+        ...
+        PROGRESS.advance(blocked=row["blocked"])
+        with PROGRESS.backoff(12):
+            await page.wait_for_timeout(12000)
+    PROGRESS.close()
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+ROLLING_WINDOW = 60.0   # s
+RENDER_EVERY = 1.0      # s entre redibujados en terminal
+LOG_EVERY = 30.0        # s entre líneas cuando no hay terminal
+STATUS_EVERY = 5.0      # s entre escrituras del status JSON
+
+CLEAR_LINE = "\r\x1b[K"
+
+
+def fmt_duration(seconds: float | None) -> str:
+    if seconds is None or seconds != seconds or seconds == float("inf"):
+        return "?"
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    if h:
+        return f"{h}h{m:02d}m"
+    if m:
+        return f"{m}m{s:02d}s"
+    return f"{s}s"
+
+
+class _StdoutProxy:
+    """Borra la línea de estado antes de cada print y la repinta tras el salto de línea."""
+
+    def __init__(self, progress: "Progress", real):
+        self._progress = progress
+        self._real = real
+
+    def write(self, s: str) -> int:
+        p = self._progress
+        with p._lock:
+            if p._shown:
+                self._real.write(CLEAR_LINE)
+                p._shown = False
+            n = self._real.write(s)
+            if s.endswith("\n"):
+                p._draw()
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+class Progress:
+    def __init__(self, label: str, total: int | None = None, window: float = ROLLING_WINDOW,
+                 status_path: Path | None = None, stream=None, render_every: float = RENDER_EVERY):
+        self.label = label
+        self.total = total
+        self.window = window
+        self.status_path = status_path
+        self.render_every = render_every
+        self.done = 0
+        self.blocked = 0
+        self.started = time.monotonic()
+        self._events: deque[tuple[float, int, int]] = deque()   # (t, n, bloqueados)
+        self._backoff_until = 0.0
+        self._lock = threading.RLock()
+        self._last_render = 0.0
+        self._last_log = time.monotonic()
+        self._last_status = 0.0
+        self._shown = False
+
+        self._stream = stream or sys.stdout
+        self._tty = hasattr(self._stream, "isatty") and self._stream.isatty()
+        self._proxy = None
+        if self._tty and self._stream is sys.stdout:
+            self._proxy = sys.stdout = _StdoutProxy(self, self._stream)
+
+    # ---------------- registro ----------------
+    def advance(self, n: int = 1, blocked: bool | int = False) -> None:
+        now = time.monotonic()
+        b = int(blocked) if not isinstance(blocked, bool) else (n if blocked else 0)
+        with self._lock:
+            self.done += n
+            self.blocked += b
+            self._events.append((now, n, b))
+            self._prune(now)
+        self._tick(now)
+
+    def add_total(self, n: int) -> None:
+        """El frontier creció (p.ej. links nuevos en la fase 1)."""
+        with self._lock:
+            self.total = (self.total or 0) + n
+        self._tick(time.monotonic())
+
+    def set_total(self, total: int | None) -> None:
+        with self._lock:
+            self.total = total
+        self._tick(time.monotonic())
+
+    def set_backoff(self, seconds: float) -> None:
+        with self._lock:
+            self._backoff_until = time.monotonic() + seconds
+        self._tick(time.monotonic(), force=True)
+
+    @contextmanager
+    def backoff(self, seconds: float):
+        """Marca la espera en curso; vale con await dentro."""
+        self.set_backoff(seconds)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._backoff_until = 0.0
+
+    # ---------------- cálculo ----------------
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+
+    def rate(self) -> float:
+        """Items/s en la ventana móvil."""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            n = sum(e[1] for e in self._events)
+        span = min(self.window, now - self.started)
+        return n / span if span > 0 else 0.0
+
+    def block_rate(self) -> float | None:
+        with self._lock:
+            n = sum(e[1] for e in self._events)
+            b = sum(e[2] for e in self._events)
+        return b / n if n else None
+
+    def eta(self) -> float | None:
+        if self.total is None:
+            return None
+        r = self.rate()
+        left = max(self.total - self.done, 0)
+        return left / r if r > 0 else None
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            backoff = max(self._backoff_until - now, 0.0)
+            done, total, blocked = self.done, self.total, self.blocked
+        br = self.block_rate()
+        return {
+            "label": self.label, "done": done, "total": total,
+            "rate_per_s": round(self.rate(), 4), "window_s": self.window,
+            "eta_s": None if self.eta() is None else round(self.eta()),
+            "blocked": blocked, "block_rate": None if br is None else round(br, 4),
+            "backoff_s": round(backoff, 1), "elapsed_s": round(now - self.started, 1),
+            "at": time.time(),
+        }
+
+    def line(self) -> str:
+        st = self.status()
+        if st["total"]:
+            head = f"[{self.label}] {st['done']}/{st['total']} ({st['done'] / st['total']:.1%})"
+        else:
+            head = f"[{self.label}] {st['done']}"
+        rate = st["rate_per_s"]
+        parts = [head, f"{rate * 60:.1f}/min" if rate < 1 else f"{rate:.2f}/s"]
+        if st["total"]:
+            parts.append(f"ETA {fmt_duration(st['eta_s'])}")
+        if st["block_rate"] is not None:
+            parts.append(f"bloqueos {st['block_rate']:.1%}")
+        if st["backoff_s"] > 0:
+            parts.append(f"backoff {st['backoff_s']:.0f}s")
+        parts.append(f"t={fmt_duration(st['elapsed_s'])}")
+        return " | ".join(parts)
+
+    # ---------------- salida ----------------
+    def _draw(self) -> None:
+        # con self._lock tomado
+        if not self._tty:
+            return
+        real = self._proxy._real if self._proxy else self._stream
+        real.write(CLEAR_LINE + self.line())
+        real.flush()
+        self._shown = True
+
+    def _tick(self, now: float, force: bool = False) -> None:
+        if self._tty:
+            if force or now - self._last_render >= self.render_every:
+                self._last_render = now
+                with self._lock:
+                    self._draw()
+        elif force or now - self._last_log >= LOG_EVERY:
+            self._last_log = now
+            print(self.line(), file=self._stream, flush=True)
+
+        if self.status_path is not None and (force or now - self._last_status >= STATUS_EVERY):
+            self._last_status = now
+            self.write_status()
+
+    def write_status(self) -> None:
+        if self.status_path is None:
+            return
+        try:
+            self.status_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.status_path.with_suffix(self.status_path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self.status(), indent=1), encoding="utf-8")
+            tmp.replace(self.status_path)
+        except OSError as e:
+            print(f"⚠️ No pude escribir el progreso: {e!r}")
+
+    def close(self) -> None:
+        """Deja la última línea fija y restaura stdout."""
+        with self._lock:
+            if self._proxy is not None and sys.stdout is self._proxy:
+                sys.stdout = self._proxy._real
+            real = self._proxy._real if self._proxy else self._stream
+            if self._shown:
+                real.write(CLEAR_LINE)
+                self._shown = False
+            self._proxy = None
+            self._tty = False
+        print(self.line(), file=real, flush=True)
+        self.write_status()
@@ -0,0 +1,218 @@
+"""
+Trazas de Playwright muestreadas + captura de navegaciones lentas.
+
+El tracing queda arrancado en el context (NavTracer.attach) y cada navegación
+es un chunk: al terminar se guarda el .zip si la navegación salió en la
+muestra (SAMPLE_RATE), si pasó de SLOW_THRESHOLD_S o si acabó en excepción;
+si no, el chunk se descarta. Junto a cada traza va un .json con la URL, los
+tiempos por etapa y las notas (p.ej. reintentos de safe_get_title). El
+directorio se rota por presupuesto de disco (borra las más antiguas).
+
+    TRACER = NavTracer(Path("data/traces"))
+    await TRACER.attach(context)                  # tras cada new_context
+    async with TRACER.trace(context, url) as rec:
+        await page.goto(url)
+        rec.mark("navigation")
+        ...
+        rec.mark("extraction")
+
+    python -m src.utils.pw_tracing list            # las más lentas primero
+    playwright show-trace data/traces/<fichero>.zip
+
+Coste: con snapshots activos el navegador serializa el DOM en cada acción
+aunque luego se descarte el chunk; para medir rendimiento real, TRACE_DIR = None.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import weakref
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+TRACES_DIR = Path("data/traces")
+SAMPLE_RATE = 0.01          # fracción de navegaciones normales que se guardan
+SLOW_THRESHOLD_S = 20.0     # por encima, siempre se guarda
+DISK_BUDGET_MB = 500
+
+_current: ContextVar["TraceRecord | None"] = ContextVar("pw_trace_record", default=None)
+
+
+def note(key: str, value=1, add: bool = False) -> None:
+    """Anota algo en la traza en curso (no hace nada si no hay)."""
+    rec = _current.get()
+    if rec is None:
+        return
+    if add:
+        rec.notes[key] = rec.notes.get(key, 0) + value
+    else:
+        rec.notes[key] = value
+
+
+def _slug(url: str) -> str:
+    m = re.search(r"id=(\d+)", url)
+    if m:
+        return m.group(1)
+    return re.sub(r"[^A-Za-z0-9]+", "_", url.split("//", 1)[-1])[:60].strip("_")
+
+
+class TraceRecord:
+    __slots__ = ("url", "started", "t0", "last", "stages", "notes", "reason")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.started = time.time()
+        self.t0 = self.last = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.notes: dict = {}
+        self.reason: str | None = None
+
+    def mark(self, stage: str) -> float:
+        """Cierra la etapa: tiempo desde el mark anterior (se acumula si se repite)."""
+        now = time.perf_counter()
+        dt = now - self.last
+        self.last = now
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + dt, 3)
+        return dt
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+
+class NavTracer:
+    def __init__(self, out_dir: Path | None = TRACES_DIR, sample_rate: float = SAMPLE_RATE,
+                 slow_threshold_s: float = SLOW_THRESHOLD_S, budget_mb: float = DISK_BUDGET_MB,
+                 screenshots: bool = True, snapshots: bool = True, seed: int | None = None):
+        self.out_dir = Path(out_dir) if out_dir else None     # None = solo tiempos, sin trazas
+        self.sample_rate = sample_rate
+        self.slow_threshold_s = slow_threshold_s
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.screenshots = screenshots
+        self.snapshots = snapshots
+        self._rng = random.Random(seed)
+        self._attached = weakref.WeakSet()     # contextos con tracing.start (los ids se reutilizan)
+        self.saved = 0
+        self.discarded = 0
+
+    async def attach(self, context) -> None:
+        """Arranca el tracing en un context nuevo (los chunks van por navegación)."""
+        if self.out_dir is None or context in self._attached:
+            return
+        try:
+            await context.tracing.start(screenshots=self.screenshots, snapshots=self.snapshots, sources=False)
+            self._attached.add(context)
+        except Exception as e:
+            print(f"   -> tracing no disponible: {e!r}")
+
+    @asynccontextmanager
+    async def trace(self, context, url: str):
+        rec = TraceRecord(url)
+        started = False
+        if context in self._attached:
+            try:
+                await context.tracing.start_chunk(title=url)
+                started = True
+            except Exception:
+                pass
+        token = _current.set(rec)
+        error = None
+        try:
+            yield rec
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            total = rec.elapsed()
+            if error is not None:
+                rec.reason = "error"
+                rec.notes["error"] = repr(error)[:500]
+            elif total >= self.slow_threshold_s:
+                rec.reason = "slow"
+            elif self._rng.random() < self.sample_rate:
+                rec.reason = "sample"
+            if started:
+                await self._finish(context, rec, total)
+
+    async def _finish(self, context, rec: TraceRecord, total: float) -> None:
+        if rec.reason is None:
+            try:
+                await context.tracing.stop_chunk()
+            except Exception:
+                pass
+            self.discarded += 1
+            return
+
+        stamp = datetime.fromtimestamp(rec.started).strftime("%Y%m%d_%H%M%S")
+        base = self.out_dir / f"{stamp}_{rec.reason}_{_slug(rec.url)}"
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"url": rec.url, "started": rec.started, "total_s": round(total, 3), "reason": rec.reason,
+                "stages": rec.stages, "notes": rec.notes, "trace": base.name + ".zip"}
+        try:
+            await context.tracing.stop_chunk(path=str(base) + ".zip")
+        except Exception as e:
+            # el context pudo cerrarse a mitad (TargetClosedError): guardamos solo los tiempos
+            meta["trace"] = None
+            meta["notes"]["trace_error"] = repr(e)[:200]
+        base.with_suffix(".json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+        self.saved += 1
+        if rec.reason == "slow":
+            print(f"   -> 🐢 navegación lenta ({total:.1f}s), traza en {base}.zip")
+        self.rotate()
+
+    def rotate(self) -> int:
+        """Borra trazas hasta quedar por debajo del presupuesto: primero las de muestra, las más antiguas antes."""
+        files = sorted(self.out_dir.glob("*.json"), key=lambda p: ("_sample_" not in p.name, p.stat().st_mtime))
+        sizes = {}
+        for meta in files:
+            z = meta.with_suffix(".zip")
+            sizes[meta] = meta.stat().st_size + (z.stat().st_size if z.exists() else 0)
+        total = sum(sizes.values())
+        removed = 0
+        for meta in files:
+            if total <= self.budget_bytes:
+                break
+            meta.with_suffix(".zip").unlink(missing_ok=True)
+            meta.unlink(missing_ok=True)
+            total -= sizes[meta]
+            removed += 1
+        return removed
+
+    def summary(self) -> str:
+        return f"trazas guardadas={self.saved} descartadas={self.discarded}"
+
+
+def load_index(out_dir: Path = TRACES_DIR) -> list[dict]:
+    out = []
+    for meta in out_dir.glob("*.json"):
+        try:
+            out.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trazas de Playwright guardadas (lentas / muestreadas)")
+    ap.add_argument("cmd", choices=["list"])
+    ap.add_argument("--dir", type=Path, default=TRACES_DIR)
+    ap.add_argument("--reason", choices=["slow", "sample", "error"])
+    ap.add_argument("--top", type=int, default=20)
+    args = ap.parse_args()
+
+    rows = [r for r in load_index(args.dir) if not args.reason or r.get("reason") == args.reason]
+    rows.sort(key=lambda r: r.get("total_s") or 0, reverse=True)
+    size = sum(p.stat().st_size for p in args.dir.glob("*")) / 1e6 if args.dir.exists() else 0
+    print(f"Trazas: {len(rows)} | {size:.1f} MB en {args.dir}")
+    for r in rows[:args.top]:
+        stages = " ".join(f"{k}={v:.1f}s" for k, v in r.get("stages", {}).items())
+        notes = " ".join(f"{k}={v}" for k, v in r.get("notes", {}).items())
+        print(f"{r['total_s']:>7.1f}s {r['reason']:<6} {r['url']}\n         {stages} {notes}\n         {r.get('trace')}")
+
+
+if __name__ == "__main__":
+    main()
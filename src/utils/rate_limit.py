@@ -0,0 +1,75 @@
+"""
+Limitador asíncrono compartido: concurrencia máxima + espaciado entre
+arranques de petición + pausa global.
+
+Todas las tareas (páginas de todos los rangos) pasan por el mismo limitador,
+así que el presupuesto de cortesía es del proceso y no de cada bucle. Un 429
+en cualquier tarea pausa a todas (pause), que es el equivalente concurrente
+del time.sleep del scraper síncrono.
+
+    LIMITER = AsyncLimiter(concurrency=4, min_interval=1.0, jitter=1.0)
+    async with LIMITER:
+        resp = await client.get(url)
+    if resp.status_code == 429:
+        LIMITER.pause(wait_time)
+"""
+
+import asyncio
+import random
+import time
+
+MAX_CONCURRENCY = 4
+MIN_INTERVAL = 1.0      # s mínimos entre arranques de petición (todo el proceso)
+JITTER = 1.0            # + uniform(0, JITTER) s
+
+
+class AsyncLimiter:
+    def __init__(self, concurrency: int = MAX_CONCURRENCY, min_interval: float = MIN_INTERVAL,
+                 jitter: float = JITTER, on_pause=None):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.on_pause = on_pause           # callback(seconds), p.ej. Progress.set_backoff
+        self._sem = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self.pauses = 0
+
+    async def acquire(self) -> None:
+        await self._sem.acquire()
+        try:
+            while True:
+                async with self._lock:
+                    now = time.monotonic()
+                    wait = max(self._next_start, self._paused_until) - now
+                    if wait <= 0:
+                        self._next_start = now + self.min_interval + random.uniform(0, self.jitter)
+                        return
+                # al despertar se vuelve a mirar: una pausa pudo llegar mientras tanto
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._sem.release()
+            raise
+
+    def release(self) -> None:
+        self._sem.release()
+
+    def pause(self, seconds: float) -> None:
+        """Nadie arranca petición nueva en `seconds` (las que están en vuelo siguen)."""
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self.pauses += 1
+            if self.on_pause:
+                self.on_pause(seconds)
+
+    def paused_for(self) -> float:
+        return max(self._paused_until - time.monotonic(), 0.0)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
@@ -0,0 +1,312 @@
+"""
+Registros de anuncio compactos para pipelines en proceso.
+
+- Listing: dataclass con __slots__ y las columnas del esquema común
+  (src/utils/schema.py) más las de trazabilidad del listado (year_from,
+  year_to, extractor_version). Sin __dict__ por fila.
+- ListingBatch: contenedor por columnas. Enteros y floats en array('q'/'d')
+  con máscara de válidos (bytearray), textos en listas. Los extractores
+  escriben directamente en la fila (new_row() devuelve una vista con
+  __setitem__), y to_pandas()/to_arrow() construyen las columnas desde los
+  buffers sin pasar por un dict por fila.
+
+    batch = ListingBatch()
+    row = batch.new_row(url=ad_url, year_from=y1, year_to=y2)
+    extract_from_listing_text(ad_text, out=row)
+    if row["price_eur"] is None:
+        batch.pop()
+    df = batch.to_pandas()
+
+    python -m src.utils.records bench --n 200000     # lista de dicts vs batch
+"""
+
+import argparse
+import time
+import tracemalloc
+from array import array
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.utils.schema import FIELD_TYPES, LISTING_FIELDS, coerce_value
+
+EXTRA_TYPES = {"year_from": int, "year_to": int, "extractor_version": str}
+RECORD_TYPES = {**FIELD_TYPES, **EXTRA_TYPES}
+RECORD_FIELDS = LISTING_FIELDS + list(EXTRA_TYPES)
+
+
+@dataclass(slots=True)
+class Listing:
+    url: str | None = None
+    title: str | None = None
+    brand: str | None = None
+    model: str | None = None
+    price_eur: int | None = None
+    km: int | None = None
+    kw: int | None = None
+    cv: int | None = None
+    fuel: str | None = None
+    first_registration: str | None = None
+    year: int | None = None
+    dealer_rating: float | None = None
+    dealer_rating_count: int | None = None
+    location: str | None = None
+    country: str | None = None
+    year_from: int | None = None
+    year_to: int | None = None
+    extractor_version: str | None = None
+
+    @classmethod
+    def from_dict(cls, row: dict) -> "Listing":
+        """Desde una fila de CSV/dict, con los tipos del esquema."""
+        return cls(**{k: coerce_value(row.get(k), RECORD_TYPES[k]) for k in RECORD_FIELDS})
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in RECORD_FIELDS}
+
+
+assert [f.name for f in fields(Listing)] == RECORD_FIELDS, "Listing y schema.LISTING_FIELDS desincronizados"
+
+
+# ---------------- columnas ----------------
+class _NumColumn:
+    __slots__ = ("typ", "values", "valid")
+
+    def __init__(self, typ):
+        self.typ = typ
+        self.values = array("q" if typ is int else "d")
+        self.valid = bytearray()
+
+    def append(self, v) -> None:
+        if v is None:
+            self.values.append(0)
+            self.valid.append(0)
+        else:
+            self.values.append(self.typ(v))
+            self.valid.append(1)
+
+    def set(self, i: int, v) -> None:
+        if v is None:
+            self.values[i] = 0
+            self.valid[i] = 0
+        else:
+            self.values[i] = self.typ(v)
+            self.valid[i] = 1
+
+    def get(self, i: int):
+        return self.values[i] if self.valid[i] else None
+
+    def pop(self) -> None:
+        self.values.pop()
+        self.valid.pop()
+
+    def _numpy(self) -> tuple[np.ndarray, np.ndarray]:
+        # copias: los arrays de origen pueden seguir creciendo (y realocarse)
+        dtype = np.int64 if self.typ is int else np.float64
+        return np.frombuffer(self.values, dtype=dtype).copy(), np.frombuffer(self.valid, dtype=bool).copy()
+
+    def to_pandas(self):
+        values, valid = self._numpy()
+        if self.typ is int:
+            return pd.arrays.IntegerArray(values, ~valid)
+        return pd.arrays.FloatingArray(values, ~valid)
+
+    def to_arrow(self):
+        values, valid = self._numpy()
+        return pa.array(values, mask=~valid, type=pa.int64() if self.typ is int else pa.float64())
+
+    def nbytes(self) -> int:
+        return self.values.itemsize * len(self.values) + len(self.valid)
+
+
+class _StrColumn:
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values: list[str | None] = []
+
+    def append(self, v) -> None:
+        self.values.append(None if v is None else str(v))
+
+    def set(self, i: int, v) -> None:
+        self.values[i] = None if v is None else str(v)
+
+    def get(self, i: int):
+        return self.values[i]
+
+    def pop(self) -> None:
+        self.values.pop()
+
+    def to_pandas(self):
+        return pd.array(self.values, dtype="string")
+
+    def to_arrow(self):
+        return pa.array(self.values, type=pa.string())
+
+    def nbytes(self) -> int:
+        # lista de punteros; los str se comparten con quien los creó
+        return 8 * len(self.values)
+
+
+def _column(typ):
+    return _StrColumn() if typ is str else _NumColumn(typ)
+
+
+class RowView:
+    """Fila i de un ListingBatch con interfaz de dict (lo que esperan los extractores)."""
+    __slots__ = ("_cols", "_i")
+
+    def __init__(self, cols: dict, i: int):
+        self._cols = cols
+        self._i = i
+
+    def __setitem__(self, key: str, value) -> None:
+        self._cols[key].set(self._i, value)
+
+    def __getitem__(self, key: str):
+        return self._cols[key].get(self._i)
+
+    def get(self, key: str, default=None):
+        col = self._cols.get(key)
+        return default if col is None else col.get(self._i)
+
+    def keys(self):
+        return self._cols.keys()
+
+    def to_dict(self) -> dict:
+        return {k: c.get(self._i) for k, c in self._cols.items()}
+
+
+# ---------------- batch ----------------
+class ListingBatch:
+    def __init__(self, columns: list[str] = RECORD_FIELDS):
+        unknown = [c for c in columns if c not in RECORD_TYPES]
+        if unknown:
+            raise KeyError(f"columnas fuera del esquema: {unknown}")
+        self.columns = list(columns)
+        self._cols = {c: _column(RECORD_TYPES[c]) for c in self.columns}
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def new_row(self, **values) -> RowView:
+        """Añade una fila vacía (todo None) y devuelve su vista para rellenarla."""
+        for col in self._cols.values():
+            col.append(None)
+        row = RowView(self._cols, self._n)
+        self._n += 1
+        for k, v in values.items():
+            row[k] = v
+        return row
+
+    def append(self, row: dict | Listing | None = None, **values) -> RowView:
+        if isinstance(row, Listing):
+            row = {k: getattr(row, k) for k in self.columns}
+        src = {**(row or {}), **values}
+        return self.new_row(**{k: v for k, v in src.items() if k in self._cols})
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.append(row)
+
+    def pop(self) -> None:
+        """Quita la última fila (p.ej. descartada por las reglas tras extraer)."""
+        if not self._n:
+            raise IndexError("pop de un ListingBatch vacío")
+        for col in self._cols.values():
+            col.pop()
+        self._n -= 1
+
+    def row(self, i: int) -> RowView:
+        if not -self._n <= i < self._n:
+            raise IndexError(i)
+        return RowView(self._cols, i % self._n)
+
+    def __getitem__(self, i: int) -> Listing:
+        r = self.row(i)
+        return Listing(**{k: r[k] for k in self.columns})
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n))
+
+    def column(self, name: str) -> list:
+        col = self._cols[name]
+        return list(col.values) if isinstance(col, _StrColumn) else [col.get(i) for i in range(self._n)]
+
+    def iter_dicts(self):
+        """Filas como dict de una en una (para csv.DictWriter); no se guardan."""
+        cols = self._cols
+        for i in range(self._n):
+            yield {k: c.get(i) for k, c in cols.items()}
+
+    def to_pandas(self) -> pd.DataFrame:
+        return pd.DataFrame({k: c.to_pandas() for k, c in self._cols.items()})
+
+    def to_arrow(self) -> pa.Table:
+        return pa.table({k: c.to_arrow() for k, c in self._cols.items()})
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes() for c in self._cols.values())
+
+    def clear(self) -> None:
+        self._cols = {c: _column(RECORD_TYPES[c]) for c in self.columns}
+        self._n = 0
+
+
+# ---------------- CLI ----------------
+def _bench(n: int) -> None:
+    from src.utils.bench_extractors import synthetic_listing_texts
+    from src.utils.extractors import extract_from_listing_text
+
+    texts = synthetic_listing_texts(n)
+    extra = {"year_from": 2013, "year_to": 2015, "extractor_version": "bench"}
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    rows = [{"url": f"https://suchen.mobile.de/fahrzeuge/details.html?id={i}", **extract_from_listing_text(t), **extra}
+            for i, t in enumerate(texts)]
+    t_fill = time.perf_counter() - t0
+    mb_rows = tracemalloc.get_traced_memory()[0] / 1e6
+    t0 = time.perf_counter()
+    df = pd.DataFrame(rows)
+    t_df = time.perf_counter() - t0
+    del rows, df
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    batch = ListingBatch()
+    for i, t in enumerate(texts):
+        extract_from_listing_text(t, out=batch.new_row(url=f"https://suchen.mobile.de/fahrzeuge/details.html?id={i}",
+                                                       **extra))
+    b_fill = time.perf_counter() - t0
+    mb_batch = tracemalloc.get_traced_memory()[0] / 1e6
+    t0 = time.perf_counter()
+    batch.to_pandas()
+    b_df = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batch.to_arrow()
+    b_pa = time.perf_counter() - t0
+    tracemalloc.stop()
+
+    print(f"n={n:,}")
+    print(f"  lista de dicts : {mb_rows:8.1f} MB  extraer {t_fill:6.2f}s  -> DataFrame {t_df:6.3f}s")
+    print(f"  ListingBatch   : {mb_batch:8.1f} MB  extraer {b_fill:6.2f}s  -> DataFrame {b_df:6.3f}s"
+          f"  -> Arrow {b_pa:6.3f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Registros de anuncio compactos")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="memoria y conversión: lista de dicts vs ListingBatch")
+    b.add_argument("--n", type=int, default=200_000)
+    args = ap.parse_args()
+    if args.cmd == "bench":
+        _bench(args.n)
+
+
+if __name__ == "__main__":
+    main()
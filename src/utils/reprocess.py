@@ -0,0 +1,150 @@
+"""
+Reprocesado selectivo de CSVs según la versión de los extractores.
+
+Solo se recalculan los grupos de campos cuya versión guardada en
+`extractor_version` no coincide con src/utils/extractors.FIELD_VERSIONS.
+El texto fuente sale de la propia fila (`title`) y, para las fichas de
+detalle, del HTML archivado en data/archive (src/utils/page_archive.py).
+
+    python -m src.utils.reprocess --csv data/raw/mobile_de_results_all.csv --kind detail
+    python -m src.utils.reprocess --csv data/raw/mobile_de_FRESH.csv --kind listing
+"""
+
+import argparse
+import csv
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from src.utils.extractors import (
+    FIELD_GROUPS, FIELD_VERSIONS, DETAIL_GROUPS, LISTING_GROUPS,
+    extract_detail, extract_from_listing_text, parse_version, stale_groups,
+)
+from src.utils.page_archive import PageArchive, read_entry, DEFAULT_DIR as ARCHIVE_DIR
+
+KIND_GROUPS = {"detail": DETAIL_GROUPS, "listing": LISTING_GROUPS}
+# grupos de la ficha de detalle que necesitan el body (no salen del title)
+BODY_GROUPS = {"km", "registration"}
+
+
+def _merge_version(stored: dict[str, int], redone: set[str]) -> str:
+    v = {**stored, **{g: FIELD_VERSIONS[g] for g in redone}}
+    return ",".join(f"{g}={v[g]}" for g in sorted(v))
+
+
+def _body_text(archive_root: str, entry: dict) -> str:
+    html = read_entry(Path(archive_root), entry)
+    soup = BeautifulSoup(html, "html.parser")
+    return (soup.body or soup).get_text("\n")
+
+
+def _reprocess_batch(args):
+    kind, rows, archive_root, entries = args
+    counts = Counter()
+    out = []
+    for row, entry in zip(rows, entries):
+        if str(row.get("blocked", "")).lower() == "true":
+            out.append(row)
+            continue
+        stale = stale_groups(row.get("extractor_version"), KIND_GROUPS[kind])
+        if not stale:
+            out.append(row)
+            continue
+
+        if kind == "listing":
+            todo = stale
+            data = extract_from_listing_text(row.get("title") or "", groups=todo)
+            data.pop("title", None)
+        else:
+            todo = set(stale)
+            body = ""
+            if todo & BODY_GROUPS:
+                if entry is not None:
+                    body = _body_text(archive_root, entry)
+                else:
+                    todo -= BODY_GROUPS   # sin HTML archivado no se puede recalcular
+                    counts["sin_html"] += 1
+            data = extract_detail(row.get("title") or "", body, groups=todo)
+
+        row = {**row, **data, "extractor_version": _merge_version(parse_version(row.get("extractor_version")), todo)}
+        counts["filas"] += 1
+        counts.update(todo)
+        out.append(row)
+    return out, counts
+
+
+def _read_batches(reader, size: int):
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reprocess(csv_path: Path, kind: str, out_path: Path | None = None, archive_root: Path = ARCHIVE_DIR,
+              workers: int | None = None, batch_size: int = 2000) -> Counter:
+    entries_by_url = {}
+    if kind == "detail" and archive_root.exists():
+        entries_by_url = {e["url"]: e for e in PageArchive(archive_root).entries(site="mobile.de", kind="detail")}
+
+    out_path = out_path or csv_path
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    workers = workers or os.cpu_count()
+    totals = Counter()
+
+    with csv_path.open("r", encoding="utf-8", newline="") as fin, \
+            tmp.open("w", encoding="utf-8", newline="") as fout, \
+            ProcessPoolExecutor(max_workers=workers) as ex:
+        reader = csv.DictReader(fin)
+        fields = list(reader.fieldnames or [])
+        for g in KIND_GROUPS[kind]:
+            fields += [c for c in FIELD_GROUPS[g] if c not in fields]
+        if "extractor_version" not in fields:
+            fields.append("extractor_version")
+        writer = csv.DictWriter(fout, fieldnames=fields)
+        writer.writeheader()
+
+        # ventana acotada de lotes en vuelo: memoria constante y salida en orden
+        pending = deque()
+        for batch in _read_batches(reader, batch_size):
+            entries = [entries_by_url.get(r.get("url")) for r in batch]
+            pending.append(ex.submit(_reprocess_batch, (kind, batch, str(archive_root), entries)))
+            totals["leidas"] += len(batch)
+            if len(pending) >= workers * 2:
+                rows, counts = pending.popleft().result()
+                writer.writerows(rows)
+                totals.update(counts)
+        while pending:
+            rows, counts = pending.popleft().result()
+            writer.writerows(rows)
+            totals.update(counts)
+
+    tmp.replace(out_path)
+    return totals
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-extrae solo los campos con versión de extractor desactualizada")
+    ap.add_argument("--csv", type=Path, required=True)
+    ap.add_argument("--kind", choices=sorted(KIND_GROUPS), required=True)
+    ap.add_argument("--out", type=Path, help="por defecto reescribe --csv")
+    ap.add_argument("--archive", type=Path, default=ARCHIVE_DIR)
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--batch-size", type=int, default=2000)
+    args = ap.parse_args()
+
+    totals = reprocess(args.csv, args.kind, args.out, args.archive, args.workers, args.batch_size)
+    print(f"Filas leídas: {totals.pop('leidas', 0)} | reprocesadas: {totals.pop('filas', 0)}")
+    for k, v in sorted(totals.items()):
+        print(f"  {k}: {v}")
+    print("CSV:", args.out or args.csv)
+
+
+if __name__ == "__main__":
+    main()
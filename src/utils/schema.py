@@ -0,0 +1,53 @@
+"""
+Esquema común de anuncios (mobile.de / coches.net).
+
+Las columnas siguen las de mobile_de_final.py, más `country`, para poder
+concatenar DE y ES sin renombrar nada en los notebooks.
+"""
+
+LISTING_FIELDS = [
+    "url", "title", "brand", "model", "price_eur", "km", "kw", "cv", "fuel",
+    "first_registration", "year", "dealer_rating", "dealer_rating_count", "location",
+    "country",
+]
+
+FIELD_TYPES = {
+    "url": str,
+    "title": str,
+    "brand": str,
+    "model": str,
+    "price_eur": int,
+    "km": int,
+    "kw": int,
+    "cv": int,
+    "fuel": str,
+    "first_registration": str,
+    "year": int,
+    "dealer_rating": float,
+    "dealer_rating_count": int,
+    "location": str,
+    "country": str,
+}
+
+FUELS = ["PETROL", "DIESEL", "HYBRID", "ELECTRIC", "LPG", "CNG"]
+
+
+def coerce_value(value, typ):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "" or value.lower() in ("none", "nan"):
+            return None
+    try:
+        if typ is int:
+            return int(float(value))
+        return typ(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def coerce_row(row: dict, **extra) -> dict:
+    """Devuelve una fila con todas las columnas del esquema y tipos fijos."""
+    src = {**row, **extra}
+    return {k: coerce_value(src.get(k), FIELD_TYPES[k]) for k in LISTING_FIELDS}
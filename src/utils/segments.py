@@ -0,0 +1,90 @@
+"""
+Segmentos CSV de solo-append para volcar resultados página a página.
+
+Cada página se añade al final del segmento (sin reescribir lo anterior), así
+que el coste de checkpoint por página es constante y lo ya escrito sobrevive
+a un corte. El fichero combinado se arma concatenando segmentos byte a byte
+(la cabecera solo del primero), sin cargar nada en un DataFrame.
+
+    with SegmentWriter(out_dir / "mobile_de_2013_2015.part.csv", CAR_COLUMNS) as seg:
+        for page, cars in scraper.iter_year_range(2013, 2015):
+            seg.write(cars)
+    seg.finalize(out_dir / "mobile_de_2013_2015_final.csv")
+    concat_segments([seg.path, ...], out_dir / "mobile_de_combined.csv")
+"""
+
+import csv
+import os
+import shutil
+from collections import Counter
+from pathlib import Path
+
+ENCODING = "utf-8-sig"      # BOM para que Excel abra bien los acentos, como los to_csv de antes
+
+
+class SegmentWriter:
+    def __init__(self, path: Path, columns: list[str], fsync: bool = False):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.fsync = fsync
+        self.rows = 0
+        self.non_null: Counter = Counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fresh = not self.path.exists() or self.path.stat().st_size == 0
+        # el BOM solo al principio del fichero: en append va sin él
+        self._f = self.path.open("a", encoding=ENCODING if fresh else "utf-8", newline="")
+        self._w = csv.DictWriter(self._f, fieldnames=self.columns, extrasaction="ignore")
+        if fresh:
+            self._w.writeheader()
+            self._f.flush()
+
+    def write(self, rows: list[dict]) -> int:
+        """Añade las filas de una página y las deja en disco."""
+        for row in rows:
+            self._w.writerow(row)
+            for col in self.columns:
+                if row.get(col) not in (None, ""):
+                    self.non_null[col] += 1
+        self.rows += len(rows)
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        return len(rows)
+
+    def close(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+
+    def finalize(self, final_path: Path) -> Path:
+        """Cierra y renombra el segmento (p.ej. .part.csv -> _final.csv)."""
+        self.close()
+        final_path = Path(final_path)
+        self.path.replace(final_path)
+        self.path = final_path
+        return final_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def concat_segments(paths: list[Path], out_path: Path) -> int:
+    """Concatena segmentos con la misma cabecera; devuelve cuántos se unieron."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    header = None
+    with out_path.open("wb") as out:
+        for p in paths:
+            with Path(p).open("rb") as src:
+                first = src.readline()
+                if header is None:
+                    header = first
+                    out.write(first)
+                elif first.removeprefix(b"\xef\xbb\xbf") != header.removeprefix(b"\xef\xbb\xbf"):
+                    raise ValueError(f"cabecera distinta en {p}")
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            n += 1
+    return n
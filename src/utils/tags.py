@@ -0,0 +1,240 @@
+"""
+Etiquetas de acabado / motor / equipamiento a partir del título.
+
+Un autómata Aho-Corasick con todas las palabras clave de TAGS recorre cada
+título una sola vez, sin importar cuántas palabras haya en el diccionario.
+Las coincidencias se validan con límites de palabra ("GTI" sí, "GTIX" no) y
+las etiquetas ambiguas con el contexto del título (REQUIRES_WORDS, NOT_AFTER,
+NOT_BEFORE).
+Sobre columnas enteras se etiqueta cada título único una vez.
+
+    python -m src.utils.tags "VW Golf GTI 2.0 TSI DSG Navi LED"
+    python -m src.utils.tags --bench 1000000
+"""
+
+import re
+import sys
+import time
+from collections import deque
+
+# categoría -> etiqueta -> variantes (se comparan en minúsculas)
+TAGS = {
+    "engine": {
+        "TDI": ["tdi"], "TSI": ["tsi"], "TFSI": ["tfsi"], "TGI": ["tgi"], "eHybrid": ["ehybrid", "e-hybrid"],
+        "CDI": ["cdi"], "BlueTEC": ["bluetec"], "HDi": ["hdi", "bluehdi"], "PureTech": ["puretech"],
+        "dCi": ["dci"], "TCe": ["tce"], "EcoBoost": ["ecoboost"], "TDCi": ["tdci"], "CRDi": ["crdi"],
+        "T-GDI": ["t-gdi", "tgdi"], "Skyactiv": ["skyactiv", "skyactiv-g", "skyactiv-d"],
+        "Hybrid": ["hybrid", "hibrido", "híbrido", "hev"], "PHEV": ["phev", "plug-in", "plug-in hybrid"],
+        "Electric": ["electric", "eléctrico", "electrico", "ev", "bev", "e-tron"],
+        "Diesel": ["diesel", "diésel"], "Gasolina": ["gasolina", "benzin"],
+    },
+    "line": {
+        "GTI": ["gti"], "GTD": ["gtd"], "GTE": ["gte"], "R": ["r"], "R-Line": ["r-line", "r line", "rline"],
+        "S line": ["s line", "s-line", "sline"], "RS": ["rs"], "M Sport": ["m sport", "m-sport", "msport"],
+        "AMG": ["amg"], "AMG Line": ["amg line", "amg-line"], "FR": ["fr"], "ST": ["st"],
+        "ST-Line": ["st-line", "st line"], "Titanium": ["titanium"], "Vignale": ["vignale"],
+        "Highline": ["highline"], "Comfortline": ["comfortline"], "Trendline": ["trendline"],
+        "Life": ["life"], "Style": ["style"], "Elegance": ["elegance"], "Avantgarde": ["avantgarde"],
+        "Sport": ["sport"], "Xcellence": ["xcellence"], "Ambition": ["ambition"], "RS (Skoda)": ["vrs"],
+        "GT Line": ["gt line", "gt-line"], "N Line": ["n line", "n-line"], "Inscription": ["inscription"],
+        "R-Design": ["r-design", "r design"], "Tekna": ["tekna"], "Allure": ["allure"],
+    },
+    "drive": {
+        "quattro": ["quattro"], "xDrive": ["xdrive"], "4Motion": ["4motion"], "4MATIC": ["4matic"],
+        "4x4": ["4x4", "awd", "4wd", "allrad"],
+    },
+    "gearbox": {
+        "DSG": ["dsg"], "S tronic": ["s tronic", "s-tronic"], "Steptronic": ["steptronic"],
+        "Automático": ["automatico", "automático", "automatik", "aut.", "auto"], "Manual": ["manual", "schaltgetriebe"],
+        "EDC": ["edc"], "EAT8": ["eat8", "eat6"], "Tiptronic": ["tiptronic"], "PDK": ["pdk"],
+    },
+    "equipment": {
+        "Navi": ["navi", "navegador", "navigation"], "LED": ["led"], "Matrix LED": ["matrix led", "matrix-led"],
+        "Xenon": ["xenon", "bi-xenon"], "Panorama": ["panorama", "panoramico", "panorámico", "techo panoramico"],
+        "ACC": ["acc"], "Head-up": ["head-up", "hud"], "Cámara": ["camara", "cámara", "kamera", "rückfahrkamera"],
+        "Cuero": ["cuero", "leder", "leather"], "AHK": ["ahk", "enganche", "anhängerkupplung"],
+        "Virtual Cockpit": ["virtual cockpit", "digital cockpit"], "Keyless": ["keyless"],
+        "CarPlay": ["carplay", "apple carplay"], "Standheizung": ["standheizung"],
+    },
+}
+
+CATEGORIES = tuple(TAGS)
+
+# Etiquetas que solo cuentan si el título nombra la marca/modelo que las usa:
+# "ST" es acabado de Ford, pero en SEAT ("León ST") es la carrocería familiar;
+# "R" suelto es el de VW (Golf R, T-Roc R...).
+REQUIRES_WORDS = {
+    "ST": {"ford", "focus", "fiesta", "puma"},
+    "R": {"volkswagen", "vw", "golf", "t-roc", "troc", "tiguan", "arteon", "touareg"},
+}
+# Variantes que no cuentan pegadas a ciertas palabras: "Auto" como cambio sí
+# ("1.5 TSI Auto"), pero no "Auto-Hold", "Auto Klima" ni "climatizador automático".
+_CLIMATE = {"climatizador", "clima", "climatizacion", "climatización", "aire", "klima", "klimaanlage",
+            "luces", "faros", "licht"}
+NOT_AFTER = {v: _CLIMATE for v in ("auto", "automatico", "automático", "automatik")}
+NOT_BEFORE = {"auto": {"hold", "klima", "start", "stop", "park", "parking", "light", "licht", "abblendend"}}
+
+WORD_RX = re.compile(r"\w+")
+TOKEN_RX = re.compile(r"[\w-]+")
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum()
+
+
+class AhoCorasick:
+    def __init__(self, patterns: dict[str, object]):
+        """patterns: texto (minúsculas) -> valor devuelto al encontrarlo."""
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[list[tuple[int, object]]] = [[]]
+        for text, value in patterns.items():
+            node = 0
+            for ch in text:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(text), value))
+
+        # enlaces de fallo por BFS; las salidas se heredan del nodo de fallo
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text: str):
+        """(inicio, fin, valor) de cada coincidencia, solapadas incluidas."""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield i - length + 1, i + 1, value
+
+
+def _build() -> AhoCorasick:
+    patterns = {}
+    for cat, tags in TAGS.items():
+        for tag, variants in tags.items():
+            for v in variants:
+                v = v.lower()
+                checked = tag in REQUIRES_WORDS or v in NOT_AFTER or v in NOT_BEFORE
+                patterns[v] = (cat, tag, checked)
+    return AhoCorasick(patterns)
+
+
+AUTOMATON = _build()
+
+
+def _in_context(text: str, start: int, end: int, tag: str, tokens: set[str]) -> bool:
+    variant = text[start:end]
+    if tag in REQUIRES_WORDS and not REQUIRES_WORDS[tag] & tokens:
+        return False
+    if variant in NOT_AFTER:
+        before = WORD_RX.findall(text, 0, start)
+        if before and before[-1] in NOT_AFTER[variant]:
+            return False
+    if variant in NOT_BEFORE:
+        after = WORD_RX.search(text, end)
+        if after and after.group() in NOT_BEFORE[variant]:
+            return False
+    return True
+
+
+def tag_title(title: str) -> dict[str, set[str]]:
+    """Etiquetas por categoría de un título."""
+    text = (title or "").lower()
+    n = len(text)
+    hits = []
+    tokens = None
+    for start, end, value in AUTOMATON.iter(text):
+        if start > 0 and _is_word(text[start - 1]):
+            continue
+        if end < n and _is_word(text[end]):
+            continue
+        if value[2]:
+            if tokens is None:
+                tokens = set(TOKEN_RX.findall(text))
+            if not _in_context(text, start, end, value[1], tokens):
+                continue
+        hits.append((start, end, value))
+
+    found = {c: set() for c in CATEGORIES}
+    for start, end, (cat, tag, _) in hits:
+        # "ST" dentro de "ST-Line", "LED" dentro de "Matrix LED": gana la más larga
+        if any(s <= start and end <= e and (e - s) > (end - start) for s, e, _ in hits):
+            continue
+        found[cat].add(tag)
+    return found
+
+
+def tags_string(found: dict[str, set[str]]) -> str | None:
+    tags = sorted(t for cat in CATEGORIES for t in found[cat])
+    return ",".join(tags) or None
+
+
+def tag_series(titles):
+    """
+    Series de títulos -> DataFrame con una columna por categoría (etiquetas
+    separadas por comas) más `tags` con todas. Cada título único se procesa una vez.
+    """
+    import pandas as pd
+
+    codes, uniques = pd.factorize(titles.astype("string").fillna(""), sort=False)
+    rows = []
+    for t in uniques:
+        found = tag_title(t)
+        rows.append([",".join(sorted(found[c])) or None for c in CATEGORIES] + [tags_string(found)])
+    res = pd.DataFrame(rows, columns=list(CATEGORIES) + ["tags"], dtype="string")
+    out = res.iloc[codes].reset_index(drop=True)
+    out.index = titles.index
+    return out
+
+
+def bench(n: int) -> None:
+    import random
+
+    import pandas as pd
+
+    rng = random.Random(0)
+    words = ["Volkswagen Golf", "Audi A3 Sportback", "BMW 320d Touring", "Mercedes-Benz C 220 d", "Ford Focus"]
+    extras = ["GTI", "2.0 TDI", "1.5 TSI", "R-Line", "quattro", "AMG Line", "M Sport", "DSG", "Navi", "LED",
+              "xDrive", "ST-Line", "Panorama", "AHK", "Highline", "S tronic", "4MATIC", "Leder", "ACC"]
+    titles = pd.Series([
+        f"{rng.choice(words)} {' '.join(rng.sample(extras, 4))} {rng.randint(1, 99999)} km"
+        for _ in range(n)
+    ])
+    print(f"Patrones: {sum(len(v) for t in TAGS.values() for v in t.values())} | estados: {len(AUTOMATON.goto)}")
+
+    t0 = time.perf_counter()
+    for t in titles:
+        tag_title(t)
+    dt = time.perf_counter() - t0
+    print(f"{n:,} títulos (todos distintos): {dt:.2f}s ({n / dt:,.0f} títulos/s)")
+
+    dup = titles.str.replace(r"\s\d+ km$", "", regex=True)   # títulos repetidos como en los listados
+    t0 = time.perf_counter()
+    tag_series(dup)
+    dt = time.perf_counter() - t0
+    print(f"{n:,} títulos ({dup.nunique():,} únicos) con tag_series: {dt:.2f}s ({n / dt:,.0f} títulos/s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--bench":
+        bench(int(sys.argv[2]))
+    else:
+        for t in sys.argv[1:]:
+            print(t, "->", {c: sorted(v) for c, v in tag_title(t).items() if v})
@@ -0,0 +1,227 @@
+"""
+Vigilante de memoria para crawls largos.
+
+Cada `interval` segundos (poll() es barato entre muestras):
+- heap de Python con tracemalloc (actual, pico, top de líneas que más crecen
+  desde la primera muestra),
+- RSS del propio proceso y de los procesos del navegador (hijos: chromium,
+  renderers...), con psutil si está instalado o leyendo /proc si no,
+- tamaños de las estructuras que se registren con track() (sets de URLs...).
+
+Todo va a un JSONL (una línea por muestra) y se imprime una línea con la
+tendencia (MB/h). Pasados los límites devuelve una acción:
+- "recycle": el navegador se pasó de BROWSER_RSS_LIMIT_MB -> cerrar y abrir
+  browser/context nuevos (el progreso ya está en el CSV),
+- "restart": el heap de Python se pasó de PY_HEAP_LIMIT_MB -> checkpoint y
+  reiniciar el proceso (restart_process) reanudando desde el CSV.
+
+    WATCHDOG = MemoryWatchdog(log_path=METRICS_DIR / "multi.memory.jsonl")
+    WATCHDOG.track("scraped_ids", lambda: len(scraped_ids))
+    action = WATCHDOG.poll()
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:          # opcional: sin psutil se lee /proc (solo Linux)
+    psutil = None
+
+SAMPLE_EVERY = 60.0
+PY_HEAP_LIMIT_MB = 1500
+BROWSER_RSS_LIMIT_MB = 2500
+TOP_N = 8
+TREND_SAMPLES = 10
+BROWSER_NAMES = ("chrome", "chromium", "headless_shell", "firefox", "webkit", "msedge")
+
+MB = 1024 * 1024
+
+
+# ---------------- RSS ----------------
+def _proc_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _proc_children(pid: int) -> list[int]:
+    """Descendientes de pid recorriendo /proc/*/stat (ppid es el 4º campo)."""
+    parents: dict[int, list[int]] = {}
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(d))
+    out, stack = [], [pid]
+    while stack:
+        for c in parents.get(stack.pop(), []):
+            out.append(c)
+            stack.append(c)
+    return out
+
+
+def _proc_name(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/comm") as f:
+            return f.read().strip().lower()
+    except OSError:
+        return ""
+
+
+def process_rss() -> tuple[int, int, int]:
+    """(RSS propio, RSS del navegador, nº procesos del navegador) en bytes."""
+    if psutil is not None:
+        me = psutil.Process()
+        own = me.memory_info().rss
+        browser = n = 0
+        for child in me.children(recursive=True):
+            try:
+                if any(b in child.name().lower() for b in BROWSER_NAMES):
+                    browser += child.memory_info().rss
+                    n += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return own, browser, n
+    if os.path.isdir("/proc"):
+        pid = os.getpid()
+        browser = n = 0
+        for c in _proc_children(pid):
+            if any(b in _proc_name(c) for b in BROWSER_NAMES):
+                browser += _proc_rss(c)
+                n += 1
+        return _proc_rss(pid), browser, n
+    return 0, 0, 0
+
+
+# ---------------- watchdog ----------------
+class MemoryWatchdog:
+    def __init__(self, log_path: Path | None = None, interval: float = SAMPLE_EVERY,
+                 py_heap_limit_mb: float | None = PY_HEAP_LIMIT_MB,
+                 browser_rss_limit_mb: float | None = BROWSER_RSS_LIMIT_MB,
+                 top_n: int = TOP_N, use_tracemalloc: bool = True):
+        self.log_path = log_path
+        self.interval = interval
+        self.py_heap_limit = py_heap_limit_mb * MB if py_heap_limit_mb else None
+        self.browser_rss_limit = browser_rss_limit_mb * MB if browser_rss_limit_mb else None
+        self.top_n = top_n
+        self.use_tracemalloc = use_tracemalloc
+        self._gauges: dict[str, callable] = {}
+        self._history: list[tuple[float, float, float]] = []     # (t, heap MB, browser MB)
+        self._baseline = None
+        self._last = 0.0
+        self.recycles = 0
+
+    def start(self) -> "MemoryWatchdog":
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+        if self.use_tracemalloc:
+            self._baseline = tracemalloc.take_snapshot()
+        self._last = time.monotonic()
+        return self
+
+    def track(self, name: str, fn) -> None:
+        """Registra un tamaño a vigilar (p.ej. lambda: len(scraped_ids))."""
+        self._gauges[name] = fn
+
+    def _top_growth(self) -> list[dict]:
+        if not self.use_tracemalloc or not tracemalloc.is_tracing():
+            return []
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*"),
+        ])
+        if self._baseline is None:
+            stats = snap.statistics("lineno")
+        else:
+            stats = snap.compare_to(self._baseline, "lineno")
+        out = []
+        for st in stats[:self.top_n]:
+            fr = st.traceback[0]
+            out.append({"where": f"{fr.filename}:{fr.lineno}", "size_mb": round(st.size / MB, 2),
+                        "diff_mb": round(getattr(st, "size_diff", st.size) / MB, 2), "count": st.count})
+        return out
+
+    def _trend(self) -> tuple[float | None, float | None]:
+        """Pendiente (MB/h) de heap y navegador sobre las últimas muestras."""
+        h = self._history[-TREND_SAMPLES:]
+        if len(h) < 2 or h[-1][0] == h[0][0]:
+            return None, None
+        dt_h = (h[-1][0] - h[0][0]) / 3600
+        return (h[-1][1] - h[0][1]) / dt_h, (h[-1][2] - h[0][2]) / dt_h
+
+    def sample(self) -> dict:
+        now = time.time()
+        heap, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        own, browser, n_browser = process_rss()
+        self._history.append((now, heap / MB, browser / MB))
+        heap_trend, browser_trend = self._trend()
+        rec = {
+            "at": now,
+            "py_heap_mb": round(heap / MB, 1), "py_peak_mb": round(peak / MB, 1),
+            "rss_mb": round(own / MB, 1), "browser_rss_mb": round(browser / MB, 1),
+            "browser_procs": n_browser,
+            "heap_mb_per_h": None if heap_trend is None else round(heap_trend, 1),
+            "browser_mb_per_h": None if browser_trend is None else round(browser_trend, 1),
+            "gauges": {k: self._gauge(fn) for k, fn in self._gauges.items()},
+            "top": self._top_growth(),
+        }
+        if self.log_path is not None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.log_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+
+        trend = ""
+        if heap_trend is not None:
+            trend = f" | tendencia heap {heap_trend:+.0f} MB/h, navegador {browser_trend:+.0f} MB/h"
+        gauges = " ".join(f"{k}={v}" for k, v in rec["gauges"].items())
+        print(f"   [mem] heap={rec['py_heap_mb']}MB rss={rec['rss_mb']}MB "
+              f"navegador={rec['browser_rss_mb']}MB ({n_browser} procs){trend} {gauges}".rstrip())
+        return rec
+
+    @staticmethod
+    def _gauge(fn):
+        try:
+            return fn()
+        except Exception:
+            return None
+
+    def check(self, rec: dict) -> str | None:
+        if self.py_heap_limit and rec["py_heap_mb"] * MB > self.py_heap_limit:
+            print(f"   [mem] heap de Python {rec['py_heap_mb']}MB > límite. Top:")
+            for t in rec["top"][:5]:
+                print(f"         {t['diff_mb']:+.1f}MB {t['where']}")
+            return "restart"
+        if self.browser_rss_limit and rec["browser_rss_mb"] * MB > self.browser_rss_limit:
+            return "recycle"
+        return None
+
+    def poll(self) -> str | None:
+        """Muestra y evalúa límites si toca; None, "recycle" o "restart"."""
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return None
+        self._last = now
+        return self.check(self.sample())
+
+    def stop(self) -> None:
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def restart_process(module: str, env: dict[str, str] | None = None) -> None:
+    """Reemplaza el proceso por `python -m module` (el estado debe estar ya en disco)."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.environ.update(env or {})
+    os.execv(sys.executable, [sys.executable, "-m", module])
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from src.matching.fair_price import _segment_columns, _segment_keys
+
+
+def test_segment_keys_accept_missing_values():
+    assert _segment_keys(pd.NA, "Golf") == ("|golf", "")
+    assert _segment_keys("Volkswagen", pd.NA) == ("volkswagen|", "volkswagen")
+    assert _segment_keys(None, np.nan) == ("|", "")
+
+
+def test_segment_keys_match_vectorized_columns():
+    df = pd.DataFrame({"brand": pd.array(["BMW", pd.NA, " Audi "], dtype="string"),
+                       "model": pd.array(["Serie 3", "Golf", pd.NA], dtype="string")})
+    seg, brand = _segment_columns(df)
+    assert list(seg) == [_segment_keys(b, m)[0] for b, m in zip(df["brand"], df["model"])]
+    assert list(brand) == [_segment_keys(b, m)[1] for b, m in zip(df["brand"], df["model"])]
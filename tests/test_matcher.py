@@ -0,0 +1,39 @@
+import pandas as pd
+
+from src.matching.matcher import block_keys, match
+
+
+def _listings(rows):
+    return pd.DataFrame(rows, columns=["brand", "model", "year", "km", "kw"])
+
+
+def test_block_keys_keep_full_canonical_model():
+    df = _listings([
+        ("BMW", "Serie 1", 2018, 50_000, 100),
+        ("BMW", "Serie 3", 2018, 50_000, 100),
+        ("Audi", "A3 Sportback", 2018, 50_000, 100),
+        ("Land Rover", "Range Rover Evoque", 2018, 50_000, 100),
+        ("Tesla", "Model 3", 2018, 50_000, 100),
+    ])
+    assert block_keys(df)["model"].tolist() == ["serie 1", "serie 3", "a3 sportback", "range rover evoque", "model 3"]
+
+
+def test_block_keys_first_token_for_unresolved_models():
+    df = _listings([("Opel", "Astra Sports Tourer 1.6", 2018, 50_000, 100)])
+    assert block_keys(df)["model"].tolist() == ["astra"]
+
+
+def test_serie_1_never_matches_serie_3():
+    de = _listings([("BMW", "Serie 1", 2018, 50_000, 100)])
+    es = _listings([
+        ("BMW", "Serie 3", 2018, 50_000, 100),   # idéntico salvo el modelo
+        ("BMW", "Serie 1", 2010, 200_000, 60),
+    ])
+    res = match(de, es, k=5)
+    assert res["es_index"].tolist() == [1]
+
+
+def test_no_match_without_same_model():
+    de = _listings([("BMW", "Serie 1", 2018, 50_000, 100)])
+    es = _listings([("BMW", "Serie 3", 2018, 50_000, 100)])
+    assert match(de, es).empty
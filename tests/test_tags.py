@@ -0,0 +1,29 @@
+from src.utils.tags import tag_title
+
+
+def test_seat_leon_st_is_a_body_not_the_st_trim():
+    found = tag_title("SEAT Leon ST 1.5 TSI FR")
+    assert "ST" not in found["line"]
+    assert found["line"] == {"FR"}
+    assert tag_title("SEAT León ST 2.0 TDI Style")["line"] == {"Style"}
+
+
+def test_ford_st_keeps_the_trim():
+    assert tag_title("Ford Focus ST 2.3 EcoBoost")["line"] == {"ST"}
+    assert tag_title("Ford Fiesta ST 1.5")["line"] == {"ST"}
+    assert tag_title("Ford Focus 1.0 EcoBoost ST-Line")["line"] == {"ST-Line"}
+
+
+def test_bare_r_only_for_volkswagen():
+    assert tag_title("Volkswagen Golf R 2.0 TSI 4Motion DSG")["line"] == {"R"}
+    assert tag_title("VW T-Roc R 4Motion")["line"] == {"R"}
+    assert "R" not in tag_title("Audi A3 R 2.0")["line"]
+    assert tag_title("VW Polo 1.0 TSI R-Line")["line"] == {"R-Line"}
+
+
+def test_auto_gearbox_needs_gearbox_context():
+    assert tag_title("Skoda Octavia 2.0 TDI Auto")["gearbox"] == {"Automático"}
+    assert tag_title("BMW 118i Automático Navi")["gearbox"] == {"Automático"}
+    assert not tag_title("Opel Astra 1.2 Auto-Hold Navi")["gearbox"]
+    assert not tag_title("Seat Ibiza 1.0 TSI climatizador automático")["gearbox"]
+    assert not tag_title("VW Polo 1.0 Auto Klima")["gearbox"]